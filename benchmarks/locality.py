@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Compare append-only, near-the-end and random-time workloads.
+
+Usage:
+    python3 -m benchmarks.locality [n ...]
+
+Every workload performs n operations (70% inserts, 30% delete-mins) on an
+initially empty queue and reports the average time per operation:
+    append:   every operation is later than all existing ones
+    near-end: operations land within the last 256 operations
+    random:   operation times are uniformly random
+"""
+import random
+import sys
+import time
+
+from retropq import RetroactivePriorityQueue, FusedRetroactivePriorityQueue
+
+
+def workload_times(name, n, rng):
+    if name == "append":
+        return list(range(n))
+    elif name == "near-end":
+        # Spacing the operations out leaves room for retroactive ones
+        times = []
+        end = 0
+        for _ in range(n):
+            if rng.random() < 0.5:
+                end += 1000
+                times.append(end)
+            else:
+                times.append(end - rng.randrange(256 * 1000) - 0.5)
+        return times
+    else:
+        return [rng.random() for _ in range(n)]
+
+def run(queue_cls, times, rng):
+    queue = queue_cls()
+    start = time.perf_counter()
+    for t in times:
+        try:
+            if rng.random() < 0.7 or len(queue) == 0:
+                queue.add_insert(t, rng.random())
+            else:
+                queue.add_delete_min(t)
+        except (KeyError, ValueError):
+            pass
+    return time.perf_counter() - start
+
+def main(sizes):
+    for n in sizes:
+        print("n = {:,}".format(n))
+        for name in ["append", "near-end", "random"]:
+            times = workload_times(name, n, random.Random(1))
+            for queue_cls in [
+                RetroactivePriorityQueue, FusedRetroactivePriorityQueue
+            ]:
+                elapsed = run(queue_cls, times, random.Random(2))
+                print("    {:<9} {:<30} {:7.1f} us/op".format(
+                    name, queue_cls.__name__, elapsed / n * 1e6
+                ))
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10 ** 5])
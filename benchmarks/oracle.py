@@ -0,0 +1,113 @@
+"""An incremental correctness oracle, shared by the randomized tests and
+`benchmarks.scaling --check`."""
+import heapq
+from collections import Counter
+
+from retropq import RetroactivePriorityQueue, FusedRetroactivePriorityQueue
+
+
+class IncrementalOracle:
+    """Checks every update of a queue without replaying its timeline.
+
+    Every update is also applied to a reference queue of the other engine,
+    which shares no tree code with the checked one beyond the treap, and
+    both must return the same `Change` or raise the same error. The change
+    feed of the checked queue maintains a mirror of its contents, which
+    must agree with the queue and the reference in size and minimum. This
+    takes O(log n) per update.
+
+    A full heap replay of the timeline, `verify`, runs whenever the number
+    of updates reaches a power of two, which adds O(log n) amortized per
+    update.
+    """
+
+    def __init__(self, queue, operations=()):
+        """
+        Args:
+            queue: The queue to check.
+            operations: The operations already in the queue, sorted by
+                time.
+        """
+        self.queue = queue
+        if isinstance(queue, FusedRetroactivePriorityQueue):
+            self.reference = RetroactivePriorityQueue()
+        else:
+            self.reference = FusedRetroactivePriorityQueue()
+        # The value of every operation by time, None for delete-mins
+        self.operations = {}
+        for op in operations:
+            getattr(self.reference, op[0])(*op[1:])
+            self.operations[op[1]] = op[2] if len(op) > 2 else None
+        self.mirror = Counter(queue)
+        self.size = len(queue)
+        self.steps = 0
+        queue.subscribe(self._on_change)
+
+    def _on_change(self, op, change):
+        if change.added is not None:
+            self.mirror[change.added[1]] += 1
+            self.size += 1
+        if change.removed is not None:
+            self.mirror[change.removed[1]] -= 1
+            self.size -= 1
+
+    def apply(self, op):
+        """Apply an update tuple like those accepted by `apply_batch` to
+        the queue and check it.
+
+        Returns:
+            The `Change` returned by the queue.
+
+        Raises:
+            KeyError, ValueError: The error raised by both queues.
+            AssertionError: If the queues disagree.
+        """
+        name, t = op[0], op[1]
+        try:
+            expected = getattr(self.reference, name)(*op[1:])
+        except (KeyError, ValueError) as e:
+            expected = type(e)
+        try:
+            actual = getattr(self.queue, name)(*op[1:])
+        except (KeyError, ValueError) as e:
+            actual = type(e)
+        if actual != expected:
+            raise AssertionError("{!r} returned {!r}, expected {!r}".format(
+                op, actual, expected
+            ))
+        if isinstance(actual, type):
+            raise actual
+
+        if name == "remove":
+            del self.operations[t]
+        else:
+            self.operations[t] = op[2] if name == "add_insert" else None
+        self.check()
+        self.steps += 1
+        if self.steps & (self.steps - 1) == 0:
+            self.verify()
+        return actual
+
+    def check(self):
+        """Compare the size and minimum of the queue with the mirror and
+        the reference in O(1)."""
+        if not (
+            len(self.queue) == self.size == len(self.reference)
+            and self.queue.get_min() == self.reference.get_min()
+        ):
+            raise AssertionError("size or minimum differs")
+
+    def verify(self):
+        """Compare the contents of the queue with a full replay."""
+        heap = []
+        for t in sorted(self.operations):
+            v = self.operations[t]
+            if v is None:
+                heapq.heappop(heap)
+            else:
+                heapq.heappush(heap, v)
+        expected = sorted(heap)
+        if list(self.queue) != expected:
+            raise AssertionError("queue contents differ from a replay")
+        if +self.mirror != Counter(expected):
+            raise AssertionError("change feed differs from a replay")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Check that the structural work per update grows logarithmically.
+
+Usage:
+    python3 -m benchmarks.scaling [--max-n N] [--updates K]
+                                  [--tolerance F] [--fused] [--check]
+
+For n = 2^10, 2^11, ... up to --max-n (default 2^20, about 10^6), a queue is
+built from a random valid timeline of n operations with `from_operations`,
+which is not measured. Then K random retroactive updates (inserts and
+delete-mins at random times, removals of random operations) are applied
+under `retropq.instrumentation.Instrumentation`, and the averages per update
+of its counters are reported.
+
+The run fails (exit status 1) if, at any n, the nodes touched per update or
+the deepest search path divided by log2(n) exceed --tolerance times the same
+ratio at the smallest n. Calls to split/merge, read-only descents and bridge
+searches are expected to stay constant and must not exceed --tolerance times
+their value at the smallest n.
+
+With --check, every update is also verified by the incremental oracle in
+`benchmarks.oracle`, which compares it with the other engine in O(log n)
+instead of replaying the timeline.
+"""
+import argparse
+import math
+import random
+import sys
+
+from retropq import RetroactivePriorityQueue, FusedRetroactivePriorityQueue
+from retropq.instrumentation import Instrumentation
+
+from .oracle import IncrementalOracle
+
+
+# Counters that grow with the depth of the trees and counters that should
+# not grow at all
+LOGARITHMIC = ("nodes_touched", "depth")
+CONSTANT = ("splits", "merges", "queries", "bridge_searches")
+
+def timeline(n, rng):
+    # A random valid timeline of n operations, sorted by time
+    ops = []
+    size = 0
+    for t in range(n):
+        if size == 0 or rng.random() < 0.6:
+            ops.append(("add_insert", t, rng.random()))
+            size += 1
+        else:
+            ops.append(("add_delete_min", t))
+            size -= 1
+    return ops
+
+def updates(ops, k, rng):
+    # k random retroactive updates at times between those of ops, and
+    # removals of random operations of ops
+    n = len(ops)
+    times = [op[1] for op in ops]
+    result = []
+    for _ in range(k):
+        r = rng.random()
+        if r < 0.3 and times:
+            j = rng.randrange(len(times))
+            times[j], times[-1] = times[-1], times[j]
+            result.append(("remove", times.pop()))
+        elif r < 0.7:
+            t = rng.randrange(n) + rng.random()
+            result.append(("add_insert", t, rng.random()))
+        else:
+            result.append(("add_delete_min", rng.randrange(n) + rng.random()))
+    return result
+
+def measure(n, k, seed=1, fused=False, check=False):
+    """
+    Returns:
+        A dict with the averages per update of the `OperationStats`
+        counters and the deepest search path over all updates.
+    """
+    rng = random.Random(seed)
+    ops = timeline(n, rng)
+    if fused:
+        queue = FusedRetroactivePriorityQueue()
+        for op in ops:
+            getattr(queue, op[0])(*op[1:])
+    else:
+        queue = RetroactivePriorityQueue.from_operations(ops)
+    if check:
+        oracle = IncrementalOracle(queue, ops)
+
+    instr = Instrumentation(queue)
+    with instr:
+        for op in updates(ops, k, rng):
+            try:
+                if check:
+                    oracle.apply(op)
+                else:
+                    getattr(queue, op[0])(*op[1:])
+            except (KeyError, ValueError):
+                pass
+    if check:
+        oracle.verify()
+
+    result = {"n": n, "updates": k}
+    for name in CONSTANT + ("nodes_touched",):
+        result[name] = sum(
+            getattr(stats, name) for stats in instr.totals.values()
+        ) / k
+    result["depth"] = max(instr.max_depths.values())
+    return result
+
+def failures(results, tolerance):
+    """
+    Returns:
+        A message for every counter of every result that grows faster than
+        allowed compared to the first result.
+    """
+    base = results[0]
+    messages = []
+    for res in results[1:]:
+        ratio = math.log2(res["n"]) / math.log2(base["n"])
+        for name in LOGARITHMIC + CONSTANT:
+            limit = tolerance * base[name]
+            if name in LOGARITHMIC:
+                limit *= ratio
+            # Counters that are zero at the smallest n may be small constants
+            if res[name] > max(limit, tolerance):
+                messages.append(
+                    "n={}: {} = {:.2f} exceeds {:.2f}".format(
+                        res["n"], name, res[name], limit
+                    )
+                )
+    return messages
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check that the work per update grows logarithmically."
+    )
+    parser.add_argument("--min-n", type=int, default=2 ** 10)
+    parser.add_argument("--max-n", type=int, default=2 ** 20)
+    parser.add_argument(
+        "--updates", type=int, default=2000,
+        help="measured updates per size",
+    )
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--fused", action="store_true",
+        help="measure FusedRetroactivePriorityQueue",
+    )
+    parser.add_argument(
+        "--check", action="store_true",
+        help="verify every update with the incremental oracle",
+    )
+    args = parser.parse_args(argv)
+
+    line = "{:>9} {:>9} {:>7} {:>7} {:>8} {:>8} {:>6} {:>12}"
+    print(line.format(
+        "n", "nodes", "splits", "merges", "queries", "bridges", "depth",
+        "nodes/log n",
+    ))
+    results = []
+    n = args.min_n
+    while n <= args.max_n:
+        res = measure(n, args.updates, args.seed, args.fused, args.check)
+        results.append(res)
+        print(line.format(
+            "{:,}".format(n), "{:.1f}".format(res["nodes_touched"]),
+            "{:.2f}".format(res["splits"]), "{:.2f}".format(res["merges"]),
+            "{:.2f}".format(res["queries"]),
+            "{:.2f}".format(res["bridge_searches"]), res["depth"],
+            "{:.2f}".format(res["nodes_touched"] / math.log2(n)),
+        ), flush=True)
+        n *= 2
+
+    messages = failures(results, args.tolerance)
+    for message in messages:
+        print(message)
+    return 1 if messages else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
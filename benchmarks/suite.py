@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Benchmark the queues on named, realistic workloads.
+
+Usage:
+    python3 -m benchmarks.suite [-w WORKLOAD ...] [-b BACKEND ...]
+                                [--json PATH] [n ...]
+
+For every workload and n, a sequence of n operations is generated up front and
+then applied to an initially empty queue. Operations that the queue rejects
+(a delete-min on an empty queue, removing an operation that would make one
+invalid) still count. Reported are the throughput, the median and 99th
+percentile latency of a single operation and the peak memory allocated while
+running the workload, measured with tracemalloc in a second, untimed run.
+Defaults to n = 10^4 and 10^5; 10^6 takes a few minutes.
+
+Workloads:
+    append:     every operation is later than all existing ones
+    random:     operation times are uniformly random
+    near-now:   most operations land within the last 1% of the timeline
+    saturated:  as many delete-mins as inserts at random times, so the queue
+                is almost always empty and there are bridges everywhere
+    churn:      after filling half of the timeline, random operations are
+                removed as often as new ones are added
+
+Every queue runs on the treap backend unless other backends are selected with
+-b (treap, blocks). Results can be written as JSON with --json, to compare
+runs across commits.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+from retropq import RetroactivePriorityQueue, FusedRetroactivePriorityQueue
+from retropq import SortedBlocks, Treap
+
+
+QUEUES = [RetroactivePriorityQueue, FusedRetroactivePriorityQueue]
+BACKENDS = {"treap": Treap, "blocks": SortedBlocks}
+
+def _update(t, rng, insert_p=0.7):
+    if rng.random() < insert_p:
+        return ("add_insert", t, rng.random())
+    return ("add_delete_min", t)
+
+def append_ops(n, rng):
+    return [_update(t, rng) for t in range(n)]
+
+def random_ops(n, rng):
+    return [_update(rng.random(), rng) for _ in range(n)]
+
+def near_now_ops(n, rng):
+    ops = []
+    for i in range(n):
+        t = rng.uniform(0.99 * i, i) if i and rng.random() < 0.9 else i
+        ops.append(_update(t, rng))
+    return ops
+
+def saturated_ops(n, rng):
+    return [_update(rng.random(), rng, insert_p=0.5) for _ in range(n)]
+
+def churn_ops(n, rng):
+    ops = []
+    times = []
+    for i in range(n):
+        if i < n // 2 or rng.random() < 0.5 or not times:
+            t = rng.random()
+            times.append(t)
+            ops.append(_update(t, rng))
+        else:
+            # Remove a random earlier operation in O(1)
+            j = rng.randrange(len(times))
+            times[j], times[-1] = times[-1], times[j]
+            ops.append(("remove", times.pop()))
+    return ops
+
+WORKLOADS = {
+    "append": append_ops,
+    "random": random_ops,
+    "near-now": near_now_ops,
+    "saturated": saturated_ops,
+    "churn": churn_ops,
+}
+
+def run(queue_cls, ops, backend=Treap):
+    # Returns the latency of every operation in nanoseconds
+    queue = queue_cls(backend)
+    methods = {
+        name: getattr(queue, name)
+        for name in ["add_insert", "add_delete_min", "remove"]
+    }
+    clock = time.perf_counter_ns
+    latencies = []
+    for op in ops:
+        method = methods[op[0]]
+        start = clock()
+        try:
+            method(*op[1:])
+        except (KeyError, ValueError):
+            pass
+        latencies.append(clock() - start)
+    return latencies
+
+def peak_memory(queue_cls, ops, backend=Treap):
+    tracemalloc.start()
+    try:
+        run(queue_cls, ops, backend)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def percentile(sorted_values, q):
+    i = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[i]
+
+def benchmark(
+    queue_cls, workload, n, seed=1, memory=True, backend="treap"
+):
+    ops = WORKLOADS[workload](n, random.Random(seed))
+    latencies = sorted(run(queue_cls, ops, BACKENDS[backend]))
+    total = sum(latencies)
+    return {
+        "queue": queue_cls.__name__,
+        "backend": backend,
+        "workload": workload,
+        "n": n,
+        "ops_per_sec": n / (total / 1e9) if total else None,
+        "p50_us": percentile(latencies, 0.5) / 1e3,
+        "p99_us": percentile(latencies, 0.99) / 1e3,
+        "peak_memory_bytes": (
+            peak_memory(queue_cls, ops, BACKENDS[backend]) if memory else None
+        ),
+    }
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the queues on named workloads."
+    )
+    parser.add_argument(
+        "sizes", nargs="*", type=int, default=[10 ** 4, 10 ** 5]
+    )
+    parser.add_argument(
+        "-w", "--workload", action="append", choices=list(WORKLOADS),
+        help="run only this workload, can be repeated",
+    )
+    parser.add_argument(
+        "-b", "--backend", action="append", choices=list(BACKENDS),
+        help="run on this backend, can be repeated (default: treap)",
+    )
+    parser.add_argument("--json", metavar="PATH", help="write results to PATH")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--no-memory", action="store_true",
+        help="skip the tracemalloc run",
+    )
+    args = parser.parse_args(argv)
+
+    results = []
+    line = "{:<10} {:<30} {:<7} {:>9} {:>12} {:>9} {:>9} {:>10}"
+    print(line.format(
+        "workload", "queue", "backend", "n", "ops/s", "p50 us", "p99 us",
+        "peak MiB",
+    ))
+    for workload in args.workload or list(WORKLOADS):
+        for n in args.sizes:
+            for queue_cls in QUEUES:
+                for backend in args.backend or ["treap"]:
+                    res = benchmark(
+                        queue_cls, workload, n, args.seed,
+                        not args.no_memory, backend,
+                    )
+                    results.append(res)
+                    memory = res["peak_memory_bytes"]
+                    print(line.format(
+                        workload, res["queue"], backend, "{:,}".format(n),
+                        "{:,.0f}".format(res["ops_per_sec"]),
+                        "{:.1f}".format(res["p50_us"]),
+                        "{:.1f}".format(res["p99_us"]),
+                        "-" if memory is None
+                        else "{:.1f}".format(memory / 2 ** 20),
+                    ))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "commit": _commit(),
+                "python": platform.python_version(),
+                "seed": args.seed,
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Compare the iterative treap engine against the former recursive one.
+
+Usage:
+    python3 -m benchmarks.treap_engine [n ...]
+
+For every n, a treap with n keys is built once and then both engines run the
+same random sequence of splits/merges, finds, removes and a full in-order
+traversal on it. Defaults to n = 10^6; pass 10000000 to reproduce the 10^7
+numbers (needs a few GB of memory).
+"""
+import random
+import sys
+import time
+
+from retropq import treap
+
+
+def _recursive_split(root, key, agg_f, eq_left=False):
+    if root is None:
+        return None, None
+
+    if root.key < key or root.key == key and eq_left:
+        s_left, s_right = _recursive_split(root.right, key, agg_f, eq_left)
+        root.right = s_left
+        root.update_aggregate(agg_f)
+        return root, s_right
+    else:
+        s_left, s_right = _recursive_split(root.left, key, agg_f, eq_left)
+        root.left = s_right
+        root.update_aggregate(agg_f)
+        return s_left, root
+
+def _recursive_merge(left, right, agg_f):
+    if left is None:
+        return right
+    elif right is None:
+        return left
+    elif left.p < right.p:
+        left.right = _recursive_merge(left.right, right, agg_f)
+        left.update_aggregate(agg_f)
+        return left
+    else:
+        right.left = _recursive_merge(left, right.left, agg_f)
+        right.update_aggregate(agg_f)
+        return right
+
+def _recursive_remove(root, key, agg_f):
+    if root is None:
+        raise KeyError
+    elif root.key == key:
+        return _recursive_merge(root.left, root.right, agg_f)
+    else:
+        if key < root.key:
+            root.left = _recursive_remove(root.left, key, agg_f)
+        else:
+            root.right = _recursive_remove(root.right, key, agg_f)
+        root.update_aggregate(agg_f)
+        return root
+
+def _recursive_find(root, key):
+    if root is None:
+        raise KeyError
+    elif key == root.key:
+        return root.value
+    elif key < root.key:
+        return _recursive_find(root.left, key)
+    else:
+        return _recursive_find(root.right, key)
+
+def _recursive_iter(node):
+    if node.left is not None:
+        yield from _recursive_iter(node.left)
+    yield node.key, node.value
+    if node.right is not None:
+        yield from _recursive_iter(node.right)
+
+
+ENGINES = {
+    "recursive": (
+        _recursive_split, _recursive_merge, _recursive_remove,
+        _recursive_find, _recursive_iter,
+    ),
+    "iterative": (
+        treap.split, treap.merge, treap.remove, treap.find, iter,
+    ),
+}
+
+
+def build(n, agg_f):
+    t = treap.Treap(agg_f)
+    for k in range(n):
+        t._root = treap.merge(t._root, treap.Node(2 * k, 1), agg_f)
+    t._len = n
+    return t
+
+def run_engine(t, engine, keys):
+    split, merge, remove, find, iterate = ENGINES[engine]
+    agg_f = t._agg_f
+    timings = {}
+
+    start = time.perf_counter()
+    for k in keys:
+        left, right = split(t._root, k, agg_f)
+        t._root = merge(left, right, agg_f)
+    timings["split+merge"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for k in keys:
+        find(t._root, k - k % 2)
+    timings["find"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for k in keys:
+        k -= k % 2
+        t._root = remove(t._root, k, agg_f)
+        left, right = split(t._root, k, agg_f)
+        t._root = merge(merge(left, treap.Node(k, 1), agg_f), right, agg_f)
+    timings["remove+insert"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in iterate(t._root):
+        pass
+    timings["traversal"] = time.perf_counter() - start
+
+    return timings
+
+def main(sizes, op_cnt=10 ** 5):
+    for n in sizes:
+        t = build(n, lambda x, y: x + y)
+        rng = random.Random(n)
+        keys = [rng.randrange(2 * n) for _ in range(op_cnt)]
+
+        results = {
+            engine: run_engine(t, engine, keys) for engine in ENGINES
+        }
+        print("n = {:,} ({:,} operations per phase)".format(n, op_cnt))
+        for phase in results["recursive"]:
+            old = results["recursive"][phase]
+            new = results["iterative"][phase]
+            print("    {:<14} recursive {:7.3f}s  iterative {:7.3f}s  "
+                  "speedup {:.2f}x".format(phase, old, new, old / new))
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10 ** 6])
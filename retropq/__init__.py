@@ -1 +1,5 @@
-from .retropq import RetroactivePriorityQueue
+from .retropq import Change, RetroactivePriorityQueue
+from .fused import FusedRetroactivePriorityQueue
+from .concurrent import ConcurrentRetroactivePriorityQueue
+from .sorted_blocks import SortedBlocks
+from .treap import Treap
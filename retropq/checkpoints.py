@@ -0,0 +1,120 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+
+class _Replay:
+    # The queue at some time, as the sorted contents of a checkpoint minus
+    # its first `start` values, plus a heap of values inserted since
+    __slots__ = ("base", "start", "heap")
+
+    def __init__(self, base):
+        self.base = base
+        self.start = 0
+        self.heap = []
+
+    def apply(self, op):
+        if op[0] == "add_insert":
+            heapq.heappush(self.heap, op[2])
+        elif self.heap and (
+            self.start == len(self.base)
+            or self.heap[0] < self.base[self.start]
+        ):
+            heapq.heappop(self.heap)
+        else:
+            self.start += 1
+
+    def get_min(self):
+        if self.start < len(self.base):
+            base_min = self.base[self.start]
+            if self.heap and self.heap[0] < base_min:
+                return self.heap[0]
+            return base_min
+        return self.heap[0] if self.heap else None
+
+    def __iter__(self):
+        return heapq.merge(
+            islice(self.base, self.start, None), sorted(self.heap)
+        )
+
+    def __len__(self):
+        return len(self.base) - self.start + len(self.heap)
+
+
+class Checkpoints:
+    # Contents of the queue at a few past times, used to answer queries about
+    # the past by replaying only the operations since the closest checkpoint
+    # before the queried time. A checkpoint at time c stays valid until an
+    # operation at a time <= c is added or removed. Checkpoints are not
+    # repaired: a change at time t changes every later past state by one
+    # element, but which one depends on the values removed by all
+    # delete-mins in between, which no tree maintains. So after a change at
+    # time t the next query at a later time replays everything since the
+    # last checkpoint before t.
+
+    # Replays at least this long store their result as a new checkpoint
+    interval = 512
+    # Maximum number of checkpoints; the least recently used one is dropped
+    capacity = 64
+
+    def __init__(self):
+        self._times = []
+        self._states = []
+        self._last_used = []
+        self._clock = 0
+
+    def invalidate(self, t):
+        # Drops all checkpoints at times >= t
+        if self._times and not self._times[-1] < t:
+            i = bisect_left(self._times, t)
+            del self._times[i:]
+            del self._states[i:]
+            del self._last_used[i:]
+
+    def clear(self):
+        self.__init__()
+
+    def fork(self):
+        # Checkpoint states are never modified, so copies can share them
+        other = Checkpoints()
+        other._times = self._times[:]
+        other._states = self._states[:]
+        other._last_used = self._last_used[:]
+        other._clock = self._clock
+        return other
+
+    def replay(self, queue, t):
+        # Returns a _Replay of the queue after all operations at times <= t
+        i = bisect_right(self._times, t)
+        if i > 0:
+            self._clock += 1
+            self._last_used[i - 1] = self._clock
+            replay = _Replay(self._states[i - 1])
+            ops = queue._operations(self._times[i - 1], include_start=False)
+        else:
+            replay = _Replay([])
+            ops = queue._operations()
+
+        replayed = 0
+        for op in ops:
+            if t < op[1]:
+                break
+            replay.apply(op)
+            replayed += 1
+
+        if replayed >= self.interval:
+            self._add(t, list(replay))
+        return replay
+
+    def _add(self, t, state):
+        if len(self._times) >= self.capacity:
+            j = self._last_used.index(min(self._last_used))
+            del self._times[j]
+            del self._states[j]
+            del self._last_used[j]
+
+        self._clock += 1
+        i = bisect_left(self._times, t)
+        self._times.insert(i, t)
+        self._states.insert(i, state)
+        self._last_used.insert(i, self._clock)
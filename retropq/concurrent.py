@@ -0,0 +1,180 @@
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from .retropq import RetroactivePriorityQueue
+
+
+class _ReadWriteLock:
+    # Any number of readers or a single writer. Waiting writers block new
+    # readers, so a steady stream of reads cannot starve updates.
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+class ConcurrentRetroactivePriorityQueue:
+    """A retroactive priority queue that can be shared between threads.
+
+    Updates are serialized, while queries that walk the trees run
+    concurrently with each other. `get_min` and `len` never block: every
+    update publishes their new values when it finishes, so they may lag
+    behind an update in progress. Iteration works on a `snapshot`, which is
+    an O(1) fork of the queue taken under the lock. Long scans therefore
+    only block updates for the time it takes to fork.
+    """
+
+    def __init__(self, queue=None):
+        """
+        Args:
+            queue: The queue to wrap, a new `RetroactivePriorityQueue` by
+                default. It must not be used directly afterwards.
+        """
+        if queue is None:
+            queue = RetroactivePriorityQueue()
+        self._queue = queue
+        self._lock = _ReadWriteLock()
+        # (get_min(), len()) after the last update, replaced as a whole
+        self._published = (self._queue.get_min(), len(self._queue))
+
+    def _update(self, name, *args):
+        with self._lock.write():
+            try:
+                return getattr(self._queue, name)(*args)
+            finally:
+                self._published = (self._queue.get_min(), len(self._queue))
+
+    def _read(self, name, *args):
+        with self._lock.read():
+            return getattr(self._queue, name)(*args)
+
+    def add_insert(self, t, value):
+        """See `RetroactivePriorityQueue.add_insert`."""
+        return self._update("add_insert", t, value)
+
+    def add_delete_min(self, t):
+        """See `RetroactivePriorityQueue.add_delete_min`."""
+        return self._update("add_delete_min", t)
+
+    def remove(self, t):
+        """See `RetroactivePriorityQueue.remove`."""
+        return self._update("remove", t)
+
+    def apply_batch(self, operations):
+        """See `RetroactivePriorityQueue.apply_batch`."""
+        return self._update("apply_batch", list(operations))
+
+    def compact(self, before):
+        """See `RetroactivePriorityQueue.compact`."""
+        return self._update("compact", before)
+
+    def subscribe(self, listener):
+        """See `RetroactivePriorityQueue.subscribe`.
+
+        Listeners are called while the write lock is held, so they must not
+        call back into this queue.
+        """
+        with self._lock.write():
+            self._queue.subscribe(listener)
+
+    def unsubscribe(self, listener):
+        """See `RetroactivePriorityQueue.unsubscribe`."""
+        with self._lock.write():
+            self._queue.unsubscribe(listener)
+
+    def snapshot(self) -> RetroactivePriorityQueue:
+        """
+        Returns:
+            An independent copy of the queue that is not affected by later
+            updates. It is not thread-safe itself.
+        """
+        # Forking only replaces the owner tokens of the trees and copies
+        # the checkpoint lists, neither of which concurrent readers use
+        with self._lock.read():
+            return self._queue.fork()
+
+    def get_min(self):
+        """The smallest element after the last finished update, without
+        blocking. See `RetroactivePriorityQueue.get_min`."""
+        return self._published[0]
+
+    def __len__(self) -> int:
+        """The size after the last finished update, without blocking."""
+        return self._published[1]
+
+    def __iter__(self) -> Iterator:
+        """Iterate over a snapshot of the queue."""
+        return iter(self.snapshot())
+
+    def __contains__(self, v) -> bool:
+        return self._read("__contains__", v)
+
+    def get_max(self):
+        return self._read("get_max")
+
+    def rank(self, v) -> int:
+        return self._read("rank", v)
+
+    def kth(self, k: int):
+        return self._read("kth", k)
+
+    def nsmallest(self, k: int) -> list:
+        return self._read("nsmallest", k)
+
+    def count_between(self, lo, hi) -> int:
+        return self._read("count_between", lo, hi)
+
+    def size_at(self, t) -> int:
+        return self._read("size_at", t)
+
+    def preview_add_insert(self, t, value):
+        return self._read("preview_add_insert", t, value)
+
+    def preview_add_delete_min(self, t):
+        return self._read("preview_add_delete_min", t)
+
+    def preview_remove(self, t):
+        return self._read("preview_remove", t)
+
+    def get_min_at(self, t):
+        """See `RetroactivePriorityQueue.get_min_at`.
+
+        Takes the write lock, since the query may store a new checkpoint.
+        """
+        with self._lock.write():
+            return self._queue.get_min_at(t)
+
+    def iter_at(self, t) -> Iterator:
+        """Iterate over the queue at a past time, using a snapshot."""
+        return self.snapshot().iter_at(t)
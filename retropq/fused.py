@@ -0,0 +1,270 @@
+from copy import copy
+from operator import add
+from typing import TypeVar
+
+from .ordered_multiset import OrderedMultiset
+from .queue_base import QueueBase
+from .retropq import Change
+from .treap import Treap
+from .zero_prefix_bst import zero_prefix_after, zero_prefix_before
+
+
+T = TypeVar("T")
+V = TypeVar("V")
+
+class OperationAggregator:
+    # Everything RetroactivePriorityQueue keeps about a range of operations in
+    # _bridges, _size_changes, _inserts_in_q and _deleted_inserts, in one
+    # flat aggregate. The bridge prefix sums use the field names of
+    # MinPrefixSumAggregator so they can be passed to the zero_prefix
+    # functions directly; the size prefix sums only keep what
+    # _is_empty_after needs. max_deleted and min_in_q are None where the
+    # range contributes nothing.
+    __slots__ = (
+        "sum", "min_key",
+        "min_prefix_sum", "min_prefix_first_key", "min_prefix_last_key",
+        "size_sum", "size_min_prefix_sum", "size_min_prefix_last_key",
+        "max_deleted", "min_in_q",
+    )
+
+    def __init__(self, t, bridge, value):
+        # bridge is 0 for an insert in Q_now, 1 for a deleted insert and -1
+        # for a delete-min, as in RetroactivePriorityQueue._bridges
+        self.sum = self.min_prefix_sum = bridge
+        self.min_key = self.min_prefix_first_key = t
+        self.min_prefix_last_key = t
+
+        self.size_sum = self.size_min_prefix_sum = -1 if bridge < 0 else 1
+        self.size_min_prefix_last_key = t
+
+        self.max_deleted = (value, t) if bridge == 1 else None
+        self.min_in_q = (value, t) if bridge == 0 else None
+
+    def __add__(self, other):
+        # Same as MinPrefixSumAggregator.__add__ for both prefix sums, but
+        # without allocating intermediate aggregators
+        res = OperationAggregator.__new__(OperationAggregator)
+
+        res.sum = self.sum + other.sum
+        res.min_key = self.min_key
+        left_min = self.min_prefix_sum
+        right_min = self.sum + other.min_prefix_sum
+        if left_min < right_min:
+            res.min_prefix_sum = left_min
+            res.min_prefix_first_key = self.min_prefix_first_key
+            res.min_prefix_last_key = self.min_prefix_last_key
+        elif right_min < left_min:
+            res.min_prefix_sum = right_min
+            res.min_prefix_first_key = other.min_prefix_first_key
+            res.min_prefix_last_key = other.min_prefix_last_key
+        else:
+            res.min_prefix_sum = left_min
+            res.min_prefix_first_key = self.min_prefix_first_key
+            res.min_prefix_last_key = other.min_prefix_last_key
+
+        res.size_sum = self.size_sum + other.size_sum
+        left_min = self.size_min_prefix_sum
+        right_min = self.size_sum + other.size_min_prefix_sum
+        if right_min <= left_min:
+            res.size_min_prefix_sum = right_min
+            res.size_min_prefix_last_key = other.size_min_prefix_last_key
+        else:
+            res.size_min_prefix_sum = left_min
+            res.size_min_prefix_last_key = self.size_min_prefix_last_key
+
+        left, right = self.max_deleted, other.max_deleted
+        if left is None or right is not None and left < right:
+            res.max_deleted = right
+        else:
+            res.max_deleted = left
+
+        left, right = self.min_in_q, other.min_in_q
+        if left is None or right is not None and right < left:
+            res.min_in_q = right
+        else:
+            res.min_in_q = left
+
+        return res
+
+class FusedRetroactivePriorityQueue(QueueBase[T, V]):
+    """A partially retroactive priority queue backed by a single tree.
+
+    Supports the updates, previews, change feed and queries about the queue
+    after all operations of `RetroactivePriorityQueue`, but not
+    `from_operations`, its queries about the past (`size_at`, `get_min_at`,
+    `iter_at`) or the operation history (`operations`, `count_operations`,
+    `matched_delete`, `matched_insert`), `apply_batch`, `compact` or
+    `dump`/`load`.
+
+    It stores one node per operation in a single treap keyed by time whose
+    aggregate combines the bridge and size prefix sums, the largest deleted
+    insert and the smallest insert in the queue. Every change to the
+    timeline writes to this one tree instead of up to four.
+    """
+
+    def __init__(self, backend=Treap):
+        """Initialize a queue with no operations.
+
+        Args:
+            backend: See `RetroactivePriorityQueue.__init__`.
+        """
+        self._q_now = OrderedMultiset(backend)
+        self._ops = backend(add)
+        self._listeners = []
+
+    def fork(self):
+        """Create an independent copy of the queue in O(1)
+
+        See `RetroactivePriorityQueue.fork`.
+        """
+        other = copy(self)
+        other._q_now = self._q_now.fork()
+        other._ops = self._ops.fork()
+        other._listeners = []
+        return other
+
+    def _set(self, t, bridge, value=None):
+        self._ops[t] = OperationAggregator(t, bridge, value)
+
+    def _insert_for_t(self, t):
+        bridge = zero_prefix_before(t, self._ops.agg_before(t))
+        insert_v, insert_t = self._ops.agg_after(
+            bridge, include_eq=True
+        ).max_deleted
+        return insert_t, insert_v
+
+    def _delete_for_t(self, t):
+        bridge = zero_prefix_after(t, self._ops.agg(), self._ops.agg_after(t))
+        delete_v, delete_t = self._ops.agg_before(
+            bridge, include_eq=True
+        ).min_in_q
+        return delete_t, delete_v
+
+    def _promote_to_q(self, t, v):
+        self._q_now.add(v)
+        self._set(t, 0, v)
+        return Change((t, v), None)
+
+    def _delete_from_q(self, t, v):
+        self._q_now.remove(v)
+        self._set(t, 1, v)
+        return Change(None, (t, v))
+
+    def _is_empty_after(self, t):
+        agg_before = self._ops.agg_before(t, include_eq=True)
+        if agg_before is None or agg_before.size_sum == 0:
+            return True
+
+        agg = self._ops.agg()
+        return (
+            agg.size_min_prefix_sum == 0
+            and agg.size_min_prefix_last_key >= t
+        )
+
+    def add_insert(self, t: T, value: V) -> Change:
+        """Create a new insert operation
+
+        See `RetroactivePriorityQueue.add_insert`.
+        """
+        last_t = self._ops.last_key()
+        if last_t is None or last_t < t:
+            change = self._promote_to_q(t, value)
+        else:
+            if t in self._ops:
+                raise KeyError
+
+            # Insert as if it is be deleted
+            self._set(t, 1, value)
+
+            insert_t, insert_v = self._insert_for_t(t)
+            change = self._promote_to_q(insert_t, insert_v)
+        self._notify(("add_insert", t, value), change)
+        return change
+
+    def add_delete_min(self, t: T) -> Change:
+        """Create a new delete-min operation
+
+        See `RetroactivePriorityQueue.add_delete_min`.
+        """
+        if t in self._ops:
+            raise KeyError
+        if self._is_empty_after(t):
+            raise ValueError
+
+        delete_t, delete_v = self._delete_for_t(t)
+        self._set(t, -1)
+        change = self._delete_from_q(delete_t, delete_v)
+        self._notify(("add_delete_min", t), change)
+        return change
+
+    def remove(self, t: T) -> Change:
+        """Remove an operation
+
+        See `RetroactivePriorityQueue.remove`.
+        """
+        op = self._ops[t]
+        op_type = op.sum
+
+        if op_type < 0:
+            insert_t, insert_v = self._insert_for_t(t)
+            self._ops.remove(t)
+            change = self._promote_to_q(insert_t, insert_v)
+        elif op_type == 0:
+            v, _ = op.min_in_q
+            self._q_now.remove(v)
+            self._ops.remove(t)
+            change = Change(None, (t, v))
+        else:
+            if self._is_empty_after(t):
+                raise ValueError
+            delete_t, delete_v = self._delete_for_t(t)
+            change = self._delete_from_q(delete_t, delete_v)
+            self._ops.remove(t)
+        self._notify(("remove", t), change)
+        return change
+
+    def preview_add_insert(self, t: T, value: V) -> Change:
+        """The effect of `add_insert(t, value)`, without changing the queue
+
+        See `RetroactivePriorityQueue.preview_add_insert`.
+        """
+        last_t = self._ops.last_key()
+        if last_t is None or last_t < t:
+            return Change((t, value), None)
+        if t in self._ops:
+            raise KeyError
+
+        bridge = zero_prefix_before(t, self._ops.agg_before(t))
+        after = self._ops.agg_after(bridge, include_eq=True)
+        best = after.max_deleted if after is not None else None
+        if best is None or best < (value, t):
+            return Change((t, value), None)
+        insert_v, insert_t = best
+        return Change((insert_t, insert_v), None)
+
+    def preview_add_delete_min(self, t: T) -> Change:
+        """The effect of `add_delete_min(t)`, without changing the queue
+
+        See `RetroactivePriorityQueue.preview_add_delete_min`.
+        """
+        if t in self._ops:
+            raise KeyError
+        if self._is_empty_after(t):
+            raise ValueError
+        return Change(None, self._delete_for_t(t))
+
+    def preview_remove(self, t: T) -> Change:
+        """The effect of `remove(t)`, without changing the queue
+
+        See `RetroactivePriorityQueue.preview_remove`.
+        """
+        op = self._ops[t]
+        if op.sum < 0:
+            return Change(self._insert_for_t(t), None)
+        elif op.sum == 0:
+            v, _ = op.min_in_q
+            return Change(None, (t, v))
+        else:
+            if self._is_empty_after(t):
+                raise ValueError
+            return Change(None, self._delete_for_t(t))
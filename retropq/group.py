@@ -0,0 +1,265 @@
+"""Many independent queues, partitioned across worker processes.
+
+    with RetroactivePriorityQueueGroup(processes=4) as group:
+        results = group.apply([
+            ("tenant-a", ("add_insert", 10, 3)),
+            ("tenant-b", ("add_delete_min", 5)),
+        ])
+        mins = group.get_mins()
+
+Every key names one `RetroactivePriorityQueue`, created on first use, which
+lives in the shard process chosen by hashing the key. `apply` sends each shard
+its part of the operations in one message and the shards apply them in
+parallel, so updating many queues scales across cores. Keys, times, values,
+changes and exceptions are pickled between processes.
+"""
+import multiprocessing
+from collections import defaultdict
+from typing import Optional
+
+from .retropq import RetroactivePriorityQueue, _batch_changes
+from .treap import Treap
+
+
+# Operations and the length of their tuples
+_ARITY = {"add_insert": 3, "add_delete_min": 2, "remove": 2}
+
+
+def _check(op):
+    # Raises the error for an operation that no queue could apply
+    if not isinstance(op, tuple) or not op or op[0] not in _ARITY:
+        raise ValueError("unknown operation {!r}".format(op))
+    if len(op) != _ARITY[op[0]]:
+        raise TypeError("{} takes {} arguments".format(
+            op[0], _ARITY[op[0]] - 1
+        ))
+
+def _guarded(queue, update):
+    # Calls update(queue) and returns (queue, its result or the exception it
+    # raised). If it raises anything other than the queue's KeyError or
+    # ValueError, e.g. a TypeError for values that cannot be compared, it
+    # may have changed the queue half way, so a fork taken before is
+    # returned instead.
+    backup = queue.fork()
+    try:
+        return queue, update(queue)
+    except (KeyError, ValueError) as e:
+        return queue, e
+    except Exception as e:
+        return backup, e
+
+def _apply(queue, ops):
+    # Applies ops to queue as one batch, or one at a time in order if the
+    # batch is rejected. Returns the queue, which is replaced if an update
+    # had to be undone, and the result of every operation: its Change, the
+    # exception it raised or None if the batch was rebuilt.
+    queue, changes = _guarded(queue, lambda q: _batch_changes(q, ops))
+    if changes is None:
+        return queue, [None] * len(ops)
+    if not isinstance(changes, Exception):
+        return queue, [changes[op[1]] for op in ops]
+    results = []
+    for op in ops:
+        queue, result = _guarded(
+            queue, lambda q: getattr(q, op[0])(*op[1:])
+        )
+        results.append(result)
+    return queue, results
+
+def _serve_shard(conn, backend):
+    # Runs in a shard process until it receives "close". An exception while
+    # answering a command is sent back instead of the reply.
+    queues = {}
+    while True:
+        command, payload = conn.recv()
+        if command == "close":
+            return
+        try:
+            conn.send(_answer(queues, backend, command, payload))
+        except Exception as e:
+            conn.send(e)
+
+def _answer(queues, backend, command, payload):
+    if command == "apply":
+        # payload maps keys to (indices, operations)
+        results = {}
+        for key, (indices, ops) in payload.items():
+            if key not in queues:
+                queues[key] = RetroactivePriorityQueue(backend)
+            queues[key], key_results = _apply(queues[key], ops)
+            results.update(zip(indices, key_results))
+        return results
+    elif command == "get_mins":
+        return {key: queues[key].get_min() for key in payload}
+    elif command == "sizes":
+        return {key: len(queues[key]) for key in payload}
+    elif command == "fetch":
+        return queues.get(payload)
+    raise ValueError("unknown command {!r}".format(command))
+
+class RetroactivePriorityQueueGroup:
+    """A collection of retroactive priority queues, one per key, spread over
+    a pool of processes."""
+
+    def __init__(self, processes: Optional[int] = None, backend=Treap):
+        """
+        Args:
+            processes: The number of shard processes, the number of CPUs by
+                default.
+            backend: The ordered map the queues are built on, see
+                `RetroactivePriorityQueue.__init__`. It has to be picklable,
+                which classes defined at module level are.
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self._conns = []
+        self._processes = []
+        for _ in range(processes):
+            conn, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_serve_shard, args=(child, backend), daemon=True
+            )
+            process.start()
+            child.close()
+            self._conns.append(conn)
+            self._processes.append(process)
+        # Keys of all queues, in the order they were created
+        self._keys = {}
+
+    def _shard(self, key):
+        return hash(key) % len(self._conns)
+
+    def _broadcast(self, command, payloads):
+        # Sends payloads[shard] to every shard that has one before waiting
+        # for any of them, then returns their replies merged into one dict
+        shards = [s for s in range(len(self._conns)) if s in payloads]
+        for s in shards:
+            self._conns[s].send((command, payloads[s]))
+        replies = [self._conns[s].recv() for s in shards]
+        merged = {}
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+            merged.update(reply)
+        return merged
+
+    def _by_shard(self, keys):
+        payloads = defaultdict(list)
+        for key in keys:
+            if key not in self._keys:
+                raise KeyError(key)
+            payloads[self._shard(key)].append(key)
+        return payloads
+
+    def apply(self, operations) -> list:
+        """Apply a batch of operations to the queues in parallel
+
+        The operations on one queue are applied together with
+        `RetroactivePriorityQueue.apply_batch`. If the queue rejects them,
+        they are applied one at a time in the given order instead, skipping
+        the ones that fail. Operations that are malformed are rejected
+        before anything is sent to the shards.
+
+        Args:
+            operations: Pairs `(key, op)` where op is a tuple accepted by
+                `apply_batch`. Queues for new keys are created empty.
+
+        Returns:
+            A list with the result of every operation, in the order of
+            `operations`: the `Change` it made, or the exception it raised
+            if it failed. Operations on a queue that were applied together
+            by rebuilding its trees (see `apply_batch`) have no change of
+            their own and get None. Unknown operations fail with ValueError
+            and ones with the wrong number of arguments with TypeError;
+            failures of the queue, such as a TypeError for values that
+            cannot be compared, leave it as it was before the operation.
+        """
+        payloads = defaultdict(dict)
+        rejected = {}
+        n = 0
+        for i, (key, op) in enumerate(operations):
+            n = i + 1
+            try:
+                _check(op)
+            except (TypeError, ValueError) as e:
+                rejected[i] = e
+                continue
+            self._keys[key] = None
+            shard = payloads[self._shard(key)]
+            if key not in shard:
+                shard[key] = ([], [])
+            shard[key][0].append(i)
+            shard[key][1].append(op)
+
+        results = [None] * n
+        for i, e in rejected.items():
+            results[i] = e
+        for i, result in self._broadcast("apply", payloads).items():
+            results[i] = result
+        return results
+
+    def get_mins(self, keys=None) -> dict:
+        """
+        Args:
+            keys: The keys to query, all keys by default.
+
+        Returns:
+            A dict mapping every key to the smallest element of its queue or
+            `None` if it is empty, gathered from all shards in parallel.
+
+        Raises:
+            KeyError: If a key has no queue.
+        """
+        keys = self._keys if keys is None else keys
+        return self._broadcast("get_mins", self._by_shard(keys))
+
+    def sizes(self, keys=None) -> dict:
+        """Like `get_mins`, but maps every key to the size of its queue."""
+        keys = self._keys if keys is None else keys
+        return self._broadcast("sizes", self._by_shard(keys))
+
+    def fetch(self, key) -> RetroactivePriorityQueue:
+        """
+        Returns:
+            A copy of the queue for key.
+
+        Raises:
+            KeyError: If the key has no queue.
+        """
+        if key not in self._keys:
+            raise KeyError(key)
+        conn = self._conns[self._shard(key)]
+        conn.send(("fetch", key))
+        reply = conn.recv()
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def keys(self) -> list:
+        """The keys of all queues, in the order they were created."""
+        return list(self._keys)
+
+    def __contains__(self, key) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        """The number of queues."""
+        return len(self._keys)
+
+    def close(self):
+        """Stop the shard processes."""
+        # Forked shards inherit the other ends of earlier pipes, so closing
+        # them would not be noticed
+        for conn in self._conns:
+            conn.send(("close", None))
+            conn.close()
+        for process in self._processes:
+            process.join()
+        self._conns = []
+        self._processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
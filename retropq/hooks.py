@@ -0,0 +1,28 @@
+# Instance-attribute wrappers around the methods of a queue, used by
+# retropq.instrumentation and retropq.journal. Several may wrap the same
+# queue at once, each around the methods left by the ones before it, and be
+# removed in any order: a wrapper that is still wrapped by a later one cannot
+# be taken out of the chain, so it stays and its owner makes it pass calls
+# through once removed.
+
+_MISSING = object()
+
+def install(obj, wrappers):
+    # Sets the wrappers, a dict of functions by method name, as attributes
+    # of obj. Returns what they replaced, for uninstall.
+    saved = {}
+    for name, wrapper in wrappers.items():
+        saved[name] = obj.__dict__.get(name, _MISSING)
+        setattr(obj, name, wrapper)
+    return saved
+
+def uninstall(obj, wrappers, saved):
+    # Restores the attributes replaced by install wherever the wrapper is
+    # still the outermost one
+    for name, wrapper in wrappers.items():
+        if obj.__dict__.get(name) is not wrapper:
+            continue
+        if saved[name] is _MISSING:
+            del obj.__dict__[name]
+        else:
+            setattr(obj, name, saved[name])
@@ -0,0 +1,235 @@
+"""Optional counters and timings for the operations of a queue.
+
+    instr = Instrumentation(queue, callback=print)
+    with instr:
+        queue.add_insert(1, "a")
+    instr.totals["add_insert"].splits
+
+While an `Instrumentation` is enabled, the public operations of its queue are
+wrapped to time them and to count what the treap primitives do on their
+behalf. The treap and zero-prefix modules only report to the stats of the
+operation in progress; when no instrumented operation is running, each
+primitive pays a single `is None` check.
+
+Counted per operation:
+    splits, merges: Calls to `treap.split` and `treap.merge`.
+    nodes_touched: Nodes on the paths walked by the mutating primitives.
+    aggregate_updates: Calls to `Node.update_aggregate`.
+    queries: Read-only descents (`agg_before`, `agg_after`, `find`,
+        `find_prefix`).
+    bridge_searches: Calls to `zero_prefix_before`/`zero_prefix_after`.
+    depths: The longest search path walked to insert, overwrite or remove
+        a node in every internal tree.
+"""
+import time
+
+from . import hooks, treap, zero_prefix_bst
+from .ordered_map import WrappedMap
+from .ordered_multiset import OrderedMultiset
+from .sorted_blocks import SortedBlocks
+
+
+# Public methods that are timed and counted if the queue has them
+OPERATIONS = (
+    "add_insert", "add_delete_min", "remove", "apply_batch",
+    "size_at", "get_min_at",
+)
+
+class OperationStats:
+    __slots__ = (
+        "name", "count", "seconds", "splits", "merges", "nodes_touched",
+        "aggregate_updates", "queries", "bridge_searches", "depths",
+        "_depth",
+    )
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.seconds = 0.0
+        self.splits = 0
+        self.merges = 0
+        self.nodes_touched = 0
+        self.aggregate_updates = 0
+        self.queries = 0
+        self.bridge_searches = 0
+        # Maps internal tree names to the longest search path walked in them
+        self.depths = {}
+        self._depth = 0
+
+    # Called by the treap primitives
+
+    def on_split(self, path_len):
+        self.splits += 1
+        self.nodes_touched += path_len
+        self.aggregate_updates += path_len
+
+    def on_merge(self, path_len):
+        self.merges += 1
+        self.nodes_touched += path_len
+        self.aggregate_updates += path_len
+
+    def on_walk(self, path_len, updates):
+        # A root-to-node walk of an insert or remove. The depth is recorded
+        # for the tree by on_tree once the Treap method knows which it is.
+        self.nodes_touched += path_len
+        self.aggregate_updates += updates
+        self._depth = path_len
+
+    def on_tree(self, tree):
+        if self._depth > self.depths.get(tree, 0):
+            self.depths[tree] = self._depth
+
+    def add(self, other):
+        # Accumulates the stats of another operation into this one
+        self.count += other.count
+        self.seconds += other.seconds
+        self.splits += other.splits
+        self.merges += other.merges
+        self.nodes_touched += other.nodes_touched
+        self.aggregate_updates += other.aggregate_updates
+        self.queries += other.queries
+        self.bridge_searches += other.bridge_searches
+        for tree, depth in other.depths.items():
+            if depth > self.depths.get(tree, 0):
+                self.depths[tree] = depth
+
+    def __repr__(self):
+        return (
+            "OperationStats({0.name!r}, count={0.count}, "
+            "seconds={0.seconds:.6f}, splits={0.splits}, merges={0.merges}, "
+            "nodes_touched={0.nodes_touched}, "
+            "aggregate_updates={0.aggregate_updates}, "
+            "queries={0.queries}, bridge_searches={0.bridge_searches}, "
+            "depths={0.depths})"
+        ).format(self)
+
+def _set_counters(stats):
+    treap._counters = stats
+    zero_prefix_bst._counters = stats
+
+def _height(root):
+    height = 0
+    stack = [(root, 1)] if root is not None else []
+    while stack:
+        node, depth = stack.pop()
+        height = max(height, depth)
+        if node.left is not None:
+            stack.append((node.left, depth + 1))
+        if node.right is not None:
+            stack.append((node.right, depth + 1))
+    return height
+
+class Instrumentation:
+    """Counters and timings for the operations of a single queue.
+
+    Only one instrumented operation can run at a time, and operations that a
+    public operation performs through other public methods are counted as
+    part of it.
+    """
+
+    def __init__(self, queue, callback=None):
+        """
+        Args:
+            queue: A `RetroactivePriorityQueue` or
+                `FusedRetroactivePriorityQueue`.
+            callback: Called as `callback(stats)` with the `OperationStats`
+                of every instrumented operation after it finishes, also if
+                it raised.
+        """
+        self.queue = queue
+        self.callback = callback
+        # Accumulated OperationStats by operation name
+        self.totals = {}
+        # Maps internal tree names to the longest search path walked in them
+        self.max_depths = {}
+        self.enabled = False
+        self._running = False
+
+    def _trees(self):
+        # The internal treaps of the queue by attribute name. Maps built on
+        # SortedBlocks are represented by the treap indexing their blocks.
+        trees = {}
+        for attr, value in vars(self.queue).items():
+            if isinstance(value, (OrderedMultiset, WrappedMap)):
+                value = value._map
+            if isinstance(value, SortedBlocks):
+                value = value._index
+            if isinstance(value, treap.Treap):
+                trees[attr.lstrip("_")] = value
+        return trees
+
+    def depths(self):
+        """
+        Returns:
+            The current height of every internal tree of the queue, by name.
+            Takes time linear in the size of the trees.
+        """
+        return {
+            name: _height(tree._root) for name, tree in self._trees().items()
+        }
+
+    def enable(self):
+        """Start instrumenting the operations of the queue."""
+        if self.enabled:
+            return
+        self._wrappers = {
+            name: self._wrap(name, getattr(self.queue, name))
+            for name in OPERATIONS if hasattr(self.queue, name)
+        }
+        self._saved = hooks.install(self.queue, self._wrappers)
+        self.enabled = True
+
+    def disable(self):
+        """Stop instrumenting, restoring the methods of the queue, or the
+        wrappers of a `Journal` attached before."""
+        if not self.enabled:
+            return
+        hooks.uninstall(self.queue, self._wrappers, self._saved)
+        self.enabled = False
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def _wrap(self, name, method):
+        def wrapper(*args):
+            # Disabled wrappers that another one wraps stay in place, see
+            # retropq.hooks
+            if self._running or not self.enabled:
+                return method(*args)
+
+            stats = OperationStats(name)
+            stats.count = 1
+            self._running = True
+            _set_counters(stats)
+            start = time.perf_counter()
+            try:
+                return method(*args)
+            finally:
+                stats.seconds = time.perf_counter() - start
+                _set_counters(None)
+                self._running = False
+                self._record(stats)
+        wrapper.__name__ = name
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+    def _record(self, stats):
+        names = {tree: name for name, tree in self._trees().items()}
+        stats.depths = {
+            names[tree]: depth
+            for tree, depth in stats.depths.items() if tree in names
+        }
+        for tree, depth in stats.depths.items():
+            if depth > self.max_depths.get(tree, 0):
+                self.max_depths[tree] = depth
+
+        if stats.name not in self.totals:
+            self.totals[stats.name] = OperationStats(stats.name)
+        self.totals[stats.name].add(stats)
+
+        if self.callback is not None:
+            self.callback(stats)
@@ -0,0 +1,383 @@
+"""A write-ahead journal that makes a queue durable.
+
+    journal = Journal.open("queue-dir")
+    queue = journal.queue
+    queue.add_insert(10, 3)
+    ...
+    journal.close()
+
+While a `Journal` is attached to a `RetroactivePriorityQueue`, every
+successful `add_insert`, `add_delete_min`, `remove`, `apply_batch` and
+`compact` is appended to a journal file as a binary record: its length, a
+CRC-32 of its body and the body, which is an operation code followed by the
+arguments. Ints and floats take 9 bytes each, other times and values are
+pickled.
+
+Records are written through a buffer and synced to disk in groups (group
+commit): after `sync_every` records or `sync_interval` seconds after the
+first record written since the last sync, whichever comes first, and by
+`sync` and `close`. A timer thread syncs records that are followed by no
+more updates. A crash loses at most the records written since the last
+sync.
+
+A checkpoint writes the whole queue with `RetroactivePriorityQueue.dump` and
+starts a new journal file, after which the previous checkpoint and journal
+are deleted. `Journal.open` recovers a queue by loading the latest checkpoint
+and replaying only the journal written since. A torn record at the end of the
+journal, left by a crash during a write, is cut off.
+
+The directory holds the files `checkpoint-N` and `journal-N` of the current
+generation N.
+"""
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+from . import hooks
+from .retropq import RetroactivePriorityQueue
+from .treap import Treap
+
+
+# Logged updates by operation code
+_CODES = {
+    "add_insert": 1, "add_delete_min": 2, "remove": 3, "apply_batch": 4,
+    "compact": 5,
+}
+_NAMES = {code: name for name, code in _CODES.items()}
+
+# Body length and CRC-32 of the body
+_RECORD = struct.Struct("<II")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_COUNT = struct.Struct("<I")
+
+
+def _encode_value(x, out):
+    if type(x) is int and -2 ** 63 <= x < 2 ** 63:
+        out += b"q"
+        out += _INT.pack(x)
+    elif type(x) is float:
+        out += b"d"
+        out += _FLOAT.pack(x)
+    else:
+        data = pickle.dumps(x, protocol=pickle.HIGHEST_PROTOCOL)
+        out += b"p"
+        out += _COUNT.pack(len(data))
+        out += data
+
+def _decode_value(body, offset):
+    # Returns the value at offset and the offset after it
+    tag = body[offset:offset + 1]
+    offset += 1
+    if tag == b"q":
+        return _INT.unpack_from(body, offset)[0], offset + _INT.size
+    if tag == b"d":
+        return _FLOAT.unpack_from(body, offset)[0], offset + _FLOAT.size
+    (length,) = _COUNT.unpack_from(body, offset)
+    offset += _COUNT.size
+    return pickle.loads(body[offset:offset + length]), offset + length
+
+def _encode_op(op, out):
+    out.append(_CODES[op[0]])
+    if op[0] == "apply_batch":
+        out += _COUNT.pack(len(op[1]))
+        for sub_op in op[1]:
+            _encode_op(sub_op, out)
+    else:
+        for x in op[1:]:
+            _encode_value(x, out)
+
+def _decode_op(body, offset):
+    name = _NAMES[body[offset]]
+    offset += 1
+    if name == "apply_batch":
+        (count,) = _COUNT.unpack_from(body, offset)
+        offset += _COUNT.size
+        batch = []
+        for _ in range(count):
+            sub_op, offset = _decode_op(body, offset)
+            batch.append(sub_op)
+        return (name, batch), offset
+    args = []
+    for _ in range(2 if name == "add_insert" else 1):
+        x, offset = _decode_value(body, offset)
+        args.append(x)
+    return (name, *args), offset
+
+def encode(op) -> bytes:
+    """
+    Args:
+        op: An update tuple like those accepted by `apply_batch`, or
+            `("apply_batch", operations)` or `("compact", before)`.
+
+    Returns:
+        The framed journal record of op.
+    """
+    body = bytearray()
+    _encode_op(op, body)
+    return _RECORD.pack(len(body), zlib.crc32(body)) + body
+
+def read_records(data):
+    """Decode the records of a journal.
+
+    Returns:
+        The list of decoded operations and the length of the valid prefix
+        of data. Decoding stops at the first incomplete or corrupt record.
+    """
+    ops = []
+    offset = 0
+    while offset + _RECORD.size <= len(data):
+        length, crc = _RECORD.unpack_from(data, offset)
+        start = offset + _RECORD.size
+        body = data[start:start + length]
+        if len(body) < length or zlib.crc32(body) != crc:
+            break
+        op, _ = _decode_op(body, 0)
+        ops.append(op)
+        offset = start + length
+    return ops, offset
+
+def _fsync_directory(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class Journal:
+    """Records the updates of a queue so that it can be recovered."""
+
+    def __init__(
+        self, queue, directory, sync_every=256, sync_interval=0.01,
+        checkpoint_every=None,
+    ):
+        """Attach a journal to a queue, writing a checkpoint of it first
+
+        Any checkpoint and journal already in the directory are replaced.
+
+        Args:
+            queue: A `RetroactivePriorityQueue`.
+            directory: The directory for the checkpoint and journal files,
+                created if it does not exist.
+            sync_every: The number of records after which they are synced.
+                1 syncs every record before the update returns.
+            sync_interval: The time in seconds after which records written
+                since the last sync are synced, by a timer thread if no
+                update comes first.
+            checkpoint_every: If set, a checkpoint is written automatically
+                after this many records.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._configure(
+            queue, directory, sync_every, sync_interval, checkpoint_every
+        )
+        self._file = None
+        self._attach()
+        self.checkpoint()
+
+    def _configure(
+        self, queue, directory, sync_every=256, sync_interval=0.01,
+        checkpoint_every=None,
+    ):
+        self.queue = queue
+        self.directory = directory
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.checkpoint_every = checkpoint_every
+        self.generation = _generation(directory)
+        # Guards the file against the timer thread started by _write
+        self._lock = threading.RLock()
+        self._timer = None
+
+    @classmethod
+    def open(
+        cls, directory, backend=Treap, window=None, **options
+    ) -> "Journal":
+        """Recover the queue journaled in a directory, or start a new one
+
+        Args:
+            directory: See `__init__`.
+            backend, window: See `RetroactivePriorityQueue.__init__`. They
+                are not stored in the journal.
+            options: See `__init__`.
+
+        Returns:
+            A journal attached to the recovered queue, available as
+            `journal.queue`, which appends to the current journal file.
+        """
+        if _generation(directory) is None:
+            return cls(
+                RetroactivePriorityQueue(backend, window), directory,
+                **options
+            )
+
+        journal = object.__new__(cls)
+        journal._configure(None, directory, **options)
+        queue = RetroactivePriorityQueue.load(
+            journal._path("checkpoint"), backend
+        )
+        path = journal._path("journal")
+        with open(path, "rb") as f:
+            ops, valid = read_records(f.read())
+        with open(path, "r+b") as f:
+            f.truncate(valid)
+        # Compactions were journaled when they happened, so the window only
+        # applies from now on
+        for op in ops:
+            getattr(queue, op[0])(*op[1:])
+        queue._window = window
+
+        journal.queue = queue
+        journal._file = open(path, "ab")
+        journal._attach()
+        journal._since_checkpoint = len(ops)
+        return journal
+
+    def _path(self, kind, generation=None):
+        if generation is None:
+            generation = self.generation
+        return os.path.join(self.directory, "{}-{}".format(kind, generation))
+
+    def _attach(self):
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._since_checkpoint = 0
+        self._running = False
+        self._compactions = []
+        self._attached = True
+        self._wrappers = {name: self._wrap(name) for name in _CODES}
+        self._saved = hooks.install(self.queue, self._wrappers)
+
+    def _wrap(self, name):
+        method = getattr(self.queue, name)
+
+        def wrapper(*args):
+            if not self._attached:
+                # Closed, but wrapped by a later wrapper, see retropq.hooks
+                return method(*args)
+            if self._running:
+                # Compactions by a sliding window during another update
+                # are recorded after it
+                result = method(*args)
+                if name == "compact":
+                    self._compactions.append(("compact", *args))
+                return result
+
+            if name == "apply_batch":
+                args = (list(args[0]),)
+            self._running = True
+            self._compactions = []
+            try:
+                result = method(*args)
+            finally:
+                self._running = False
+            self._write(encode((name, *args)))
+            for op in self._compactions:
+                self._write(encode(op))
+            return result
+        wrapper.__name__ = name
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+    def _write(self, record):
+        with self._lock:
+            self._file.write(record)
+            self._unsynced += 1
+            self._since_checkpoint += 1
+            if (
+                self._unsynced >= self.sync_every
+                or time.monotonic() - self._last_sync >= self.sync_interval
+            ):
+                self.sync()
+            elif self._timer is None:
+                self._timer = threading.Timer(
+                    self.sync_interval, self._timed_sync
+                )
+                self._timer.daemon = True
+                self._timer.start()
+        if (
+            self.checkpoint_every is not None
+            and self._since_checkpoint >= self.checkpoint_every
+        ):
+            self.checkpoint()
+
+    def sync(self):
+        """Write all records to disk."""
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _timed_sync(self):
+        with self._lock:
+            self._timer = None
+            if self._unsynced and not self._file.closed:
+                self.sync()
+
+    def checkpoint(self):
+        """Write the whole queue and start a new, empty journal
+
+        Takes time linear in the size of the queue.
+        """
+        with self._lock:
+            old = self.generation
+            new = 0 if old is None else old + 1
+
+            # The new, empty journal exists before the checkpoint that makes
+            # it current is renamed into place. The checkpoint stores the
+            # compaction horizon.
+            f = open(self._path("journal", new), "wb")
+            os.fsync(f.fileno())
+
+            tmp = self._path("checkpoint", new) + ".tmp"
+            self.queue.dump(tmp)
+            with open(tmp, "rb") as checkpoint:
+                os.fsync(checkpoint.fileno())
+            os.replace(tmp, self._path("checkpoint", new))
+            _fsync_directory(self.directory)
+
+            if self._file is not None:
+                self._file.close()
+            self._file = f
+            self.generation = new
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+            self._since_checkpoint = 0
+            if old is not None:
+                for kind in ("checkpoint", "journal"):
+                    try:
+                        os.remove(self._path(kind, old))
+                    except FileNotFoundError:
+                        pass
+
+    def close(self):
+        """Sync the journal and detach it from the queue, restoring the
+        methods it wrapped."""
+        with self._lock:
+            self.sync()
+            self._file.close()
+        self._attached = False
+        hooks.uninstall(self.queue, self._wrappers, self._saved)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _generation(directory):
+    # The generation of the latest complete checkpoint in directory, or None
+    generations = []
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            kind, _, n = name.partition("-")
+            if kind == "checkpoint" and n.isdigit():
+                generations.append(int(n))
+    return max(generations, default=None)
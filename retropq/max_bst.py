@@ -1,11 +1,15 @@
+from .ordered_map import WrappedMap
 from .treap import Treap
 
-class MaxBST(Treap):
-    def __init__(self):
-        super().__init__(max)
+class MaxBST(WrappedMap):
+    def __init__(self, backend=Treap):
+        super().__init__(backend, max, max)
 
     def __setitem__(self, key, value):
-        super().__setitem__(key, (value, key))
+        self._map[key] = (value, key)
+
+    def load_sorted(self, items):
+        self._map.load_sorted((key, (value, key)) for key, value in items)
 
     def __getitem__(self, key):
-        return super().__getitem__(key)[0]
+        return self._map[key][0]
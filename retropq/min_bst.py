@@ -1,12 +1,15 @@
+from .ordered_map import WrappedMap
 from .treap import Treap
 
-class MinBST(Treap):
-    def __init__(self):
-        super().__init__(min)
+class MinBST(WrappedMap):
+    def __init__(self, backend=Treap):
+        super().__init__(backend, min, min)
 
     def __setitem__(self, key, value):
-        super().__setitem__(key, (value, key))
+        self._map[key] = (value, key)
 
-    def __getitem__(self, key):
-        return super().__getitem__(key)[0]
+    def load_sorted(self, items):
+        self._map.load_sorted((key, (value, key)) for key, value in items)
 
+    def __getitem__(self, key):
+        return self._map[key][0]
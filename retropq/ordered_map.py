@@ -0,0 +1,136 @@
+from copy import copy
+from typing import Any, Callable, Iterator, Optional, Protocol
+
+
+class OrderedMap(Protocol):
+    """The ordered map with range aggregates that the queue is built on.
+
+    Maps keys to values and maintains, for any range of keys, the aggregate
+    of their values under an associative (but not necessarily commutative
+    or invertible) function `agg_f`. The aggregate of a single value is the
+    value itself. Implementations are `Treap` and `SortedBlocks`.
+    """
+
+    def __init__(self, agg_f: Callable, fold: Optional[Callable] = None):
+        """
+        Args:
+            agg_f: Combines the aggregates of two adjacent key ranges.
+            fold: Optionally computes the aggregate of a non-empty list of
+                adjacent values at once, for backends that aggregate runs
+                of values. Defaults to folding the list with agg_f.
+        """
+
+    def __getitem__(self, key) -> Any:
+        """Raises KeyError if key is not in the map."""
+
+    def __setitem__(self, key, value):
+        ...
+
+    def remove(self, key):
+        """Raises KeyError if key is not in the map."""
+
+    def load_sorted(self, items):
+        """Replace the contents with (key, value) pairs with strictly
+        increasing keys in linear time."""
+
+    def fork(self) -> "OrderedMap":
+        """Return an independent copy that shares structure with this map
+        until either is modified."""
+
+    def last_key(self) -> Any:
+        """Return the largest key in O(1), or None if the map is empty."""
+
+    def agg_before(self, key, include_eq: bool = False) -> Any:
+        """Return the aggregate of the values with keys < key (<= key if
+        include_eq), or None if there are none."""
+
+    def agg_after(self, key, include_eq: bool = False) -> Any:
+        """Return the aggregate of the values with keys > key (>= key if
+        include_eq), or None if there are none."""
+
+    def agg(self) -> Any:
+        """Return the aggregate of all values, or None if the map is
+        empty."""
+
+    def find_prefix(self, pred: Callable) -> tuple:
+        """Return the first (key, value) pair whose inclusive prefix
+        aggregate satisfies the monotone predicate pred.
+
+        Raises KeyError if there is no such pair."""
+
+    def first(self) -> tuple:
+        """Return the (key, value) pair with the smallest key.
+
+        Raises KeyError if the map is empty."""
+
+    def last(self) -> tuple:
+        """Return the (key, value) pair with the largest key.
+
+        Raises KeyError if the map is empty."""
+
+    def iter_from(self, key, include_eq: bool = True) -> Iterator[tuple]:
+        """Lazily yield the (key, value) pairs with keys >= key (> key if
+        not include_eq) in order."""
+
+    def repeat_keys(self) -> list:
+        """Return the list of all keys in order, each repeated as many times
+        as its value, which must be a non-negative int.
+
+        Used to export multisets, so implementations collect it in a single
+        loop instead of going through `__iter__`."""
+
+    def __contains__(self, key) -> bool:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+    def __iter__(self) -> Iterator[tuple]:
+        """Yield all (key, value) pairs in order."""
+
+
+class WrappedMap:
+    # Base class for maps that keep their entries in an OrderedMap backend,
+    # possibly with the values in another form; subclasses override the
+    # methods that convert values. The queries that do not see values are
+    # bound straight to the backend, so calling them costs no extra frame.
+
+    def __init__(self, backend, agg_f, fold=None):
+        self._map = backend(agg_f, fold)
+        self._bind()
+
+    def _bind(self):
+        self.last_key = self._map.last_key
+        self.agg_before = self._map.agg_before
+        self.agg_after = self._map.agg_after
+        self.agg = self._map.agg
+
+    def fork(self):
+        other = copy(self)
+        other._map = self._map.fork()
+        other._bind()
+        return other
+
+    def remove(self, key):
+        self._map.remove(key)
+
+    def load_sorted(self, items):
+        self._map.load_sorted(items)
+
+    def iter_from(self, key, include_eq=True):
+        return self._map.iter_from(key, include_eq)
+
+    def __getitem__(self, key):
+        return self._map[key]
+
+    def __setitem__(self, key, value):
+        self._map[key] = value
+
+    def __contains__(self, key):
+        return key in self._map
+
+    def __len__(self):
+        return len(self._map)
+
+    def __iter__(self):
+        return iter(self._map)
@@ -1,36 +1,107 @@
+from copy import copy
+from itertools import chain, groupby, islice, repeat, starmap, takewhile
+from operator import add
+
 from .treap import Treap
 
 class OrderedMultiset():
-    def __init__(self):
-        self._treap = Treap(lambda x, y: None)
+    # Maps every distinct value to its multiplicity; the aggregate of a
+    # subtree is the number of elements in it
+    def __init__(self, backend=Treap):
+        self._map = backend(add, sum)
         self._len = 0
+        self._min = None
+        self._max = None
 
     def add(self, value):
         prev_cnt = 0
         try:
-            prev_cnt = self._treap[value]
+            prev_cnt = self._map[value]
         except KeyError:
             pass
-        self._treap[value] = prev_cnt + 1
+        self._map[value] = prev_cnt + 1
 
+        if self._len == 0 or value < self._min:
+            self._min = value
+        if self._len == 0 or self._max < value:
+            self._max = value
         self._len += 1
 
     def remove(self, value):
-        prev_cnt = self._treap[value]
+        prev_cnt = self._map[value]
         if prev_cnt == 1:
-            self._treap.remove(value)
+            self._map.remove(value)
         else:
-            self._treap[value] = prev_cnt - 1
+            self._map[value] = prev_cnt - 1
 
         self._len -= 1
+        if self._len == 0:
+            self._min = self._max = None
+        elif prev_cnt == 1:
+            if value == self._min:
+                self._min = self._map.first()[0]
+            if value == self._max:
+                self._max = self._map.last()[0]
+
+    def load_sorted(self, values):
+        # Replaces the contents with values, given in ascending order
+        items = [(v, len(list(run))) for v, run in groupby(values)]
+        self._map.load_sorted(items)
+        self._len = sum(cnt for _, cnt in items)
+        self._min = items[0][0] if items else None
+        self._max = items[-1][0] if items else None
+
+    def fork(self):
+        # Returns an independent copy, see Treap.fork
+        other = copy(self)
+        other._map = self._map.fork()
+        return other
+
+    def get_min(self):
+        return self._min
+
+    def get_max(self):
+        return self._max
+
+    def rank(self, value):
+        # Number of elements smaller than value
+        return self._map.agg_before(value) or 0
+
+    def kth(self, k):
+        # The element at index k in ascending order
+        if k < 0:
+            k += self._len
+        if not 0 <= k < self._len:
+            raise IndexError
+        return self._map.find_prefix(lambda cnt: cnt > k)[0]
+
+    def nsmallest(self, k):
+        return list(islice(self, k))
+
+    def count_between(self, lo, hi):
+        # Number of elements v with lo <= v <= hi
+        if hi < lo:
+            return 0
+        return (
+            (self._map.agg_before(hi, include_eq=True) or 0)
+            - (self._map.agg_before(lo) or 0)
+        )
+
+    def to_list(self):
+        return self._map.repeat_keys()
+
+    def iter_between(self, lo, hi):
+        # Lazily yields the elements v with lo <= v <= hi in ascending order,
+        # starting at lo in O(log n)
+        runs = takewhile(lambda item: item[0] <= hi, self._map.iter_from(lo))
+        return chain.from_iterable(starmap(repeat, runs))
 
-    def __in__(self, value):
-        return value in self._treap
+    def __contains__(self, value):
+        return value in self._map
 
     def __iter__(self):
-        for v, cnt in self._treap:
-            for _ in range(cnt):
-                yield v
+        # Every run of equal values is expanded by repeat in C
+        return chain.from_iterable(starmap(repeat, self._map))
 
     def __len__(self):
         return self._len
@@ -0,0 +1,168 @@
+from array import array
+from typing import Generic, TypeVar
+from collections.abc import Collection, Iterator
+
+
+T = TypeVar("T")
+V = TypeVar("V")
+
+class QueueBase(Generic[T, V], Collection[V]):
+    """The change feed and the queries about the queue after all operations
+    shared by `RetroactivePriorityQueue` and `FusedRetroactivePriorityQueue`.
+
+    Subclasses keep the queue after all operations in an `OrderedMultiset`
+    `_q_now` and the subscribed listeners in a list `_listeners`.
+    """
+
+    def subscribe(self, listener):
+        """Call a function after every successful update
+
+        Args:
+            listener: Called as `listener(op, change)` with the update as a
+                tuple like those accepted by `apply_batch` and the `Change`
+                it returned. Updates made by
+                `RetroactivePriorityQueue.apply_batch` are reported once per
+                changed value after the whole batch has been applied, with
+                op None if the batch was applied by rebuilding the trees.
+        """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """Stop calling a function passed to `subscribe`
+
+        Raises:
+            ValueError: If the listener is not subscribed.
+        """
+        self._listeners.remove(listener)
+
+    def _notify(self, op, change):
+        for listener in self._listeners:
+            listener(op, change)
+
+    def __iter__(self) -> Iterator[V]:
+        """
+        Yields:
+            The values in the queue after all operations have been performed,
+            sorted in ascending order.
+        """
+        yield from self._q_now
+
+    def __len__(self) -> int:
+        """
+        Returns:
+            The size of the queue after all operations have been performed.
+        """
+        return len(self._q_now)
+
+    def __contains__(self, v) -> bool:
+        """
+        Returns:
+            Whether the queue contains v after all operations have been
+            performed.
+        """
+        return v in self._q_now
+
+    def get_min(self) -> V:
+        """
+        Returns:
+            The smallest element in the queue after all operations have been
+            performed or `None` if the queue is empty.
+        """
+        return self._q_now.get_min()
+
+    def get_max(self) -> V:
+        """
+        Returns:
+            The largest element in the queue after all operations have been
+            performed or `None` if the queue is empty.
+        """
+        return self._q_now.get_max()
+
+    def rank(self, v) -> int:
+        """
+        Returns:
+            The number of elements smaller than v in the queue after all
+            operations have been performed.
+        """
+        return self._q_now.rank(v)
+
+    def kth(self, k: int) -> V:
+        """
+        Args:
+            k: A zero-based index; negative values count from the end.
+
+        Returns:
+            The element at index k when the queue after all operations have
+            been performed is sorted in ascending order.
+
+        Raises:
+            IndexError: If k is out of range.
+        """
+        return self._q_now.kth(k)
+
+    def nsmallest(self, k: int) -> list[V]:
+        """
+        Returns:
+            The k smallest elements in the queue after all operations have
+            been performed, sorted in ascending order.
+        """
+        return self._q_now.nsmallest(k)
+
+    def count_between(self, lo, hi) -> int:
+        """
+        Returns:
+            The number of elements v with lo <= v <= hi in the queue after
+            all operations have been performed.
+        """
+        return self._q_now.count_between(lo, hi)
+
+    def iter_between(self, lo, hi) -> Iterator[V]:
+        """Lazily iterate over part of the queue
+
+        Finding the first element takes O(log n) time, every further element
+        O(1) amortized.
+
+        Yields:
+            The elements v with lo <= v <= hi in the queue after all
+            operations have been performed, sorted in ascending order.
+        """
+        return self._q_now.iter_between(lo, hi)
+
+    def to_list(self) -> list[V]:
+        """
+        Returns:
+            The values in the queue after all operations have been performed,
+            sorted in ascending order. Faster than `list(queue)`.
+        """
+        return self._q_now.to_list()
+
+    def to_array(self, typecode: str) -> array:
+        """
+        Args:
+            typecode: The `array.array` type code of the values, e.g. "q" or
+                "d".
+
+        Returns:
+            The values in the queue after all operations have been performed,
+            sorted in ascending order, as an `array.array`.
+
+        Raises:
+            TypeError, OverflowError: If a value does not fit the type code.
+        """
+        return array(typecode, self._q_now.to_list())
+
+    def to_numpy(self, dtype=None):
+        """
+        Requires numpy, which is imported on the first call.
+
+        Args:
+            dtype: The dtype of the result, inferred from the values by
+                default.
+
+        Returns:
+            The values in the queue after all operations have been performed,
+            sorted in ascending order, as a one-dimensional numpy array.
+        """
+        import numpy as np
+
+        return np.array(self._q_now.to_list(), dtype=dtype)
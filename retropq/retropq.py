@@ -1,17 +1,83 @@
 #!/usr/bin/env python3
-from typing import Generic, TypeVar
-from collections.abc import Collection, Iterator
-
+import heapq
+from bisect import bisect_left
+from copy import copy
+from typing import NamedTuple, Optional, TypeVar
+from collections.abc import Iterable, Iterator
+
+from . import snapshot
+from .checkpoints import Checkpoints
 from .ordered_multiset import OrderedMultiset
+from .queue_base import QueueBase
 from .zero_prefix_bst import ZeroPrefixBST
 from .max_bst import MaxBST
 from .min_bst import MinBST
+from .treap import Treap
 
 
 T = TypeVar("T")
 V = TypeVar("V")
 
-class RetroactivePriorityQueue(Generic[T, V], Collection[V]):
+class Change(NamedTuple):
+    """The effect of an update on the queue after all operations.
+
+    Attributes:
+        added: The insert `(t, value)` whose value enters the queue, or None.
+        removed: The insert `(t, value)` whose value leaves the queue, or
+            None.
+    """
+    added: Optional[tuple]
+    removed: Optional[tuple]
+
+def _classify(operations):
+    # Replays a time-sorted sequence of operations with a heap and returns
+    # the columns expected by RetroactivePriorityQueue._build
+    times, kinds, values = [], [], []
+    heap = []
+    for op in operations:
+        name, t = op[0], op[1]
+        if times and not times[-1] < t:
+            if times[-1] == t:
+                raise KeyError
+            raise ValueError("operations must be sorted by time")
+
+        if name == "add_insert":
+            heapq.heappush(heap, (op[2], t, len(times)))
+            kinds.append(0)
+            values.append(op[2])
+        elif name == "add_delete_min":
+            if not heap:
+                raise ValueError
+            _, _, i = heapq.heappop(heap)
+            kinds[i] = 1
+            kinds.append(-1)
+            values.append(None)
+        else:
+            raise ValueError("unknown operation {!r}".format(name))
+        times.append(t)
+
+    return times, kinds, values
+
+def _batch_changes(queue, operations):
+    # Applies operations with queue.apply_batch and returns a dict mapping
+    # the time of every operation to its Change, or None if the batch was
+    # applied by rebuilding the trees, which only reports the changes of
+    # the batch as a whole
+    operations = list(operations)
+    changes = {}
+    def record(op, change):
+        if op is not None:
+            changes[op[1]] = change
+    queue.subscribe(record)
+    try:
+        queue.apply_batch(operations)
+    finally:
+        queue.unsubscribe(record)
+    if len(changes) < len(operations):
+        return None
+    return changes
+
+class RetroactivePriorityQueue(QueueBase[T, V]):
     """A partially retroactive priority queue.
 
     A priority queue can be represented as a sequence of *insert* and
@@ -25,13 +91,232 @@ class RetroactivePriorityQueue(Generic[T, V], Collection[V]):
     inserted in the queue must be partially ordered.
     """
 
-    def __init__(self):
-        """Initialize a queue with no operations."""
-        self._q_now = OrderedMultiset()
-        self._inserts_in_q = MinBST()
-        self._deleted_inserts = MaxBST()
-        self._bridges = ZeroPrefixBST()
-        self._size_changes = ZeroPrefixBST()
+    def __init__(self, backend=Treap, window=None):
+        """Initialize a queue with no operations.
+
+        Args:
+            backend: The ordered map class all internal trees are built on,
+                `Treap` (the default) or `SortedBlocks`. See
+                `retropq.ordered_map.OrderedMap`.
+            window: If set, the queue is compacted automatically (see
+                `compact`) so that it only keeps the operations in the last
+                `window` time units before its latest operation. Requires
+                times that support subtraction.
+        """
+        self._q_now = OrderedMultiset(backend)
+        self._inserts_in_q = MinBST(backend)
+        self._deleted_inserts = MaxBST(backend)
+        self._bridges = ZeroPrefixBST(backend)
+        self._size_changes = ZeroPrefixBST(backend)
+        self._checkpoints = Checkpoints()
+        # Operations before the horizon can no longer be changed, see compact
+        self._horizon = None
+        self._window = window
+        self._added_since_compact = 0
+        self._listeners = []
+
+    @classmethod
+    def from_operations(cls, operations: Iterable[tuple], backend=Treap):
+        """Create a queue from a sequence of operations in linear time
+
+        The result is the same as calling `add_insert`/`add_delete_min` for
+        every operation, but the internal trees are built bottom-up after a
+        single replay of the timeline.
+
+        Args:
+            operations: Operations sorted by strictly increasing time. Each
+                operation is a tuple `("add_insert", t, value)` or
+                `("add_delete_min", t)`.
+            backend: See `__init__`.
+
+        Raises:
+            KeyError: If two operations have the same time.
+            ValueError: If the operations are not sorted by time, if an
+                operation is not an insert or delete-min, or if a delete-min
+                would be performed on an empty queue.
+        """
+        queue = cls(backend)
+        queue._build(*_classify(operations))
+        return queue
+
+    def _build(self, times, kinds, values):
+        # Replaces the contents of all trees with parallel columns sorted by
+        # time, where kinds holds the value of each operation in _bridges
+        self._bridges.load_sorted(zip(times, kinds))
+        self._size_changes.load_sorted(
+            (t, 1 if kind >= 0 else -1) for t, kind in zip(times, kinds)
+        )
+        self._inserts_in_q.load_sorted(
+            (t, v) for t, kind, v in zip(times, kinds, values) if kind == 0
+        )
+        self._deleted_inserts.load_sorted(
+            (t, v) for t, kind, v in zip(times, kinds, values) if kind == 1
+        )
+        self._q_now.load_sorted(
+            sorted(v for kind, v in zip(kinds, values) if kind == 0)
+        )
+        self._checkpoints.clear()
+
+    def fork(self):
+        """Create an independent copy of the queue in O(1)
+
+        The copy shares all internal tree nodes with this queue. Both queues
+        copy the O(log n) nodes on the paths they modify from then on, so
+        changes to one are never visible in the other. Listeners are not
+        copied. With the
+        `SortedBlocks` backend, forking takes O(n / block_size) time and
+        modified blocks are copied instead.
+
+        Returns:
+            A queue with the same operations as this one.
+        """
+        other = copy(self)
+        other._q_now = self._q_now.fork()
+        other._inserts_in_q = self._inserts_in_q.fork()
+        other._deleted_inserts = self._deleted_inserts.fork()
+        other._bridges = self._bridges.fork()
+        other._size_changes = self._size_changes.fork()
+        other._checkpoints = self._checkpoints.fork()
+        other._listeners = []
+        return other
+
+    def dump(self, path):
+        """Write a snapshot of the queue to a file
+
+        The snapshot stores every operation together with whether it is in
+        the queue now, and the compaction horizon, in a compact versioned
+        binary format. Times and values that are all `int` or all `float`
+        are stored as fixed-width columns; any other types are pickled.
+
+        Args:
+            path: The file to write.
+        """
+        times, kinds, values = [], [], []
+        for t, kind, v in self._entries():
+            times.append(t)
+            kinds.append(kind)
+            if kind >= 0:
+                values.append(v)
+        snapshot.write(path, times, kinds, values, self._horizon)
+
+    @classmethod
+    def load(cls, path, backend=Treap):
+        """Create a queue from a snapshot written by `dump`
+
+        The file is memory-mapped and the internal trees are built from its
+        columns in linear time, without replaying the operations.
+
+        Args:
+            path: The file to read.
+            backend: See `__init__`.
+
+        Raises:
+            ValueError: If the file is not a snapshot of a supported version.
+        """
+        times, kinds, insert_values, horizon = snapshot.read(path)
+        insert_values = iter(insert_values)
+        values = [
+            next(insert_values) if kind >= 0 else None for kind in kinds
+        ]
+
+        queue = cls(backend)
+        queue._build(times, kinds, values)
+        queue._horizon = horizon
+        return queue
+
+    def _entries(self, start=None, include_start=True):
+        # Yields (t, kind, value) for the operations from time start on (or
+        # all of them) in time order, where kind is the operation's value in
+        # _bridges and value is None for delete-mins
+        if start is None:
+            bridges = iter(self._bridges)
+            inserts_in_q = iter(self._inserts_in_q)
+            deleted_inserts = iter(self._deleted_inserts)
+        else:
+            bridges = self._bridges.iter_from(start, include_start)
+            inserts_in_q = self._inserts_in_q.iter_from(start, include_start)
+            deleted_inserts = self._deleted_inserts.iter_from(
+                start, include_start
+            )
+
+        for t, kind in bridges:
+            if kind < 0:
+                yield t, kind, None
+            elif kind == 0:
+                yield t, kind, next(inserts_in_q)[1][0]
+            else:
+                yield t, kind, next(deleted_inserts)[1][0]
+
+    def _operations(self, start=None, include_start=True):
+        # Same as _entries, in the format accepted by from_operations
+        for t, kind, v in self._entries(start, include_start):
+            if kind < 0:
+                yield ("add_delete_min", t)
+            else:
+                yield ("add_insert", t, v)
+
+    def compact(self, before: T):
+        """Fold all operations before a time into the initial state
+
+        Drops every delete-min before `before` and every insert that one
+        of them deletes. The inserts still in the queue at time `before`
+        are kept, so the queue after all operations is the same as before,
+        also after later changes at times >= `before`. Afterwards, adding or
+        removing operations and querying the past before `before` raises
+        ValueError. Takes time linear in the number of operations.
+
+        Args:
+            before: The compaction horizon. Compacting to a horizon at or
+                before the current one does nothing.
+        """
+        if self._horizon is not None and not self._horizon < before:
+            return
+
+        entries = list(self._entries())
+        split = bisect_left([t for t, _, _ in entries], before)
+        heap = []
+        for i in range(split):
+            t, kind, v = entries[i]
+            if kind < 0:
+                heapq.heappop(heap)
+            else:
+                heapq.heappush(heap, (v, t, i))
+        # Operations after the horizon are matched with the same inserts as
+        # before, so the kinds of all kept operations stay valid
+        kept = [entries[i] for i in sorted(i for _, _, i in heap)]
+        kept += entries[split:]
+
+        self._build(
+            [t for t, _, _ in kept], [kind for _, kind, _ in kept],
+            [v for _, _, v in kept],
+        )
+        self._horizon = before
+        self._added_since_compact = 0
+
+    def horizon(self) -> T:
+        """
+        Returns:
+            The time before which the queue was compacted, or None.
+        """
+        return self._horizon
+
+    def _check_horizon(self, t):
+        if self._horizon is not None and t < self._horizon:
+            raise ValueError(
+                "time {!r} is before the compaction horizon".format(t)
+            )
+
+    def _slide_window(self, added=1):
+        # Compacts once the operations added since the last compaction are
+        # half as many as the operations in the queue, so compacting takes
+        # amortized constant time per operation
+        self._added_since_compact += added
+        last_t = self._bridges.last_key()
+        if last_t is None:
+            # A batch may have removed every operation
+            return
+        if 2 * self._added_since_compact >= len(self._bridges):
+            self.compact(last_t - self._window)
 
     def _insert_for_t(self, t):
         bridge = self._bridges.zero_prefix_before(t)
@@ -52,12 +337,14 @@ class RetroactivePriorityQueue(Generic[T, V], Collection[V]):
         self._inserts_in_q[t] = v
         self._deleted_inserts.remove(t)
         self._bridges[t] = 0
+        return Change((t, v), None)
 
     def _delete_from_q(self, t, v):
         self._q_now.remove(v)
         self._inserts_in_q.remove(t)
         self._deleted_inserts[t] = v
         self._bridges[t] = 1
+        return Change(None, (t, v))
 
     def _is_empty_after(self, t):
         agg_before = self._size_changes.agg_before(t, include_eq = True)
@@ -70,26 +357,49 @@ class RetroactivePriorityQueue(Generic[T, V], Collection[V]):
         else:
             return False
 
-    def add_insert(self, t: T, value: V):
+    def add_insert(self, t: T, value: V) -> Change:
         """Create a new insert operation
 
         Args:
             t: The time at which the insertion is performed.
             value: The value to be inserted at time t.
 
+        Returns:
+            The insert whose value enters the queue after all operations,
+            which is not necessarily the new one.
+
         Raises:
             KeyError: If the queue already contains an operation with time t.
+            ValueError: If t is before the compaction horizon.
         """
-        if t in self._bridges:
-            raise KeyError
+        self._check_horizon(t)
+        last_t = self._bridges.last_key()
+        if last_t is None or last_t < t:
+            # No later delete-min can remove it, so an insert appended to the
+            # end of the timeline goes straight into Q_now
+            self._checkpoints.invalidate(t)
+            self._q_now.add(value)
+            self._inserts_in_q[t] = value
+            self._bridges[t] = 0
+            self._size_changes[t] = 1
+            change = Change((t, value), None)
+        else:
+            if t in self._bridges:
+                raise KeyError
+            self._checkpoints.invalidate(t)
 
-        # Insert as if it is be deleted
-        self._deleted_inserts[t] = value
-        self._bridges[t] = 1
-        self._size_changes[t] = 1
+            # Insert as if it is be deleted
+            self._deleted_inserts[t] = value
+            self._bridges[t] = 1
+            self._size_changes[t] = 1
 
-        insert_t, insert_v = self._insert_for_t(t)
-        self._promote_to_q(insert_t, insert_v)
+            insert_t, insert_v = self._insert_for_t(t)
+            change = self._promote_to_q(insert_t, insert_v)
+
+        if self._window is not None:
+            self._slide_window()
+        self._notify(("add_insert", t, value), change)
+        return change
 
     def _remove_delete_min(self, t):
         insert_t, insert_v = self._insert_for_t(t)
@@ -97,31 +407,42 @@ class RetroactivePriorityQueue(Generic[T, V], Collection[V]):
         self._bridges.remove(t)
         self._size_changes.remove(t)
 
-        self._promote_to_q(insert_t, insert_v)
+        return self._promote_to_q(insert_t, insert_v)
 
 
-    def add_delete_min(self, t: T):
+    def add_delete_min(self, t: T) -> Change:
         """Create a new delete-min operation
 
         Args:
             t: The time at which the delete-min is performed.
 
+        Returns:
+            The insert whose value leaves the queue after all operations.
+
         Raises:
             KeyError: If the queue already contains an operation with time t.
             ValueError: If performing a delete-min at time t would lead to a
-                delete-min on an empty queue at some time t* >= t.
+                delete-min on an empty queue at some time t* >= t, or if t
+                is before the compaction horizon.
         """
+        self._check_horizon(t)
         if t in self._bridges:
             raise KeyError
         if self._is_empty_after(t):
             raise ValueError
 
+        self._checkpoints.invalidate(t)
         delete_t, delete_v = self._delete_for_t(t)
 
         self._bridges[t] = -1
         self._size_changes[t] = -1
 
-        self._delete_from_q(delete_t, delete_v)
+        change = self._delete_from_q(delete_t, delete_v)
+
+        if self._window is not None:
+            self._slide_window()
+        self._notify(("add_delete_min", t), change)
+        return change
 
     def _remove_insert_in_q(self, t):
         v = self._inserts_in_q[t]
@@ -130,73 +451,388 @@ class RetroactivePriorityQueue(Generic[T, V], Collection[V]):
         self._inserts_in_q.remove(t)
         self._bridges.remove(t)
         self._size_changes.remove(t)
+        return Change(None, (t, v))
 
     def _remove_deleted_insert(self, t: T):
         delete_t, delete_v = self._delete_for_t(t)
-        self._delete_from_q(delete_t, delete_v)
+        change = self._delete_from_q(delete_t, delete_v)
 
         self._deleted_inserts.remove(t)
         self._bridges.remove(t)
         self._size_changes.remove(t)
+        return change
 
 
-    def remove(self, t: T):
+    def remove(self, t: T) -> Change:
         """Remove an operation
 
         Args:
             t: The time of the operation to be removed.
 
+        Returns:
+            The insert whose value enters or leaves the queue after all
+            operations.
+
         Raises:
             KeyError: If the queue does not contain an operation with time t.
             ValueError: If the operation at time t is an insertion and removing
                 it would lead to a delete-min on an empty queue at some time
-                t* > t.
+                t* > t, or if t is before the compaction horizon.
         """
-
+        self._check_horizon(t)
         if t not in self._bridges:
             raise KeyError
 
         op_type = self._bridges[t]
 
         if op_type < 0:
-            self._remove_delete_min(t)
+            self._checkpoints.invalidate(t)
+            change = self._remove_delete_min(t)
         elif op_type == 0:
-            self._remove_insert_in_q(t)
+            self._checkpoints.invalidate(t)
+            change = self._remove_insert_in_q(t)
         else:
             if self._is_empty_after(t):
                 raise ValueError
-            self._remove_deleted_insert(t)
+            self._checkpoints.invalidate(t)
+            change = self._remove_deleted_insert(t)
+        self._notify(("remove", t), change)
+        return change
 
-    def __iter__(self) -> Iterator[V]:
+    def preview_add_insert(self, t: T, value: V) -> Change:
+        """The effect of `add_insert(t, value)`, without changing the queue
+
+        Raises:
+            KeyError: If the queue already contains an operation with time t.
+            ValueError: If t is before the compaction horizon.
         """
-        Yields:
-            The values in the queue after all operations have been performed,
-            sorted in ascending order.
+        self._check_horizon(t)
+        last_t = self._bridges.last_key()
+        if last_t is None or last_t < t:
+            return Change((t, value), None)
+        if t in self._bridges:
+            raise KeyError
+
+        # As in add_insert, but with the new insert compared to the largest
+        # deleted insert instead of added to _deleted_inserts
+        bridge = self._bridges.zero_prefix_before(t)
+        best = self._deleted_inserts.agg_after(bridge, include_eq=True)
+        if best is None or best < (value, t):
+            return Change((t, value), None)
+        insert_v, insert_t = best
+        return Change((insert_t, insert_v), None)
+
+    def preview_add_delete_min(self, t: T) -> Change:
+        """The effect of `add_delete_min(t)`, without changing the queue
+
+        Raises:
+            KeyError: If the queue already contains an operation with time t.
+            ValueError: If `add_delete_min(t)` would raise it.
         """
-        yield from self._q_now
+        self._check_horizon(t)
+        if t in self._bridges:
+            raise KeyError
+        if self._is_empty_after(t):
+            raise ValueError
+        return Change(None, self._delete_for_t(t))
+
+    def preview_remove(self, t: T) -> Change:
+        """The effect of `remove(t)`, without changing the queue
 
-    def __len__(self) -> int:
+        Raises:
+            KeyError: If the queue does not contain an operation with time t.
+            ValueError: If `remove(t)` would raise it.
         """
+        self._check_horizon(t)
+        if t not in self._bridges:
+            raise KeyError
+
+        op_type = self._bridges[t]
+        if op_type < 0:
+            return Change(self._insert_for_t(t), None)
+        elif op_type == 0:
+            return Change(None, (t, self._inserts_in_q[t]))
+        else:
+            if self._is_empty_after(t):
+                raise ValueError
+            return Change(None, self._delete_for_t(t))
+
+    def apply_batch(self, operations: Iterable[tuple]) -> list[Change]:
+        """Add and remove many operations at once
+
+        The batch is applied as a whole: only the timeline after all of its
+        operations have been applied has to be valid, and if it is not, the
+        queue is left unchanged. Small batches are applied one operation at
+        a time, ordered so that no intermediate timeline can be invalid
+        unless the final one is, so they take as long as the same updates
+        made one by one; they are a convenience for atomic updates, not a
+        faster path. Only batches that are large compared to the timeline
+        (k * log2(n) > 2n for k operations on n) are faster: they are merged
+        with the timeline and all trees are rebuilt in linear time.
+
+        Args:
+            operations: Tuples `("add_insert", t, value)`,
+                `("add_delete_min", t)` or `("remove", t)`, in any order.
+
         Returns:
-            The size of the queue after all operations have been performed.
+            The changes to the queue after all operations, in an order that
+            turns its old contents into the new ones. Listeners (see
+            `subscribe`) receive the same changes.
+
+        Raises:
+            KeyError: If the batch contains two operations with the same
+                time, adds an operation at a time already in the queue, or
+                removes an operation that is not in the queue.
+            ValueError: If an operation is not one of the above, if one is
+                before the compaction horizon, or if the resulting timeline
+                contains a delete-min on an empty queue.
         """
-        return len(self._q_now)
+        batch = sorted(operations, key=lambda op: op[1])
+        for prev, op in zip(batch, batch[1:]):
+            if prev[1] == op[1]:
+                raise KeyError
+        for op in batch:
+            self._check_horizon(op[1])
+            if op[0] == "remove":
+                if op[1] not in self._bridges:
+                    raise KeyError
+            elif op[0] in ("add_insert", "add_delete_min"):
+                if op[1] in self._bridges:
+                    raise KeyError
+            else:
+                raise ValueError("unknown operation {!r}".format(op[0]))
+
+        # Listeners only hear about the batch once it has been applied
+        listeners, self._listeners = self._listeners, []
+        try:
+            n = len(self._bridges)
+            if len(batch) * n.bit_length() > self._REBUILD_FACTOR * n:
+                changes = self._rebuild_with(batch)
+            else:
+                # Compacting in the middle of the batch could move the
+                # horizon past operations that have to be rolled back
+                window, self._window = self._window, None
+                try:
+                    changes = self._apply_in_safe_order(batch)
+                finally:
+                    self._window = window
+        finally:
+            self._listeners = listeners
+        if self._window is not None and batch:
+            self._slide_window(len(batch))
+
+        for op, change in changes:
+            self._notify(op, change)
+        return [change for _, change in changes]
+
+    # apply_batch rebuilds all trees if k * log2(n) exceeds this factor
+    # times n for a batch of k operations on a timeline of n operations
+    _REBUILD_FACTOR = 2
+
+    def _rebuild_with(self, batch):
+        removed = {op[1] for op in batch if op[0] == "remove"}
+        added = [op for op in batch if op[0] != "remove"]
+        kept = (op for op in self._operations() if op[1] not in removed)
+        merged = heapq.merge(kept, added, key=lambda op: op[1])
+
+        before = {t: v for t, (v, _) in self._inserts_in_q}
+        # Raises before any tree is touched
+        self._build(*_classify(merged))
+        after = {t: v for t, (v, _) in self._inserts_in_q}
+        return [
+            (None, Change(None, (t, v)))
+            for t, v in before.items() if t not in after
+        ] + [
+            (None, Change((t, v), None))
+            for t, v in after.items() if t not in before
+        ]
+
+    def _apply_in_safe_order(self, batch):
+        # Adding inserts and removing delete-mins only makes the queue larger
+        # at every time, so they go first. Afterwards the size at any time
+        # only decreases towards its final value.
+        growing, shrinking = [], []
+        for op in batch:
+            if op[0] == "remove":
+                if self._bridges[op[1]] < 0:
+                    growing.append(op)
+                else:
+                    shrinking.append(op)
+            elif op[0] == "add_insert":
+                growing.append(op)
+            else:
+                shrinking.append(op)
+
+        # Returns (op, change) for every operation in the order applied
+        undo, changes = [], []
+        try:
+            for op in growing + shrinking:
+                name, t = op[0], op[1]
+                if name == "remove":
+                    undo.append(self._undo_remove(t))
+                else:
+                    undo.append(("remove", t))
+                changes.append((op, getattr(self, name)(*op[1:])))
+        except ValueError:
+            # The last operation failed without changing the queue
+            undo.pop()
+            for op in reversed(undo):
+                getattr(self, op[0])(*op[1:])
+            raise
+        return changes
+
+    def _undo_remove(self, t):
+        # The operation that restores the one at time t after it is removed
+        op_type = self._bridges[t]
+        if op_type < 0:
+            return ("add_delete_min", t)
+        elif op_type == 0:
+            return ("add_insert", t, self._inserts_in_q[t])
+        else:
+            return ("add_insert", t, self._deleted_inserts[t])
 
-    def __contains__(self, v) -> bool:
+    def size_at(self, t: T) -> int:
         """
         Returns:
-            Whether the queue contains v after all operations have been
-            performed.
+            The size of the queue after all operations at times <= t have
+            been performed.
+
+        Raises:
+            ValueError: If t is before the compaction horizon.
         """
-        return v in self._q_now
+        self._check_horizon(t)
+        agg = self._size_changes.agg_before(t, include_eq=True)
+        return agg.sum if agg is not None else 0
+
+    def get_min_at(self, t: T) -> V:
+        """Get the smallest element at a past time
+
+        Unlike the other queries, this is not a logarithmic-time query: the
+        queue at time t is rebuilt by replaying the operations since the
+        closest cached checkpoint before t, so it takes time linear in the
+        number of operations replayed. Long replays are cached as
+        checkpoints themselves (at most `Checkpoints.capacity` of them),
+        which makes repeated queries at nearby times cheap. Adding or
+        removing an operation at time t' drops every checkpoint at or after
+        t', so the first query after a change near the start of the
+        timeline replays O(n) operations. Past queries are meant for
+        inspecting a timeline that is not being changed before the queried
+        times, e.g. for auditing or debugging.
+
+        Returns:
+            The smallest element in the queue after all operations at times
+            <= t have been performed or `None` if the queue is empty then.
 
-    def get_min(self) -> V:
+        Raises:
+            ValueError: If t is before the compaction horizon.
         """
+        self._check_horizon(t)
+        return self._checkpoints.replay(self, t).get_min()
+
+    def iter_at(self, t: T) -> Iterator[V]:
+        """Iterate over the queue at a past time
+
+        See `get_min_at` for how past states are computed.
+
+        Yields:
+            The values in the queue after all operations at times <= t have
+            been performed, sorted in ascending order.
+
+        Raises:
+            ValueError: If t is before the compaction horizon.
+        """
+        self._check_horizon(t)
+        yield from self._checkpoints.replay(self, t)
+
+    def operations(self, t1: T, t2: T) -> Iterator[tuple]:
+        """Lazily iterate over the operations in a time range
+
+        Finding the first operation takes O(log n) time, every further one
+        O(1) amortized.
+
+        Yields:
+            The operations at times t with t1 <= t <= t2 in time order, as
+            tuples `("add_insert", t, value)` or `("add_delete_min", t)` like
+            those accepted by `from_operations`.
+        """
+        for op in self._operations(t1):
+            if t2 < op[1]:
+                return
+            yield op
+
+    def count_operations(self, t1: T, t2: T) -> int:
+        """
+        Takes O(log n) time.
+
         Returns:
-            The smallest element in the queue after all operations have been
-            performed or `None` if the queue is empty.
+            The number of operations at times t with t1 <= t <= t2.
         """
-        try:
-            return self.__iter__().__next__()
-        except StopIteration:
+        total = self._bridges.agg()
+        if total is None or t2 < t1:
+            return 0
+        before = self._bridges.agg_before(t1)
+        after = self._bridges.agg_after(t2)
+        return (
+            total.count
+            - (0 if before is None else before.count)
+            - (0 if after is None else after.count)
+        )
+
+    def _matches(self, t):
+        # Yields (delete_t, insert_t) for the delete-mins from the last bridge
+        # at or before t on, each with the insert it removes, where a bridge
+        # is a time at which every value in the queue stays in it until the
+        # end. No delete-min after a bridge removes a value inserted before
+        # it or one that stays in the queue, so replaying only the deleted
+        # inserts since the bridge pairs them up.
+        heap = []
+        bridge = self._bridges.zero_prefix_before(t)
+        for op_t, kind, v in self._entries(bridge):
+            if kind > 0:
+                heapq.heappush(heap, (v, op_t))
+            elif kind < 0 and heap:
+                # The bridge itself may be the delete-min that empties the
+                # deleted inserts before it
+                yield op_t, heapq.heappop(heap)[1]
+
+    def matched_delete(self, t: T) -> Optional[T]:
+        """Find the delete-min that removes an insert
+
+        Replays the operations between the bridges (times at which every
+        value in the queue stays in it until the end) around t, so it takes
+        O(log n + m log m) time, where m is the number of operations
+        between them.
+
+        Returns:
+            The time of the delete-min that removes the value inserted at
+            time t, or None if the value is still in the queue after all
+            operations.
+
+        Raises:
+            KeyError: If the queue does not contain an insert at time t.
+        """
+        if t not in self._bridges or self._bridges[t] < 0:
+            raise KeyError
+        if self._bridges[t] == 0:
             return None
+        for delete_t, insert_t in self._matches(t):
+            if insert_t == t:
+                return delete_t
+
+    def matched_insert(self, t: T) -> T:
+        """Find the insert whose value a delete-min removes
+
+        See `matched_delete` for the running time.
+
+        Returns:
+            The time of the insert whose value is removed by the delete-min
+            at time t.
+
+        Raises:
+            KeyError: If the queue does not contain a delete-min at time t.
+        """
+        if t not in self._bridges or self._bridges[t] >= 0:
+            raise KeyError
+        for delete_t, insert_t in self._matches(t):
+            if delete_t == t:
+                return insert_t
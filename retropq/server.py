@@ -0,0 +1,358 @@
+"""Share a queue with other processes over a local socket with asyncio.
+
+    server = QueueServer(RetroactivePriorityQueue())
+    await server.start_unix("/tmp/retropq.sock")
+
+    client = await QueueClient.connect_unix("/tmp/retropq.sock")
+    change = await client.add_insert(10, 3)
+    await client.get_min()
+
+Requests and responses are JSON lines, so times and values must be JSON
+numbers or strings. A client may send many requests without waiting for the
+responses, and every request carries an id that its response repeats.
+
+Updates from all connections are coalesced: the server collects them for up
+to `window` seconds after the first one arrives and applies them with one
+`apply_batch` call. If the batch is rejected, its operations are applied one
+at a time in time order, so every update gets its own result as if it had
+been sent alone. The response to an update is sent after it has been applied;
+a query sent before then may not see the update yet. It carries the `Change`
+the update made, sent as `[added, removed]`, or null if its batch was large
+enough compared to the queue to be applied by rebuilding the trees (see
+`RetroactivePriorityQueue.apply_batch`), which only reports the changes of
+the batch as a whole.
+
+A request that is not a JSON object with an "id" and an "op" is answered
+with a ValueError, repeating its id if it has one and null otherwise.
+
+`get_min` and `len` are answered from values cached after every batch.
+Other queries run on the queue directly. Batches are applied on the event
+loop, so queries never see a batch half applied.
+
+At most `max_pending` updates wait to be applied. Beyond that, the server
+stops reading from the connections that send updates until a batch has been
+applied, so fast clients are slowed down by the socket instead of filling
+memory.
+"""
+import asyncio
+import json
+
+from .retropq import Change, RetroactivePriorityQueue, _batch_changes
+
+
+# Updates and the number of arguments they take
+UPDATES = {"add_insert": 2, "add_delete_min": 1, "remove": 1}
+QUERIES = ("get_min", "len", "list", "size_at", "get_min_at")
+
+# Exceptions that are sent to the client and raised there again
+_ERRORS = {e.__name__: e for e in (KeyError, ValueError, IndexError)}
+
+
+class QueueServer:
+    """Serves a `RetroactivePriorityQueue` to `QueueClient` connections."""
+
+    def __init__(
+        self, queue=None, window=0.001, max_batch=1024, max_pending=4096
+    ):
+        """
+        Args:
+            queue: The queue to serve, a new `RetroactivePriorityQueue` by
+                default. It must only be changed through the server
+                afterwards. An update that fails with an error other than
+                KeyError or ValueError replaces `server.queue` with a copy
+                taken before it.
+            window: How long to wait for more updates after the first update
+                of a batch arrives, in seconds.
+            max_batch: The largest number of updates applied as one batch.
+            max_pending: The number of updates that may wait to be applied
+                before the server stops reading new ones.
+        """
+        if queue is None:
+            queue = RetroactivePriorityQueue()
+        self.queue = queue
+        self.window = window
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._pending = None
+        self._cached = (queue.get_min(), len(queue))
+        self._batcher = None
+        # Number of batches applied and batches that had to be split up
+        self.batches = 0
+        self.fallbacks = 0
+
+    async def start(self, host="127.0.0.1", port=0) -> asyncio.Server:
+        """Start serving on a TCP socket, port 0 picks a free port."""
+        self._start_batcher()
+        return await asyncio.start_server(self._serve, host, port)
+
+    async def start_unix(self, path) -> asyncio.Server:
+        """Start serving on a Unix domain socket."""
+        self._start_batcher()
+        return await asyncio.start_unix_server(self._serve, path)
+
+    async def close(self):
+        """Stop applying updates. Updates still waiting fail with
+        ConnectionError."""
+        if self._batcher is None:
+            return
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+        self._batcher = None
+        while not self._pending.empty():
+            _, future = self._pending.get_nowait()
+            if not future.done():
+                future.set_exception(ConnectionError("server closed"))
+
+    def _start_batcher(self):
+        if self._batcher is None:
+            self._pending = asyncio.Queue(self.max_pending)
+            self._batcher = asyncio.get_running_loop().create_task(
+                self._apply_batches()
+            )
+
+    async def _serve(self, reader, writer):
+        # Responses to updates are written by the batcher, so they are
+        # collected in tasks that finish when their update is applied
+        tasks = set()
+        try:
+            async for line in reader:
+                try:
+                    request = _parse(line)
+                except ValueError as e:
+                    _write(writer, getattr(e, "id", None), None, e)
+                    await writer.drain()
+                    continue
+                op, args = request["op"], request["args"]
+                if op in UPDATES and len(args) != UPDATES[op]:
+                    error = TypeError(
+                        "{} takes {} arguments".format(op, UPDATES[op])
+                    )
+                    _write(writer, request["id"], None, error)
+                elif op in UPDATES:
+                    future = asyncio.get_running_loop().create_future()
+                    await self._pending.put(((op, *args), future))
+                    task = asyncio.ensure_future(
+                        self._respond(writer, request["id"], future)
+                    )
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                else:
+                    _write(writer, request["id"], *self._query(op, args))
+                await writer.drain()
+            if tasks:
+                await asyncio.wait(tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, id, future):
+        try:
+            _write(writer, id, await future)
+        except Exception as e:
+            _write(writer, id, None, e)
+
+    def _query(self, op, args):
+        try:
+            if op == "get_min":
+                return self._cached[0], None
+            if op == "len":
+                return self._cached[1], None
+            if op == "list":
+                return list(self.queue), None
+            if op in QUERIES:
+                return getattr(self.queue, op)(*args), None
+            raise ValueError("unknown operation {!r}".format(op))
+        except Exception as e:
+            return None, e
+
+    async def _apply_batches(self):
+        while True:
+            batch = [await self._pending.get()]
+            if self.window:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+            # Whatever goes wrong, the updates of this batch fail and the
+            # loop goes on, or every later update would wait forever
+            try:
+                self._apply(batch)
+            except Exception as e:
+                for _, future in batch:
+                    _settle(future, None, e)
+
+    def _apply(self, batch):
+        self.batches += 1
+        changes, error = self._guarded(
+            lambda queue: _batch_changes(queue, (op for op, _ in batch))
+        )
+        if error is None:
+            for op, future in batch:
+                change = None if changes is None else changes[op[1]]
+                _settle(future, change)
+        else:
+            self.fallbacks += 1
+            try:
+                batch = sorted(batch, key=lambda item: item[0][1])
+            except TypeError:
+                # Times that cannot be compared fail one by one below
+                pass
+            for op, future in batch:
+                change, error = self._guarded(
+                    lambda queue: getattr(queue, op[0])(*op[1:])
+                )
+                _settle(future, change, error)
+        self._cached = (self.queue.get_min(), len(self.queue))
+
+    def _guarded(self, update):
+        # Calls update(self.queue) and returns its result and the exception
+        # it raised or None. Anything other than the queue's KeyError or
+        # ValueError, e.g. a TypeError for values that cannot be compared,
+        # may have changed the queue half way, so it is replaced by a fork
+        # taken before.
+        backup = self.queue.fork()
+        try:
+            return update(self.queue), None
+        except (KeyError, ValueError) as e:
+            return None, e
+        except Exception as e:
+            self.queue = backup
+            return None, e
+
+def _parse(line):
+    # Returns the request in line with its "args" defaulting to [], or raises
+    # ValueError with the id of the request, if any, as its id attribute
+    try:
+        request = json.loads(line)
+    except ValueError:
+        raise ValueError("malformed request") from None
+    if not isinstance(request, dict):
+        raise ValueError("malformed request")
+    request.setdefault("args", [])
+    if "id" not in request or not isinstance(request.get("op"), str):
+        error = ValueError("request without id or op")
+    elif not isinstance(request["args"], list):
+        error = ValueError("args must be a list")
+    else:
+        return request
+    error.id = request.get("id")
+    raise error
+
+def _settle(future, result, error=None):
+    # The client may have gone away and its response task been cancelled
+    if future.done():
+        return
+    if error is None:
+        future.set_result(result)
+    else:
+        future.set_exception(error)
+
+def _write(writer, id, result, error=None):
+    if error is None:
+        response = {"id": id, "result": result}
+    else:
+        response = {
+            "id": id, "error": type(error).__name__,
+            "message": str(error),
+        }
+    writer.write(json.dumps(response).encode() + b"\n")
+
+def _change(result):
+    # JSON turns the Change and its inserts into lists
+    if result is None:
+        return None
+    return Change(*(None if x is None else tuple(x) for x in result))
+
+class QueueClient:
+    """A connection to a `QueueServer`.
+
+    Coroutines may call the methods concurrently; their requests are sent
+    on the same connection without waiting for each other. Errors raised by
+    the queue are raised again as the same type if they are a KeyError,
+    ValueError or IndexError, and as RuntimeError otherwise.
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._futures = {}
+        self._next_id = 0
+        self._receiver = asyncio.get_running_loop().create_task(
+            self._receive()
+        )
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=None):
+        return cls(*await asyncio.open_connection(host, port))
+
+    @classmethod
+    async def connect_unix(cls, path):
+        return cls(*await asyncio.open_unix_connection(path))
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._receiver.cancel()
+
+    async def _receive(self):
+        try:
+            async for line in self._reader:
+                response = json.loads(line)
+                # Responses to malformed requests may have no usable id
+                future = self._futures.pop(response.get("id"), None)
+                if future is None:
+                    continue
+                if "error" in response:
+                    error = _ERRORS.get(response["error"], RuntimeError)
+                    future.set_exception(error(response["message"]))
+                else:
+                    future.set_result(response["result"])
+        finally:
+            for future in self._futures.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("connection closed"))
+
+    async def _request(self, op, *args):
+        id = self._next_id
+        self._next_id += 1
+        future = self._futures[id] = (
+            asyncio.get_running_loop().create_future()
+        )
+        request = {"id": id, "op": op, "args": args}
+        self._writer.write(json.dumps(request).encode() + b"\n")
+        await self._writer.drain()
+        return await future
+
+    async def add_insert(self, t, value) -> Change:
+        """The `Change` the insert made, or None if it was applied in a
+        batch that was rebuilt, see the module documentation."""
+        return _change(await self._request("add_insert", t, value))
+
+    async def add_delete_min(self, t) -> Change:
+        """Like `add_insert`."""
+        return _change(await self._request("add_delete_min", t))
+
+    async def remove(self, t) -> Change:
+        """Like `add_insert`."""
+        return _change(await self._request("remove", t))
+
+    async def get_min(self):
+        """The smallest element after the last applied batch."""
+        return await self._request("get_min")
+
+    async def len(self) -> int:
+        """The size of the queue after the last applied batch."""
+        return await self._request("len")
+
+    async def list(self) -> list:
+        """All values in the queue, sorted in ascending order."""
+        return await self._request("list")
+
+    async def size_at(self, t) -> int:
+        return await self._request("size_at", t)
+
+    async def get_min_at(self, t):
+        return await self._request("get_min_at", t)
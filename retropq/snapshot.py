@@ -0,0 +1,132 @@
+"""Binary snapshots of a retroactive priority queue.
+
+A snapshot consists of a header followed by four sections: the times of all
+operations, their kinds (their value in `_bridges`: -1 for delete-mins, 0 for
+inserts in the queue and 1 for deleted inserts), the inserted values, in
+time order, and the compaction horizon as a column of zero or one times.
+Version 1 snapshots have no horizon section. Every section starts with its
+length in bytes and is padded to a multiple of 8 bytes, so that fixed-width
+columns can be read straight from a memory-mapped file.
+"""
+import mmap
+import pickle
+import struct
+from array import array
+
+MAGIC = b"RPQS"
+VERSION = 2
+
+# magic, version, time column type, value column type, horizon column type
+# and operation count, padded to keep the sections 8-byte aligned
+_HEADER = struct.Struct("<4sHccc7xQ")
+# The header of version 1, without the horizon column type
+_HEADER_V1 = struct.Struct("<4sHccQ")
+_LENGTH = struct.Struct("<Q")
+# magic and version, which start the headers of all versions
+_PREFIX = struct.Struct("<4sH")
+
+# Column types: 8-bit and 64-bit ints, doubles and pickled lists
+INT8 = b"b"
+INT64 = b"q"
+FLOAT64 = b"d"
+PICKLE = b"p"
+
+
+def _encode(column):
+    if all(type(x) is int for x in column):
+        try:
+            return INT64, array(INT64.decode(), column).tobytes()
+        except OverflowError:
+            pass
+    elif all(type(x) is float for x in column):
+        return FLOAT64, array(FLOAT64.decode(), column).tobytes()
+    return PICKLE, pickle.dumps(column, protocol=pickle.HIGHEST_PROTOCOL)
+
+def _decode(column_type, data):
+    if column_type == PICKLE:
+        return pickle.loads(data)
+    with data.cast(column_type.decode()) as typed:
+        return typed.tolist()
+
+def _write_section(f, data):
+    f.write(_LENGTH.pack(len(data)))
+    f.write(data)
+    f.write(bytes(-len(data) % 8))
+
+def _read_section(view, offset, column_type):
+    # Returns the decoded section at offset and the offset of the next one
+    (length,) = _LENGTH.unpack_from(view, offset)
+    offset += _LENGTH.size
+    with view[offset:offset + length] as data:
+        column = _decode(column_type, data)
+    return column, offset + length + (-length % 8)
+
+def write(path, times, kinds, values, horizon=None):
+    """Write the columns of a queue to path.
+
+    Args:
+        times: The times of all operations in increasing order.
+        kinds: The kind of every operation, see the module docstring.
+        values: The values of the inserts, in time order.
+        horizon: The compaction horizon of the queue, or None.
+    """
+    time_type, time_data = _encode(times)
+    value_type, value_data = _encode(values)
+    horizon_type, horizon_data = _encode(
+        [] if horizon is None else [horizon]
+    )
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(
+            MAGIC, VERSION, time_type, value_type, horizon_type, len(times)
+        ))
+        _write_section(f, time_data)
+        _write_section(f, array(INT8.decode(), kinds).tobytes())
+        _write_section(f, value_data)
+        _write_section(f, horizon_data)
+
+def read(path):
+    """Read the columns written by `write` from path.
+
+    Returns:
+        The tuple (times, kinds, values, horizon), with the columns as
+        lists and horizon None if the queue was not compacted.
+
+    Raises:
+        ValueError: If the file is not a snapshot of a supported version.
+    """
+    with open(path, "rb") as f:
+        if f.seek(0, 2) < _HEADER.size:
+            raise ValueError("not a retropq snapshot")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            with memoryview(buf) as view:
+                return _read_columns(view)
+
+def _read_columns(view):
+    magic, version = _PREFIX.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("not a retropq snapshot")
+    if version == 1:
+        _, _, time_type, value_type, n = _HEADER_V1.unpack_from(view)
+        offset = _HEADER_V1.size
+    elif version == VERSION:
+        if len(view) < _HEADER.size:
+            raise ValueError("truncated snapshot")
+        _, _, time_type, value_type, horizon_type, n = _HEADER.unpack_from(
+            view
+        )
+        offset = _HEADER.size
+    else:
+        raise ValueError("unsupported snapshot version {}".format(version))
+
+    times, offset = _read_section(view, offset, time_type)
+    kinds, offset = _read_section(view, offset, INT8)
+    values, offset = _read_section(view, offset, value_type)
+    horizon = None
+    if version > 1:
+        horizon_column, offset = _read_section(view, offset, horizon_type)
+        if horizon_column:
+            horizon = horizon_column[0]
+
+    if len(times) != n or len(kinds) != n:
+        raise ValueError("truncated snapshot")
+    return times, kinds, values, horizon
@@ -0,0 +1,274 @@
+from bisect import bisect_left, bisect_right
+from copy import copy
+from functools import partial, reduce
+
+from .treap import Treap
+
+
+class SortedBlocks:
+    # An OrderedMap, see retropq.ordered_map, that keeps its entries in
+    # sorted blocks of up to block_size keys instead of one node per key.
+    # Every block is a pair of lists of keys and values together with the
+    # aggregate of its values, and a Treap keyed by the first key of every
+    # block holds the block aggregates, so the aggregate of any range of
+    # whole blocks takes O(log(n / block_size)) time. Locating a key bisects
+    # a flat list of the first keys, and the aggregate of part of a block is
+    # folded from its values.
+    #
+    # After fork, both maps share all blocks and copy the ones they modify.
+
+    # Blocks are split in half when they grow beyond this many keys and
+    # merged with their successor when they shrink below a quarter of it
+    block_size = 64
+
+    def __init__(self, agg_f, fold=None):
+        self._agg_f = agg_f
+        self._fold = fold if fold is not None else partial(reduce, agg_f)
+        self._firsts = []
+        self._keys = []
+        self._values = []
+        self._aggs = []
+        # Whether the blocks may be modified in place, see fork
+        self._owned = []
+        self._index = Treap(agg_f)
+        self._len = 0
+
+    def _block(self, key):
+        # Index of the block that key belongs in
+        b = bisect_right(self._firsts, key) - 1
+        return b if b > 0 else 0
+
+    def _find(self, key):
+        if self._firsts:
+            b = self._block(key)
+            keys = self._keys[b]
+            i = bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                return b, i
+        raise KeyError
+
+    def _own(self, b):
+        if not self._owned[b]:
+            self._keys[b] = self._keys[b][:]
+            self._values[b] = self._values[b][:]
+            self._owned[b] = True
+
+    def _update(self, b):
+        # Refolds the aggregate of block b after its contents changed,
+        # moving its entry in the index if its first key changed
+        first = self._keys[b][0]
+        agg = self._aggs[b] = self._fold(self._values[b])
+        if first != self._firsts[b]:
+            self._index.remove(self._firsts[b])
+            self._firsts[b] = first
+        self._index[first] = agg
+
+    def _insert_block(self, b, keys, values):
+        agg = self._fold(values)
+        self._firsts.insert(b, keys[0])
+        self._keys.insert(b, keys)
+        self._values.insert(b, values)
+        self._aggs.insert(b, agg)
+        self._owned.insert(b, True)
+        self._index[keys[0]] = agg
+
+    def _delete_block(self, b):
+        self._index.remove(self._firsts[b])
+        del self._firsts[b]
+        del self._keys[b]
+        del self._values[b]
+        del self._aggs[b]
+        del self._owned[b]
+
+    def __getitem__(self, key):
+        b, i = self._find(key)
+        return self._values[b][i]
+
+    def __setitem__(self, key, value):
+        if not self._firsts:
+            self._insert_block(0, [key], [value])
+            self._len = 1
+            return
+
+        b = self._block(key)
+        self._own(b)
+        keys, values = self._keys[b], self._values[b]
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            values[i] = value
+            self._update(b)
+            return
+
+        keys.insert(i, key)
+        values.insert(i, value)
+        self._len += 1
+        if len(keys) > self.block_size:
+            half = len(keys) // 2
+            self._insert_block(b + 1, keys[half:], values[half:])
+            del keys[half:]
+            del values[half:]
+            self._update(b)
+        elif i == len(keys) - 1:
+            # Appending to a block only extends its aggregate
+            agg = self._aggs[b] = self._agg_f(self._aggs[b], value)
+            self._index[self._firsts[b]] = agg
+        else:
+            self._update(b)
+
+    def remove(self, key):
+        b, i = self._find(key)
+        self._own(b)
+        keys, values = self._keys[b], self._values[b]
+        del keys[i]
+        del values[i]
+        self._len -= 1
+
+        if not keys:
+            self._delete_block(b)
+            return
+        if (
+            len(keys) < self.block_size // 4 and b + 1 < len(self._keys)
+            and len(keys) + len(self._keys[b + 1]) <= self.block_size
+        ):
+            keys.extend(self._keys[b + 1])
+            values.extend(self._values[b + 1])
+            self._delete_block(b + 1)
+        self._update(b)
+
+    def load_sorted(self, items):
+        # Replaces the contents with (key, value) pairs sorted by strictly
+        # increasing key in linear time, in half-full blocks
+        items = list(items)
+        size = max(self.block_size // 2, 1)
+        self._keys = [
+            [key for key, _ in items[i:i + size]]
+            for i in range(0, len(items), size)
+        ]
+        self._values = [
+            [value for _, value in items[i:i + size]]
+            for i in range(0, len(items), size)
+        ]
+        self._firsts = [keys[0] for keys in self._keys]
+        self._aggs = [self._fold(values) for values in self._values]
+        self._owned = [True] * len(self._keys)
+        self._index.load_sorted(zip(self._firsts, self._aggs))
+        self._len = len(items)
+
+    def fork(self):
+        # Returns an independent copy in O(n / block_size)
+        other = copy(self)
+        other._firsts = self._firsts[:]
+        other._keys = self._keys[:]
+        other._values = self._values[:]
+        other._aggs = self._aggs[:]
+        other._index = self._index.fork()
+        self._owned = [False] * len(self._keys)
+        other._owned = [False] * len(self._keys)
+        return other
+
+    def last_key(self):
+        return self._keys[-1][-1] if self._keys else None
+
+    def agg_before(self, key, include_eq=False):
+        if not self._keys:
+            return None
+        last = self._keys[-1][-1]
+        if last < key or include_eq and last == key:
+            return self._index.agg()
+
+        b = bisect_right(self._firsts, key) - 1
+        if b < 0:
+            return None
+        keys = self._keys[b]
+        i = bisect_right(keys, key) if include_eq else bisect_left(keys, key)
+        before = self._index.agg_before(self._firsts[b])
+        if i == 0:
+            return before
+        if i == len(keys):
+            part = self._aggs[b]
+        else:
+            part = self._fold(self._values[b][:i])
+        return part if before is None else self._agg_f(before, part)
+
+    def agg_after(self, key, include_eq=False):
+        if not self._keys:
+            return None
+        last = self._keys[-1][-1]
+        if last < key or not include_eq and last == key:
+            return None
+
+        b = bisect_right(self._firsts, key) - 1
+        if b < 0:
+            return self._index.agg()
+        keys = self._keys[b]
+        i = bisect_left(keys, key) if include_eq else bisect_right(keys, key)
+        after = self._index.agg_after(self._firsts[b])
+        if i == len(keys):
+            return after
+        if i == 0:
+            part = self._aggs[b]
+        else:
+            part = self._fold(self._values[b][i:])
+        return part if after is None else self._agg_f(part, after)
+
+    def agg(self):
+        return self._index.agg()
+
+    def find_prefix(self, pred):
+        # The first block whose inclusive prefix aggregate satisfies pred
+        # contains the pair
+        first, _ = self._index.find_prefix(pred)
+        b = bisect_left(self._firsts, first)
+        prefix = self._index.agg_before(first)
+        for key, value in zip(self._keys[b], self._values[b]):
+            prefix = value if prefix is None else self._agg_f(prefix, value)
+            if pred(prefix):
+                return key, value
+
+    def first(self):
+        if not self._keys:
+            raise KeyError
+        return self._keys[0][0], self._values[0][0]
+
+    def last(self):
+        if not self._keys:
+            raise KeyError
+        return self._keys[-1][-1], self._values[-1][-1]
+
+    def iter_from(self, key, include_eq=True):
+        if not self._keys:
+            return
+        b = self._block(key)
+        keys = self._keys[b]
+        i = bisect_left(keys, key) if include_eq else bisect_right(keys, key)
+        yield from zip(keys[i:], self._values[b][i:])
+        for b in range(b + 1, len(self._keys)):
+            yield from zip(self._keys[b], self._values[b])
+
+    def repeat_keys(self):
+        result = []
+        add = result.append
+        for keys, values in zip(self._keys, self._values):
+            if values.count(1) == len(values):
+                result += keys
+                continue
+            for key, value in zip(keys, values):
+                if value == 1:
+                    add(key)
+                else:
+                    result += [key] * value
+        return result
+
+    def __contains__(self, key):
+        try:
+            self._find(key)
+            return True
+        except KeyError:
+            return False
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for keys, values in zip(self._keys, self._values):
+            yield from zip(keys, values)
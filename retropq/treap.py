@@ -1,38 +1,60 @@
 import random
+from copy import copy
 random.seed(3)
 
+# OperationStats of the instrumented operation in progress, see
+# retropq.instrumentation
+_counters = None
+
 class Node:
-    def __init__(self, key, value, agg_f):
+    # Nodes are allocated for every operation in every tree, so they are kept
+    # small: no __dict__, and the aggregate function lives in the Treap.
+    #
+    # owner identifies the Treap version allowed to modify the node in place.
+    # The mutating functions below copy every node they are about to change
+    # that belongs to another owner, so forked treaps can share nodes.
+    __slots__ = ("key", "value", "p", "agg", "left", "right", "owner")
+
+    def __init__(self, key, value, owner=None):
         self.key = key
         self.value = value
         self.p = random.random()
-        self.agg_f = agg_f
         self.agg = value
+        self.owner = owner
 
         self.left = None
         self.right = None
 
-    def update_aggregate(self):
-        self.agg = self.value
-        res = None
-        for v in [self.left, self, self.right]:
-            if v is None:
-                continue
-            elif res is None:
-                res = v.agg
-            else:
-                res = self.agg_f(res, v.agg)
-
-        self.agg = res
+    def copy(self, owner):
+        node = Node.__new__(Node)
+        node.key = self.key
+        node.value = self.value
+        node.p = self.p
+        node.agg = self.agg
+        node.left = self.left
+        node.right = self.right
+        node.owner = owner
+        return node
 
-    def __iter__(self):
+    def update_aggregate(self, agg_f):
+        agg = self.value
         if self.left is not None:
-            yield from self.left
-
-        yield self.key, self.value
-
+            agg = agg_f(self.left.agg, agg)
         if self.right is not None:
-            yield from self.right
+            agg = agg_f(agg, self.right.agg)
+        self.agg = agg
+
+    def __iter__(self):
+        stack = []
+        node = self
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                yield node.key, node.value
+                node = node.right
 
     def __str__(self):
         return (
@@ -40,95 +62,399 @@ class Node:
             + "left:{0.left} right:{0.right})"
         ).format(self)
 
-def split(root, key, eq_left=False):
-    if root is None:
-        return None, None
-
-    root_in_left = (
-        root.key < key
-        or root.key == key and eq_left
-    )
-    if root_in_left:
-        s_left, s_right = split(root.right, key, eq_left)
-        root.right = s_left
-        root.update_aggregate()
-        assert root.right is not root
-
-        return root, s_right
-    else:
-        s_left, s_right = split(root.left, key, eq_left)
-        root.left = s_right
-        root.update_aggregate()
+def _own_path(path, end, owner):
+    # Replaces the nodes path[:end] of a root-to-leaf path that do not belong
+    # to owner by copies and links each copy to the (copied) previous node
+    for i in range(end):
+        node = path[i]
+        if node.owner is not owner:
+            node = path[i] = node.copy(owner)
+            if i > 0:
+                parent = path[i - 1]
+                if node.key < parent.key:
+                    parent.left = node
+                else:
+                    parent.right = node
+
+def split(root, key, agg_f, eq_left=False, owner=None):
+    # Walks down once, appending each node to the right spine of the left
+    # part or the left spine of the right part, then fixes the aggregates of
+    # the visited nodes bottom-up
+    path = []
+    left = right = None
+    left_tail = right_tail = None
+    node = root
+    while node is not None:
+        if node.owner is not owner:
+            node = node.copy(owner)
+        path.append(node)
+        if node.key < key or node.key == key and eq_left:
+            if left_tail is None:
+                left = node
+            else:
+                left_tail.right = node
+            left_tail = node
+            node = node.right
+        else:
+            if right_tail is None:
+                right = node
+            else:
+                right_tail.left = node
+            right_tail = node
+            node = node.left
 
-        assert root.left is not root
-        return s_left, root
+    if left_tail is not None:
+        left_tail.right = None
+    if right_tail is not None:
+        right_tail.left = None
+    for node in reversed(path):
+        node.update_aggregate(agg_f)
 
-def merge(left, right):
+    if _counters is not None:
+        _counters.on_split(len(path))
+    return left, right
+
+def merge(left, right, agg_f, owner=None):
     if left is None:
         return right
     elif right is None:
         return left
-    elif left.p < right.p:
-        left.right = merge(left.right, right)
-        left.update_aggregate()
-        return left
+
+    path = []
+    root = parent = None
+    parent_from_left = False
+    while left is not None and right is not None:
+        if left.p < right.p:
+            node = left if left.owner is owner else left.copy(owner)
+            left = node.right
+            from_left = True
+        else:
+            node = right if right.owner is owner else right.copy(owner)
+            right = node.left
+            from_left = False
+
+        if parent is None:
+            root = node
+        elif parent_from_left:
+            parent.right = node
+        else:
+            parent.left = node
+        path.append(node)
+        parent = node
+        parent_from_left = from_left
+
+    rest = left if left is not None else right
+    if parent_from_left:
+        parent.right = rest
     else:
-        right.left = merge(left, right.left)
-        right.update_aggregate()
-        return right
+        parent.left = rest
+    for node in reversed(path):
+        node.update_aggregate(agg_f)
 
-def remove(root, key):
-    if root is None:
+    if _counters is not None:
+        _counters.on_merge(len(path))
+    return root
+
+def remove(root, key, agg_f, owner=None):
+    path = []
+    node = root
+    while node is not None and node.key != key:
+        path.append(node)
+        node = node.left if key < node.key else node.right
+    if node is None:
         raise KeyError
-    elif root.key == key:
-        return merge(root.left, root.right)
+
+    replacement = merge(node.left, node.right, agg_f, owner)
+    if _counters is not None:
+        _counters.on_walk(len(path) + 1, len(path))
+    if not path:
+        return replacement
+
+    _own_path(path, len(path), owner)
+    parent = path[-1]
+    if key < parent.key:
+        parent.left = replacement
     else:
-        if key < root.key:
-            root.left = remove(root.left, key)
+        parent.right = replacement
+    for node in reversed(path):
+        node.update_aggregate(agg_f)
+
+    return path[0]
+
+def insert(root, key, value, agg_f, owner=None):
+    # Sets the value of key, overwriting an existing node in place. Returns
+    # the new root and whether a node was added.
+    path = []
+    node = root
+    while node is not None and node.key != key:
+        path.append(node)
+        node = node.left if key < node.key else node.right
+
+    if node is not None:
+        path.append(node)
+        _own_path(path, len(path), owner)
+        path[-1].value = value
+        for node in reversed(path):
+            node.update_aggregate(agg_f)
+        if _counters is not None:
+            _counters.on_walk(len(path), len(path))
+        return path[0], False
+
+    # The new node replaces the first node on the search path with a larger
+    # priority, taking that node's subtree split around key as its children
+    new = Node(key, value, owner)
+    depth = 0
+    while depth < len(path) and path[depth].p < new.p:
+        depth += 1
+    if depth < len(path):
+        new.left, new.right = split(path[depth], key, agg_f, owner=owner)
+    new.update_aggregate(agg_f)
+    if _counters is not None:
+        _counters.on_walk(len(path) + 1, depth + 1)
+
+    if depth == 0:
+        return new, True
+
+    _own_path(path, depth, owner)
+    parent = path[depth - 1]
+    if key < parent.key:
+        parent.left = new
+    else:
+        parent.right = new
+    for node in reversed(path[:depth]):
+        node.update_aggregate(agg_f)
+
+    return path[0], True
+
+def build(items, agg_f, owner=None):
+    # Builds a treap from (key, value) pairs with increasing keys in linear
+    # time. The stack holds the right spine of the tree built so far; a node
+    # is final once it is popped off it, so aggregates are computed then.
+    stack = []
+    for key, value in items:
+        node = Node(key, value, owner)
+        last = None
+        while stack and stack[-1].p > node.p:
+            last = stack.pop()
+            last.update_aggregate(agg_f)
+        node.left = last
+        if stack:
+            stack[-1].right = node
+        stack.append(node)
+
+    for node in reversed(stack):
+        node.update_aggregate(agg_f)
+
+    return stack[0] if stack else None
+
+def find_prefix(root, pred, agg_f):
+    # Returns the node with the smallest key whose inclusive prefix
+    # aggregate satisfies pred, which has to be monotone in the key, or None
+    if _counters is not None:
+        _counters.queries += 1
+    prefix = None
+    node = root
+    while node is not None:
+        before = prefix
+        if node.left is not None:
+            left_agg = node.left.agg
+            before = left_agg if before is None else agg_f(before, left_agg)
+            if pred(before):
+                node = node.left
+                continue
+
+        prefix = node.value if before is None else agg_f(before, node.value)
+        if pred(prefix):
+            return node
+        node = node.right
+    return None
+
+def iter_from(root, key, include_eq=True):
+    # In-order iteration over the nodes with keys >= key (> key if not
+    # include_eq). The stack starts as the path of nodes on the way to key
+    # that are still to be visited.
+    stack = []
+    node = root
+    while node is not None:
+        if key < node.key or include_eq and node.key == key:
+            stack.append(node)
+            node = node.left
         else:
-            root.right = remove(root.right, key)
-        root.update_aggregate()
-        return root
+            node = node.right
+
+    while stack:
+        node = stack.pop()
+        yield node.key, node.value
+        node = node.right
+        while node is not None:
+            stack.append(node)
+            node = node.left
+
+def repeat_keys(root):
+    # Every key in order, repeated as many times as its value. Collected in
+    # one loop rather than from Node.__iter__, which resumes a generator for
+    # every node.
+    result = []
+    add = result.append
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    node = root
+    while True:
+        while node is not None:
+            push(node)
+            node = node.left
+        if not stack:
+            return result
+        node = pop()
+        if node.value == 1:
+            add(node.key)
+        else:
+            result += [node.key] * node.value
+        node = node.right
 
 def find(root, key):
-    if root is None:
-        raise KeyError
-    elif key == root.key:
-        return root.value
-    elif key < root.key:
-        return find(root.left, key)
-    else:
-        return find(root.right, key)
+    if _counters is not None:
+        _counters.queries += 1
+    node = root
+    while node is not None:
+        if key == node.key:
+            return node.value
+        elif key < node.key:
+            node = node.left
+        else:
+            node = node.right
+    raise KeyError
+
+def agg_before(root, key, agg_f, include_eq=False):
+    # Aggregate of all nodes with keys < key (<= key if include_eq), computed
+    # on a single root-to-leaf walk without modifying the tree
+    if _counters is not None:
+        _counters.queries += 1
+    result = None
+    node = root
+    while node is not None:
+        if node.key < key or node.key == key and include_eq:
+            part = node.value
+            if node.left is not None:
+                part = agg_f(node.left.agg, part)
+            result = part if result is None else agg_f(result, part)
+            node = node.right
+        else:
+            node = node.left
+    return result
+
+def agg_after(root, key, agg_f, include_eq=False):
+    # Aggregate of all nodes with keys > key (>= key if include_eq)
+    if _counters is not None:
+        _counters.queries += 1
+    result = None
+    node = root
+    while node is not None:
+        if node.key > key or node.key == key and include_eq:
+            part = node.value
+            if node.right is not None:
+                part = agg_f(part, node.right.agg)
+            result = part if result is None else agg_f(part, result)
+            node = node.left
+        else:
+            node = node.right
+    return result
 
 class Treap:
-    def __init__(self, agg_f):
+    # An OrderedMap, see retropq.ordered_map. Every node stores the aggregate
+    # of its subtree, so fold is not needed.
+    def __init__(self, agg_f, fold=None):
         self._agg_f = agg_f
         self._root = None
         self._len = 0
+        # Largest key, cached so that queries and inserts past the end of the
+        # tree (the common case for timelines) can skip the descent
+        self._last_key = None
+        # Owner of the nodes this treap may modify in place, see Node
+        self._owner = None
 
     def remove(self, key):
-        self._root = remove(self._root, key)
+        self._root = remove(self._root, key, self._agg_f, self._owner)
+        if _counters is not None:
+            _counters.on_tree(self)
         self._len -= 1
+        if self._root is None:
+            self._last_key = None
+        elif key == self._last_key:
+            self._last_key = self.last()[0]
+
+    def load_sorted(self, items):
+        # Replaces the contents with (key, value) pairs sorted by strictly
+        # increasing key in linear time
+        items = list(items)
+        self._root = build(items, self._agg_f, self._owner)
+        if _counters is not None:
+            _counters.aggregate_updates += len(items)
+        self._len = len(items)
+        self._last_key = items[-1][0] if items else None
+
+    def fork(self):
+        # Returns an independent copy in O(1). Both treaps share all nodes
+        # and copy the ones they modify from then on.
+        other = copy(self)
+        self._owner = object()
+        other._owner = object()
+        return other
+
+    def last_key(self):
+        # Returns the largest key in O(1), or None if the tree is empty
+        return self._last_key
 
     def agg_before(self, key, include_eq = False):
-        before, after = split(self._root, key, eq_left = include_eq)
-        result = before.agg if before is not None else None
-        self._root = merge(before, after)
-        return result
+        root = self._root
+        if root is not None and (
+            self._last_key < key or include_eq and self._last_key == key
+        ):
+            return root.agg
+        return agg_before(root, key, self._agg_f, include_eq)
 
     def agg_after(self, key, include_eq = False):
-        before, after = split(self._root, key, eq_left = not include_eq)
-        result = after.agg if after is not None else None
-        self._root = merge(before, after)
-        return result
+        if self._root is None or self._last_key < key or (
+            not include_eq and self._last_key == key
+        ):
+            return None
+        return agg_after(self._root, key, self._agg_f, include_eq)
 
     def agg(self):
         return self._root.agg if self._root else None
 
+    def find_prefix(self, pred):
+        # Returns the first (key, value) pair whose inclusive prefix aggregate
+        # satisfies the monotone predicate pred
+        node = find_prefix(self._root, pred, self._agg_f)
+        if node is None:
+            raise KeyError
+        return node.key, node.value
+
+    def first(self):
+        # Returns the (key, value) pair with the smallest key
+        node = self._root
+        if node is None:
+            raise KeyError
+        while node.left is not None:
+            node = node.left
+        return node.key, node.value
+
+    def last(self):
+        node = self._root
+        if node is None:
+            raise KeyError
+        while node.right is not None:
+            node = node.right
+        return node.key, node.value
+
     def __getitem__(self, key):
         return find(self._root, key)
 
     def __contains__(self, key):
+        if self._root is None or self._last_key < key:
+            return False
         try:
             self.__getitem__(key)
             return True
@@ -136,16 +462,25 @@ class Treap:
             return False
 
     def __setitem__(self, key, value):
-        left, node_and_right = split(self._root, key)
-        old_node, right = split(node_and_right, key, eq_left=True)
-
-        if old_node is None:
+        if self._root is None or self._last_key < key:
+            self._last_key = key
+        self._root, added = insert(
+            self._root, key, value, self._agg_f, self._owner
+        )
+        if _counters is not None:
+            _counters.on_tree(self)
+        if added:
             self._len += 1
 
-        node = Node(key, value, self._agg_f)
-        self._root = merge(left, merge(node, right))
+    def iter_from(self, key, include_eq=True):
+        # Lazily yields the (key, value) pairs with keys >= key (> key if not
+        # include_eq) in order
+        return iter_from(self._root, key, include_eq)
+
+    def repeat_keys(self):
+        return repeat_keys(self._root)
 
-    def __len__():
+    def __len__(self):
         return self._len
 
     def __iter__(self):
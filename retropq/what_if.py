@@ -0,0 +1,169 @@
+"""Vectorized what-if queries for many candidate operations at once.
+
+Requires NumPy (`pip install retropq[numpy]`). Times and values must be
+numeric.
+
+    what_if = WhatIf(queue)
+    values, insert_times = what_if.delete_min(candidate_times)
+    survives = what_if.insert_survives(candidate_times, candidate_values)
+
+`WhatIf` flattens the timeline of a `RetroactivePriorityQueue` into arrays
+once, in linear time. Every batch is then answered with `searchsorted` and
+precomputed prefix/suffix minima and maxima instead of one tree descent per
+candidate, following the same rules as `add_delete_min` and `add_insert`. The
+arrays are not updated when the queue changes afterwards.
+"""
+import numpy as np
+
+
+def _running_extreme(values, better):
+    # Running best of values and the index where it was first reached,
+    # where better(a, b) compares arrays elementwise
+    best = np.empty_like(values)
+    index = np.empty(len(values), dtype=np.intp)
+    if len(values):
+        accumulate = np.minimum if better is np.less else np.maximum
+        best[:] = accumulate.accumulate(values)
+        improved = np.empty(len(values), dtype=bool)
+        improved[0] = True
+        improved[1:] = better(values[1:], best[:-1])
+        index[:] = np.maximum.accumulate(
+            np.where(improved, np.arange(len(values)), 0)
+        )
+    return best, index
+
+class WhatIf:
+    """A snapshot of a queue's timeline for answering batches of what-ifs.
+
+    Attributes:
+        times: The times of all operations in increasing order.
+        bridges: The value of every operation in `_bridges`: 0 for inserts in
+            the queue now, 1 for inserts deleted later and -1 for
+            delete-mins.
+        values: The inserted values, NaN for delete-mins.
+    """
+
+    def __init__(self, queue):
+        """
+        Args:
+            queue: A `RetroactivePriorityQueue` with numeric times and
+                values.
+        """
+        entries = list(queue._entries())
+        self.times = np.array([t for t, _, _ in entries], dtype=float)
+        self.bridges = np.array([k for _, k, _ in entries], dtype=np.int8)
+        self.values = np.array(
+            [np.nan if v is None else v for _, _, v in entries], dtype=float
+        )
+
+        # Inclusive prefix sums of the bridges, and the sums of the first i
+        # bridges at index i
+        self._prefix = np.cumsum(self.bridges, dtype=np.int64)
+        self._before = np.concatenate(([0], self._prefix))
+        sizes = np.cumsum(
+            np.where(self.bridges < 0, -1, 1), dtype=np.int64
+        )
+        # _suffix_min_size[i] is the smallest size after operations i, i+1,
+        # ... with the size before the first operation (0) at index 0
+        all_sizes = np.concatenate(([0], sizes))
+        self._suffix_min_size = np.minimum.accumulate(
+            all_sizes[::-1]
+        )[::-1]
+        self._zeros = np.flatnonzero(self._prefix == 0)
+
+        # The smallest insert in the queue now among operations 0..i, and the
+        # largest deleted insert among operations i..n-1, as (value, time)
+        # with ties broken like MinBST and MaxBST
+        in_q = np.where(self.bridges == 0, self.values, np.inf)
+        self._min_in_q, self._min_in_q_at = _running_extreme(in_q, np.less)
+        deleted = np.where(self.bridges == 1, self.values, -np.inf)
+        max_deleted, at = _running_extreme(deleted[::-1], np.greater)
+        self._max_deleted = max_deleted[::-1]
+        self._max_deleted_at = (len(at) - 1 - at)[::-1]
+
+    def _check_new(self, times):
+        i = np.searchsorted(self.times, times)
+        found = i < len(self.times)
+        found[found] = self.times[i[found]] == times[found]
+        if found.any():
+            raise KeyError(times[found][0])
+
+    def delete_min(self, times):
+        """What a delete-min at each of the given times would remove.
+
+        Args:
+            times: An array of candidate times, none of which may be the
+                time of an existing operation.
+
+        Returns:
+            Two float arrays with the removed value and the time it was
+            inserted for every candidate, NaN where the delete-min would be
+            invalid because the queue would be empty at some later time.
+
+        Raises:
+            KeyError: If a candidate time is the time of an operation.
+        """
+        times = np.asarray(times, dtype=float)
+        self._check_new(times)
+        n = len(self.times)
+        # Number of operations at times <= t
+        i = np.searchsorted(self.times, times, side="right")
+
+        valid = self._suffix_min_size[i] > 0
+        # The bridge is t itself if all deletes before it are matched, and
+        # the first later operation with a zero prefix sum otherwise
+        before = self._before[i]
+        bridge = np.where(before == 0, i - 1, n - 1)
+        pending = valid & (before != 0)
+        z = np.searchsorted(self._zeros, i[pending])
+        bridge[pending] = self._zeros[np.minimum(z, len(self._zeros) - 1)]
+
+        values = np.full(len(times), np.nan)
+        insert_times = np.full(len(times), np.nan)
+        b = bridge[valid]
+        values[valid] = self._min_in_q[b]
+        insert_times[valid] = self.times[self._min_in_q_at[b]]
+        return values, insert_times
+
+    def insert_survives(self, times, values):
+        """Whether an insert at each of the given times would stay in the
+        queue until the present.
+
+        Args:
+            times: An array of candidate times, none of which may be the
+                time of an existing operation.
+            values: An array of the values inserted at the same positions.
+
+        Returns:
+            A boolean array, True where the inserted value would be in the
+            queue after all operations.
+
+        Raises:
+            KeyError: If a candidate time is the time of an operation.
+        """
+        times = np.asarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        self._check_new(times)
+        n = len(self.times)
+        # Number of operations at times < t
+        i = np.searchsorted(self.times, times)
+
+        # Like zero_prefix_before: candidates after a zero prefix sum
+        # compete only with later deleted inserts; otherwise with those
+        # from the last zero prefix sum before them (or the first operation)
+        before = self._before[i]
+        start = i.copy()
+        pending = before != 0
+        z = np.searchsorted(self._zeros, i[pending]) - 1
+        start[pending] = np.where(
+            z >= 0, self._zeros[np.maximum(z, 0)], 0
+        )
+
+        survives = np.ones(len(times), dtype=bool)
+        competing = start < n
+        s = start[competing]
+        best = self._max_deleted[s]
+        best_t = self.times[self._max_deleted_at[s]]
+        v, t = values[competing], times[competing]
+        survives[competing] = (v > best) | (v == best) & (t > best_t)
+        return survives
@@ -1,8 +1,22 @@
+from itertools import accumulate
+from operator import add
+
+from .ordered_map import WrappedMap
 from .treap import Treap
 
+# OperationStats of the instrumented operation in progress, see
+# retropq.instrumentation
+_counters = None
+
 class MinPrefixSumAggregator:
+    __slots__ = (
+        "sum", "count", "min_key", "max_key",
+        "min_prefix_sum", "min_prefix_first_key", "min_prefix_last_key",
+    )
+
     def __init__(self, key, value):
         self.sum = value
+        self.count = 1
         self.min_key = key
         self.max_key = key
 
@@ -11,8 +25,9 @@ class MinPrefixSumAggregator:
         self.min_prefix_last_key = key
 
     def __add__(self, other):
-        res = MinPrefixSumAggregator(None, 0)
+        res = MinPrefixSumAggregator.__new__(MinPrefixSumAggregator)
         res.sum = self.sum + other.sum
+        res.count = self.count + other.count
         res.min_key = self.min_key
         res.max_key = other.max_key
 
@@ -31,48 +46,86 @@ class MinPrefixSumAggregator:
 
         return res
 
-class ZeroPrefixBST(Treap):
-    def __init__(self):
-        super().__init__(lambda x, y: x + y)
+def zero_prefix_before(key, res):
+    # ZeroPrefixBST.zero_prefix_before given the aggregate of all values with
+    # keys < key
+    if _counters is not None:
+        _counters.bridge_searches += 1
+    if res is None:
+        return key
+    elif res.min_prefix_sum > 0:
+        return min(res.min_key, key)
+    elif res.sum == 0:
+        return max(res.min_prefix_last_key, key)
+    else:
+        return res.min_prefix_last_key
+
+def zero_prefix_after(key, total, after_res):
+    # ZeroPrefixBST.zero_prefix_after given the aggregate of all values and
+    # the one of values with keys > key
+    if _counters is not None:
+        _counters.bridge_searches += 1
+    if after_res is None:
+        return key
+
+    before_sum = total.sum - after_res.sum
+    min_prefix_in_res = before_sum + after_res.min_prefix_sum
+
+    if before_sum == 0:
+        return key
+    elif min_prefix_in_res == 0:
+        return after_res.min_prefix_first_key
+    else:
+        return None
+
+def fold_values(values):
+    # Aggregate of a list of MinPrefixSumAggregators of single keys, as
+    # reduce(add, values) but with the prefix sums computed in C
+    prefix = list(accumulate([v.sum for v in values]))
+    low = min(prefix)
+    last = len(prefix) - 1 - prefix[::-1].index(low)
+
+    res = MinPrefixSumAggregator.__new__(MinPrefixSumAggregator)
+    res.sum = prefix[-1]
+    res.count = len(values)
+    res.min_key = values[0].min_key
+    res.max_key = values[-1].max_key
+    res.min_prefix_sum = low
+    res.min_prefix_first_key = values[prefix.index(low)].min_key
+    res.min_prefix_last_key = values[last].min_key
+    return res
+
+class ZeroPrefixBST(WrappedMap):
+    def __init__(self, backend=Treap):
+        super().__init__(backend, add, fold_values)
 
     def zero_prefix_before(self, key):
         # Returns the maximum k <= key such that the values of all operations
         # with keys <k sum up to 0
-        res = self.agg_before(key, include_eq=False)
-
-        if res is None:
-            return key
-        elif res.min_prefix_sum > 0:
-            return min(res.min_key, key)
-        elif res.sum == 0:
-            return max(res.min_prefix_last_key, key)
-        else:
-            return res.min_prefix_last_key
+        return zero_prefix_before(key, self.agg_before(key, include_eq=False))
 
     def zero_prefix_after(self, key):
         # Returns the minimum k >= key such that the values of all operations
         # with keys <= k sum to 0 (and None if no such k exists)
-
-        after_res = self.agg_after(key, include_eq=False)
-        if after_res is None:
-            return key
-
-        before_sum = self.agg().sum - after_res.sum
-        min_prefix_in_res = before_sum + after_res.min_prefix_sum
-
-        if before_sum == 0:
-            return key
-        elif min_prefix_in_res == 0:
-            return after_res.min_prefix_first_key
-        else:
-            return None
+        return zero_prefix_after(
+            key, self.agg(), self.agg_after(key, include_eq=False)
+        )
 
     def __getitem__(self, key):
-        return super().__getitem__(key).sum
+        return self._map[key].sum
 
     def __setitem__(self, key, value):
-        super().__setitem__(key, MinPrefixSumAggregator(key, value))
+        self._map[key] = MinPrefixSumAggregator(key, value)
+
+    def load_sorted(self, items):
+        self._map.load_sorted(
+            (key, MinPrefixSumAggregator(key, value)) for key, value in items
+        )
 
     def __iter__(self):
-        for k, v in super().__iter__():
+        for k, v in self._map:
+            yield k, v.sum
+
+    def iter_from(self, key, include_eq=True):
+        for k, v in self._map.iter_from(key, include_eq):
             yield k, v.sum
@@ -0,0 +1,105 @@
+import unittest
+import random
+from collections import Counter
+
+from retropq import (
+    Change, RetroactivePriorityQueue, FusedRetroactivePriorityQueue
+)
+from test.test_rpq_bulk import random_operations
+
+
+class Mirror:
+    # The contents of a queue, kept up to date from its change feed
+    def __init__(self):
+        self.values = Counter()
+        self.ops = []
+
+    def __call__(self, op, change):
+        self.ops.append(op)
+        if change.added is not None:
+            self.values[change.added[1]] += 1
+        if change.removed is not None:
+            self.values[change.removed[1]] -= 1
+
+
+class ChangeFeedTest(unittest.TestCase):
+    queue_cls = RetroactivePriorityQueue
+
+    def test_random(self):
+        rng = random.Random(5)
+        queue = self.queue_cls()
+        mirror = Mirror()
+        queue.subscribe(mirror)
+        for op in random_operations(300, 5, 0.55, 20):
+            getattr(queue, op[0])(*op[1:])
+
+        for _ in range(500):
+            t = rng.randrange(-10, 3100) + rng.choice([0, 0.5])
+            update = rng.choice([
+                ("add_insert", t, rng.randrange(20)),
+                ("add_delete_min", t), ("remove", t),
+            ])
+            try:
+                expected = getattr(queue, "preview_" + update[0])(
+                    *update[1:]
+                )
+            except (KeyError, ValueError) as e:
+                with self.assertRaises(type(e)):
+                    getattr(queue, update[0])(*update[1:])
+                continue
+            self.assertEqual(getattr(queue, update[0])(*update[1:]), expected)
+            self.assertEqual(mirror.ops[-1], update)
+            self.assertEqual(+mirror.values, Counter(queue))
+
+    def test_unsubscribe(self):
+        queue = self.queue_cls()
+        mirror = Mirror()
+        queue.subscribe(mirror)
+        self.assertEqual(queue.add_insert(10, "a"), Change((10, "a"), None))
+        self.assertEqual(queue.add_insert(0, "b"), Change((0, "b"), None))
+        self.assertEqual(queue.add_delete_min(5), Change(None, (0, "b")))
+        self.assertEqual(queue.remove(5), Change((0, "b"), None))
+        fork = queue.fork()
+        queue.unsubscribe(mirror)
+        queue.remove(0)
+        fork.remove(10)
+        self.assertEqual(len(mirror.ops), 4)
+        with self.assertRaises(ValueError):
+            queue.unsubscribe(mirror)
+
+
+class FusedChangeFeedTest(ChangeFeedTest):
+    queue_cls = FusedRetroactivePriorityQueue
+
+
+class BatchChangeFeedTest(unittest.TestCase):
+    def check(self, n, k):
+        rng = random.Random(n + k)
+        queue = RetroactivePriorityQueue.from_operations(
+            random_operations(n, n, 0.55, 20)
+        )
+        mirror = Mirror()
+        mirror.values.update(queue)
+        queue.subscribe(mirror)
+
+        times = rng.sample(range(10 * n), k)
+        batch = [
+            ("remove", t) if t in queue._bridges
+            else ("add_insert", t + 0.5, rng.randrange(20))
+            for t in times
+        ]
+        try:
+            changes = queue.apply_batch(batch)
+        except ValueError:
+            self.assertEqual(mirror.ops, [])
+            return
+        self.assertEqual(len(changes), len(mirror.ops))
+        self.assertEqual(+mirror.values, Counter(queue))
+
+    def test_small(self):
+        for k in range(1, 10):
+            self.check(500, k)
+
+    def test_rebuild(self):
+        for k in (200, 400):
+            self.check(500, k)
@@ -0,0 +1,87 @@
+import unittest
+import random
+
+from retropq import RetroactivePriorityQueue
+from test.test_rpq_bulk import random_operations
+
+
+def random_update(queue, t, rng):
+    # Applies a random update at time t, or removes the operation there
+    try:
+        if t in queue._bridges:
+            queue.remove(t)
+        elif rng.random() < 0.6:
+            queue.add_insert(t, rng.randrange(100))
+        else:
+            queue.add_delete_min(t)
+    except ValueError:
+        pass
+
+
+class CompactTest(unittest.TestCase):
+    def test_compact(self):
+        operations = random_operations(1000, 1, 0.55, 100)
+        queue = RetroactivePriorityQueue.from_operations(operations)
+        expected = RetroactivePriorityQueue.from_operations(operations)
+        horizon = operations[600][1]
+
+        queue.compact(horizon)
+        self.assertEqual(horizon, queue.horizon())
+        self.assertEqual(list(expected), list(queue))
+        self.assertLess(len(queue._bridges), 700)
+        for t in range(horizon, 10000, 97):
+            self.assertEqual(expected.size_at(t), queue.size_at(t))
+
+        rng = random.Random(2)
+        for _ in range(500):
+            t = rng.randrange(horizon, 10500)
+            seed = rng.random()
+            random_update(queue, t, random.Random(seed))
+            random_update(expected, t, random.Random(seed))
+            self.assertEqual(list(expected), list(queue))
+        for t in range(horizon, 10500, 89):
+            self.assertEqual(list(expected.iter_at(t)), list(queue.iter_at(t)))
+            self.assertEqual(expected.get_min_at(t), queue.get_min_at(t))
+
+        # Compacting to an earlier horizon does nothing
+        queue.compact(horizon - 100)
+        self.assertEqual(horizon, queue.horizon())
+
+        for method, args in [
+            ("add_insert", (horizon - 1, 0)),
+            ("add_delete_min", (horizon - 1,)),
+            ("remove", (horizon - 1,)),
+            ("size_at", (horizon - 1,)),
+            ("preview_add_insert", (horizon - 1, 0)),
+            ("apply_batch", ([("add_insert", horizon - 1, 0)],)),
+        ]:
+            with self.assertRaises(ValueError):
+                getattr(queue, method)(*args)
+
+    def test_window(self):
+        window = 200
+        queue = RetroactivePriorityQueue(window=window)
+        expected = RetroactivePriorityQueue()
+        rng = random.Random(3)
+        for end in range(0, 5000, 2):
+            # Mostly appends, some updates within the window
+            t = end if rng.random() < 0.7 else end - rng.randrange(window)
+            if queue.horizon() is not None and t < queue.horizon():
+                continue
+            seed = rng.random()
+            random_update(queue, t + 0.5, random.Random(seed))
+            random_update(expected, t + 0.5, random.Random(seed))
+            self.assertEqual(list(expected), list(queue))
+
+        self.assertGreater(queue.horizon(), 4000)
+        self.assertLess(
+            len(queue._bridges), 2 * window + len(queue) + 10
+        )
+
+    def test_window_emptied(self):
+        queue = RetroactivePriorityQueue(window=10)
+        queue.add_insert(1, 5)
+        queue.apply_batch([("remove", 1)])
+        self.assertEqual([], list(queue))
+        queue.add_insert(30, 2)
+        self.assertEqual([2], list(queue))
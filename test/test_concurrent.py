@@ -0,0 +1,85 @@
+import unittest
+import random
+import threading
+
+from retropq import (
+    ConcurrentRetroactivePriorityQueue, FusedRetroactivePriorityQueue,
+    RetroactivePriorityQueue
+)
+
+
+class ConcurrentTest(unittest.TestCase):
+    def test_published(self):
+        queue = ConcurrentRetroactivePriorityQueue()
+        self.assertIsNone(queue.get_min())
+        self.assertEqual(len(queue), 0)
+        queue.add_insert(10, 3)
+        queue.add_insert(0, 2)
+        queue.add_delete_min(5)
+        self.assertEqual((queue.get_min(), len(queue)), (3, 1))
+        with self.assertRaises(ValueError):
+            queue.add_delete_min(-1)
+        self.assertEqual((queue.get_min(), len(queue)), (3, 1))
+        queue.remove(5)
+        self.assertEqual((queue.get_min(), len(queue)), (2, 2))
+        self.assertEqual(queue.get_min_at(5), 2)
+        self.assertEqual(list(queue.iter_at(0)), [2])
+        self.assertEqual(queue.size_at(10), 2)
+
+    def test_snapshot(self):
+        queue = ConcurrentRetroactivePriorityQueue()
+        for t in range(100):
+            queue.add_insert(t, t)
+        snapshot = queue.snapshot()
+        it = iter(queue)
+        queue.apply_batch([("add_delete_min", t + 0.5) for t in range(50)])
+        self.assertEqual(list(snapshot), list(range(100)))
+        self.assertEqual(list(it), list(range(100)))
+        self.assertEqual(list(queue), list(range(50, 100)))
+
+    def test_threads(self):
+        queue = ConcurrentRetroactivePriorityQueue(self.queue_cls())
+        writers, n = 4, 300
+        errors = []
+
+        def write(w):
+            rng = random.Random(w)
+            for i in range(n):
+                queue.add_insert(i * writers + w, rng.randrange(1000))
+
+        def read():
+            try:
+                while any(thread.is_alive() for thread in threads):
+                    values = list(queue)
+                    self.assertEqual(values, sorted(values))
+                    queue.get_min()
+                    len(queue)
+                    500 in queue
+            except Exception as e:
+                errors.append(e)
+
+        threads = [
+            threading.Thread(target=write, args=(w,)) for w in range(writers)
+        ]
+        readers = [threading.Thread(target=read) for _ in range(2)]
+        for thread in threads + readers:
+            thread.start()
+        for thread in threads + readers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        expected = []
+        for w in range(writers):
+            rng = random.Random(w)
+            expected.extend(rng.randrange(1000) for _ in range(n))
+        expected.sort()
+        self.assertEqual(list(queue), expected)
+        self.assertEqual(
+            (queue.get_min(), len(queue)), (expected[0], n * writers)
+        )
+
+    queue_cls = RetroactivePriorityQueue
+
+
+class FusedConcurrentTest(ConcurrentTest):
+    queue_cls = FusedRetroactivePriorityQueue
@@ -0,0 +1,58 @@
+import unittest
+import random
+from array import array
+
+from retropq import RetroactivePriorityQueue, FusedRetroactivePriorityQueue
+from retropq.sorted_blocks import SortedBlocks
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ExportTest(unittest.TestCase):
+    def queues(self):
+        for cls in (RetroactivePriorityQueue, FusedRetroactivePriorityQueue):
+            yield cls()
+            yield cls(SortedBlocks)
+
+    def fill(self, queue):
+        rng = random.Random(7)
+        for t in range(2000):
+            if len(queue) and rng.random() < 0.3:
+                queue.add_delete_min(t)
+            else:
+                queue.add_insert(t, rng.randrange(300))
+
+    def test_export(self):
+        for queue in self.queues():
+            self.assertEqual([], queue.to_list())
+            self.assertEqual(array("q"), queue.to_array("q"))
+            self.fill(queue)
+            expected = list(queue)
+            self.assertEqual(sorted(expected), expected)
+            self.assertEqual(expected, queue.to_list())
+            self.assertEqual(array("q", expected), queue.to_array("q"))
+            self.assertEqual(array("d", expected), queue.to_array("d"))
+
+    def test_iter_between(self):
+        for queue in self.queues():
+            self.assertEqual([], list(queue.iter_between(0, 10)))
+            self.fill(queue)
+            expected = list(queue)
+            for lo, hi in [(0, 299), (-5, 3), (100, 100), (150, 180),
+                           (250, 1000), (20, 10)]:
+                self.assertEqual(
+                    [v for v in expected if lo <= v <= hi],
+                    list(queue.iter_between(lo, hi)),
+                )
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_numpy(self):
+        for queue in self.queues():
+            self.assertEqual(0, len(queue.to_numpy()))
+            self.fill(queue)
+            result = queue.to_numpy(numpy.int64)
+            self.assertEqual(numpy.int64, result.dtype)
+            self.assertEqual(list(queue), result.tolist())
@@ -0,0 +1,111 @@
+import unittest
+import random
+
+from retropq import RetroactivePriorityQueue, FusedRetroactivePriorityQueue
+from retropq.treap import Treap
+from test.test_rpq_bulk import random_operations, state
+
+
+def random_update(queue, rng):
+    t = rng.randrange(-100, 10000) + 0.5
+    try:
+        if rng.random() < 0.6:
+            queue.add_insert(t, rng.randrange(1000))
+        else:
+            queue.add_delete_min(t)
+    except ValueError:
+        pass
+
+def nodes(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is not None:
+            yield node
+            stack.extend((node.left, node.right))
+
+
+class TreapForkTest(unittest.TestCase):
+    def test_independent(self):
+        treap = Treap(lambda x, y: x + y)
+        for k in range(200):
+            treap[k] = 1
+        fork = treap.fork()
+
+        for k in range(0, 200, 2):
+            fork.remove(k)
+        fork[500] = 7
+        treap[3] = 10
+
+        self.assertEqual(
+            [(k, 10 if k == 3 else 1) for k in range(200)], list(treap)
+        )
+        self.assertEqual(209, treap.agg())
+        self.assertEqual(
+            [(k, 1) for k in range(1, 200, 2)] + [(500, 7)], list(fork)
+        )
+        self.assertEqual(107, fork.agg())
+        self.assertEqual(200, len(treap))
+        self.assertEqual(101, len(fork))
+
+    def test_shares_nodes(self):
+        treap = Treap(lambda x, y: x + y)
+        treap.load_sorted((k, 1) for k in range(10000))
+        before = {id(node) for node in nodes(treap._root)}
+
+        fork = treap.fork()
+        fork[5000] = 2
+        fork.remove(7000)
+        copied = [
+            node for node in nodes(fork._root) if id(node) not in before
+        ]
+        self.assertLess(len(copied), 200)
+
+
+class QueueForkTest(unittest.TestCase):
+    def check(self, queue_cls):
+        operations = random_operations(300, 4)
+        queue = queue_cls()
+        for op in operations:
+            getattr(queue, op[0])(*op[1:])
+        expected = RetroactivePriorityQueue.from_operations(operations)
+
+        fork = queue.fork()
+        forked_expected = expected.fork()
+        rng = random.Random(1)
+        for _ in range(100):
+            random_update(fork, random.Random(rng.random()))
+        for op in operations[::3]:
+            try:
+                fork.remove(op[1])
+            except ValueError:
+                pass
+        # Replay the same updates on an independent queue
+        rng = random.Random(1)
+        for _ in range(100):
+            random_update(forked_expected, random.Random(rng.random()))
+        for op in operations[::3]:
+            try:
+                forked_expected.remove(op[1])
+            except ValueError:
+                pass
+
+        self.assertEqual(list(forked_expected), list(fork))
+        self.assertEqual(list(expected), list(queue))
+        self.assertEqual(len(expected), len(queue))
+        return queue, fork, expected, forked_expected
+
+    def test_queue(self):
+        queue, fork, expected, forked_expected = self.check(
+            RetroactivePriorityQueue
+        )
+        self.assertEqual(state(expected), state(queue))
+        self.assertEqual(state(forked_expected), state(fork))
+
+        # The parent can still be modified after forking
+        queue.add_insert(10 ** 6, -5)
+        self.assertEqual(-5, queue.get_min())
+        self.assertNotIn(-5, fork)
+
+    def test_fused(self):
+        self.check(FusedRetroactivePriorityQueue)
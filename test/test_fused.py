@@ -0,0 +1,23 @@
+from retropq import FusedRetroactivePriorityQueue
+from test import test_rpq_rand
+
+
+class FusedRandomRPQTest(test_rpq_rand.RandomRPQTest):
+    def setUp(self):
+        super().setUp()
+        self.rpq = FusedRetroactivePriorityQueue()
+
+    def test_get_min(self):
+        self.random_op_sequence(300)
+        self.assertEqual(next(iter(self.rpq), None), self.rpq.get_min())
+
+    def test_order_statistics(self):
+        queue = FusedRetroactivePriorityQueue()
+        for t, v in enumerate([5, 3, 8, 3, 1]):
+            queue.add_insert(t, v)
+        queue.add_delete_min(10)
+        self.assertEqual(8, queue.get_max())
+        self.assertEqual(2, queue.rank(5))
+        self.assertEqual(5, queue.kth(2))
+        self.assertEqual([3, 3], queue.nsmallest(2))
+        self.assertEqual(3, queue.count_between(3, 5))
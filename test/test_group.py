@@ -0,0 +1,107 @@
+import unittest
+import random
+
+from retropq import Change, RetroactivePriorityQueue
+from retropq.group import RetroactivePriorityQueueGroup
+from test.test_rpq_bulk import random_operations
+
+
+class GroupTest(unittest.TestCase):
+    def setUp(self):
+        self.group = RetroactivePriorityQueueGroup(processes=3)
+
+    def tearDown(self):
+        self.group.close()
+
+    def test_manual(self):
+        results = self.group.apply([
+            ("a", ("add_insert", 10, 3)),
+            ("b", ("add_insert", 0, 2)),
+            ("a", ("add_delete_min", 5)),
+            ("a", ("add_insert", 0, 1)),
+            ("b", ("remove", 7)),
+        ])
+        # The batch for "a" is applied inserts first, in time order
+        self.assertEqual(results[:4], [
+            Change((10, 3), None), Change((0, 2), None),
+            Change(None, (0, 1)), Change((0, 1), None),
+        ])
+        self.assertIsInstance(results[4], KeyError)
+        self.assertEqual(self.group.get_mins(), {"a": 3, "b": 2})
+        self.assertEqual(self.group.sizes(["b"]), {"b": 1})
+        self.assertEqual(list(self.group.fetch("a")), [3])
+        self.assertEqual(self.group.keys(), ["a", "b"])
+        with self.assertRaises(KeyError):
+            self.group.get_mins(["c"])
+
+    def test_fallback(self):
+        results = self.group.apply([
+            ("a", ("add_insert", 1, 5)),
+            ("a", ("add_delete_min", 0)),
+            ("a", ("add_delete_min", 2)),
+        ])
+        self.assertEqual(results[0], Change((1, 5), None))
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], Change(None, (1, 5)))
+        self.assertEqual(self.group.sizes(), {"a": 0})
+
+    def test_random(self):
+        # Interleaved timelines, each in time order so that every chunk is
+        # valid for every queue
+        rng = random.Random(0)
+        expected = {}
+        streams = []
+        for key in range(40):
+            ops = random_operations(100, key)
+            expected[key] = RetroactivePriorityQueue.from_operations(ops)
+            streams.append([(key, op) for op in reversed(ops)])
+        operations = []
+        while streams:
+            stream = rng.choice(streams)
+            operations.append(stream.pop())
+            if not stream:
+                streams.remove(stream)
+        for i in range(0, len(operations), 1000):
+            self.group.apply(operations[i:i + 1000])
+
+        self.assertEqual(
+            self.group.get_mins(),
+            {key: q.get_min() for key, q in expected.items()}
+        )
+        self.assertEqual(
+            self.group.sizes(),
+            {key: len(q) for key, q in expected.items()}
+        )
+        for key in (0, 17, 39):
+            self.assertEqual(list(self.group.fetch(key)), list(expected[key]))
+
+    def test_bad_operations(self):
+        results = self.group.apply([
+            ("a", ("add_insert", 1, 5)),
+            ("a", ("bogus", 2)),
+            ("a", ("add_insert", 3)),
+            ("a", ("add_insert", 4, "x")),
+            ("b", "add_delete_min"),
+            ("a", ("add_insert", 6, 7)),
+        ])
+        self.assertEqual([type(r) for r in results], [
+            Change, ValueError, TypeError, TypeError, ValueError, Change
+        ])
+        self.assertEqual(list(self.group.fetch("a")), [5, 7])
+        self.assertEqual(self.group.keys(), ["a"])
+
+        # The shard survived and the queue is intact
+        self.assertEqual(
+            self.group.apply([("a", ("add_delete_min", 8))]),
+            [Change(None, (1, 5))]
+        )
+        self.assertEqual(self.group.get_mins(), {"a": 7})
+
+    def test_rebuilt(self):
+        self.group.apply([("a", ("add_insert", t, t)) for t in range(4)])
+        # Large enough compared to the queue to be applied by rebuilding
+        results = self.group.apply(
+            [("a", ("add_insert", t, t)) for t in range(4, 14)]
+        )
+        self.assertEqual(results, [None] * 10)
+        self.assertEqual(self.group.sizes(), {"a": 14})
@@ -0,0 +1,100 @@
+import unittest
+import heapq
+import random
+
+from retropq import RetroactivePriorityQueue
+from retropq.sorted_blocks import SortedBlocks
+from retropq.treap import Treap
+
+
+class HistoryTest(unittest.TestCase):
+    def replay(self, operations):
+        # The delete-min time of every deleted insert from a heap replay of
+        # the whole timeline. The values are distinct, so the pairing is
+        # unique.
+        heap = []
+        matches = {}
+        for t in sorted(operations):
+            op = operations[t]
+            if op[0] == "add_delete_min":
+                matches[heapq.heappop(heap)[1]] = t
+            else:
+                heapq.heappush(heap, (op[2], t))
+        return matches, sorted(v for v, _ in heap)
+
+    def check(self, queue, operations):
+        times = sorted(operations)
+        self.assertEqual(
+            [operations[t] for t in times],
+            list(queue.operations(float("-inf"), float("inf"))),
+        )
+        for t1, t2 in [(times[0], times[-1]), (times[3], times[3]),
+                       (times[5] - 0.5, times[40] + 0.5), (5, 2)]:
+            expected = [operations[t] for t in times if t1 <= t <= t2]
+            self.assertEqual(expected, list(queue.operations(t1, t2)))
+            self.assertEqual(len(expected), queue.count_operations(t1, t2))
+
+        matches, remaining = self.replay(operations)
+        self.assertEqual(remaining, list(queue))
+        for t in times:
+            if operations[t][0] == "add_insert":
+                self.assertEqual(matches.get(t), queue.matched_delete(t))
+                self.assertRaises(KeyError, queue.matched_insert, t)
+            else:
+                self.assertEqual(t, matches[queue.matched_insert(t)])
+                self.assertRaises(KeyError, queue.matched_delete, t)
+        self.assertRaises(KeyError, queue.matched_delete, -1)
+        self.assertRaises(KeyError, queue.matched_insert, -1)
+
+    def test_manual(self):
+        queue = RetroactivePriorityQueue()
+        queue.add_insert(0, 2)
+        queue.add_insert(10, 3)
+        queue.add_delete_min(5)
+        queue.add_insert(20, 1)
+        queue.add_delete_min(25)
+        self.assertEqual(5, queue.matched_delete(0))
+        self.assertEqual(25, queue.matched_delete(20))
+        self.assertEqual(None, queue.matched_delete(10))
+        self.assertEqual(20, queue.matched_insert(25))
+
+        queue.add_insert(3, 0)
+        self.assertEqual(5, queue.matched_delete(3))
+        self.assertEqual(None, queue.matched_delete(0))
+        self.assertEqual(25, queue.matched_delete(20))
+        self.assertEqual(3, queue.count_operations(3, 10))
+        self.assertEqual(0, queue.count_operations(11, 19))
+
+    def test_random(self):
+        for backend in (Treap, SortedBlocks):
+            rng = random.Random(2)
+            queue = RetroactivePriorityQueue(backend)
+            operations = {}
+            for t in range(300):
+                if len(queue) and rng.random() < 0.4:
+                    op = ("add_delete_min", t)
+                else:
+                    op = ("add_insert", t, rng.random())
+                getattr(queue, op[0])(*op[1:])
+                operations[t] = op
+            self.check(queue, operations)
+
+            for _ in range(200):
+                r = rng.random()
+                t = rng.randrange(300) + rng.random()
+                if r < 0.3:
+                    t = rng.choice(list(operations))
+                    op = ("remove", t)
+                elif r < 0.7:
+                    op = ("add_insert", t, rng.random())
+                else:
+                    op = ("add_delete_min", t)
+                try:
+                    getattr(queue, op[0])(*op[1:])
+                except ValueError:
+                    continue
+                if op[0] == "remove":
+                    del operations[t]
+                else:
+                    operations[t] = op
+            self.check(queue, operations)
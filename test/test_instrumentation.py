@@ -0,0 +1,95 @@
+import unittest
+from itertools import count
+from unittest import mock
+
+from retropq import RetroactivePriorityQueue, FusedRetroactivePriorityQueue
+from retropq import treap
+from retropq.instrumentation import Instrumentation
+from test.test_rpq_bulk import random_operations, state
+
+
+class InstrumentationTest(unittest.TestCase):
+    def test_counts(self):
+        operations = random_operations(500, 3)
+        queue = RetroactivePriorityQueue()
+        seen = []
+        with Instrumentation(queue, callback=seen.append) as instr:
+            for op in operations:
+                getattr(queue, op[0])(*op[1:])
+            queue.add_insert(operations[0][1] - 1, -1)
+            queue.remove(operations[0][1] - 1)
+
+        self.assertEqual(len(operations) + 2, len(seen))
+        self.assertEqual(["remove"], [s.name for s in seen[-1:]])
+        # Splits and merges depend on the random treap priorities, see
+        # test_merges
+        self.assertGreater(seen[-1].nodes_touched, 0)
+        self.assertGreater(seen[-2].bridge_searches, 0)
+        self.assertGreater(seen[-2].queries, 0)
+        self.assertGreater(seen[-2].seconds, 0)
+
+        total = instr.totals["add_insert"]
+        self.assertEqual(
+            sum(op[0] == "add_insert" for op in operations) + 1, total.count
+        )
+        self.assertGreaterEqual(total.aggregate_updates, total.count)
+        self.assertGreater(total.nodes_touched, 0)
+
+        depths = instr.depths()
+        self.assertEqual(
+            {"q_now", "inserts_in_q", "deleted_inserts", "bridges",
+             "size_changes"},
+            set(depths),
+        )
+        self.assertLessEqual(instr.max_depths["bridges"], 100)
+        for name, depth in instr.max_depths.items():
+            self.assertGreater(depth, 0)
+
+        # Disabling restores the class methods and stops counting
+        self.assertNotIn("add_insert", vars(queue))
+        self.assertIsNone(treap._counters)
+        queue.add_insert(10 ** 9, 0)
+        self.assertEqual(len(operations) + 2, len(seen))
+        self.assertEqual(
+            state(queue),
+            state(RetroactivePriorityQueue.from_operations(
+                operations + [("add_insert", 10 ** 9, 0)]
+            )),
+        )
+
+    def test_nested(self):
+        queue = RetroactivePriorityQueue.from_operations(
+            random_operations(300, 5)
+        )
+        seen = []
+        with Instrumentation(queue, callback=seen.append):
+            queue.apply_batch([
+                ("add_insert", -1.5, 0), ("add_delete_min", -0.5)
+            ])
+        self.assertEqual(["apply_batch"], [s.name for s in seen])
+        self.assertGreater(seen[0].nodes_touched, 0)
+
+    def test_merges(self):
+        # Priorities in the order the nodes are created, so the first insert
+        # is the root of every tree, with the other two as its children
+        with mock.patch("random.random", side_effect=count().__next__):
+            queue = RetroactivePriorityQueue()
+            queue.add_insert(1, 1)
+            queue.add_insert(0, 0)
+            queue.add_insert(2, 2)
+        seen = []
+        with Instrumentation(queue, callback=seen.append):
+            queue.remove(1)
+        # One in every tree but deleted_inserts
+        self.assertEqual(4, seen[0].merges)
+        self.assertEqual(0, seen[0].splits)
+
+    def test_failed_operation(self):
+        queue = FusedRetroactivePriorityQueue()
+        seen = []
+        with Instrumentation(queue, callback=seen.append) as instr:
+            with self.assertRaises(ValueError):
+                queue.add_delete_min(0)
+        self.assertEqual(["add_delete_min"], [s.name for s in seen])
+        self.assertEqual({"q_now", "ops"}, set(instr.depths()))
+        self.assertIsNone(treap._counters)
@@ -0,0 +1,171 @@
+import unittest
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from retropq import RetroactivePriorityQueue
+from retropq.instrumentation import Instrumentation
+from retropq.journal import Journal, encode, read_records
+from test.test_rpq_bulk import random_operations, state
+
+
+def random_updates(queue, rng, count):
+    for _ in range(count):
+        t = rng.randrange(10 ** 4) + rng.choice([0, 0.5])
+        op = rng.choice([
+            ("add_insert", t, rng.randrange(100)), ("add_delete_min", t),
+            ("remove", t),
+        ])
+        try:
+            getattr(queue, op[0])(*op[1:])
+        except (KeyError, ValueError):
+            pass
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def journal_path(self, journal):
+        return os.path.join(
+            self.directory, "journal-{}".format(journal.generation)
+        )
+
+    def test_records(self):
+        ops = [
+            ("add_insert", 1, 2.5), ("add_delete_min", -3.0),
+            ("remove", (1, "a")), ("add_insert", 2 ** 70, "x"),
+            ("apply_batch", [("add_insert", 1, 2), ("remove", 3)]),
+            ("compact", 7),
+        ]
+        data = b"".join(encode(op) for op in ops)
+        self.assertEqual((ops, len(data)), read_records(data))
+        # A torn or corrupted last record is dropped
+        last = len(data) - len(encode(ops[-1]))
+        self.assertEqual((ops[:-1], last), read_records(data[:-1]))
+        corrupt = bytearray(data)
+        corrupt[-1] ^= 1
+        self.assertEqual(ops[:-1], read_records(bytes(corrupt))[0])
+
+    def test_recover(self):
+        rng = random.Random(1)
+        journal = Journal.open(self.directory)
+        queue = journal.queue
+        for op in random_operations(200, 1):
+            getattr(queue, op[0])(*op[1:])
+        random_updates(queue, rng, 300)
+        queue.apply_batch([("add_insert", -1, 5), ("add_insert", -2, 6)])
+        journal.close()
+
+        recovered = Journal.open(self.directory)
+        self.assertEqual(state(queue), state(recovered.queue))
+        # Recovery continues the same journal
+        random_updates(recovered.queue, rng, 100)
+        expected = state(recovered.queue)
+        recovered.close()
+        self.assertEqual(expected, state(Journal.open(self.directory).queue))
+
+    def test_crash(self):
+        journal = Journal.open(self.directory, sync_every=1)
+        queue = journal.queue
+        random_updates(queue, random.Random(2), 300)
+        expected = state(queue)
+        # A crash in the middle of writing a record
+        with open(self.journal_path(journal), "ab") as f:
+            f.write(encode(("add_insert", 10 ** 6, 1))[:-3])
+
+        recovered = Journal.open(self.directory)
+        self.assertEqual(expected, state(recovered.queue))
+        recovered.queue.add_insert(10 ** 6, 1)
+        expected = state(recovered.queue)
+        recovered.close()
+        self.assertEqual(expected, state(Journal.open(self.directory).queue))
+
+    def test_group_commit(self):
+        journal = Journal.open(
+            self.directory, sync_every=10, sync_interval=3600
+        )
+        path = self.journal_path(journal)
+        for t in range(9):
+            journal.queue.add_insert(t, t)
+        self.assertEqual(0, os.path.getsize(path))
+        journal.queue.add_insert(9, 9)
+        with open(path, "rb") as f:
+            ops, length = read_records(f.read())
+        self.assertEqual([("add_insert", t, t) for t in range(10)], ops)
+        # Length, CRC, operation code and two tagged int64s
+        self.assertEqual(10 * 27, length)
+        journal.close()
+
+    def test_timed_sync(self):
+        journal = Journal.open(
+            self.directory, sync_every=10, sync_interval=0.05
+        )
+        path = self.journal_path(journal)
+        journal.queue.add_insert(1, 1)
+        self.assertEqual(0, os.path.getsize(path))
+        # Synced by the timer without another update
+        deadline = time.monotonic() + 5
+        while os.path.getsize(path) == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(27, os.path.getsize(path))
+        journal.close()
+
+    def test_checkpoints(self):
+        queue = RetroactivePriorityQueue(window=500)
+        journal = Journal(queue, self.directory, checkpoint_every=100)
+        rng = random.Random(3)
+        for t in range(1000):
+            queue.add_insert(t, rng.randrange(100))
+            if rng.random() < 0.3:
+                queue.add_delete_min(t + 0.5)
+        random_updates(queue, rng, 200)
+        journal.sync()
+        self.assertEqual(2, len(os.listdir(self.directory)))
+        self.assertIsNotNone(queue.horizon())
+
+        recovered = Journal.open(self.directory, window=500).queue
+        self.assertEqual(state(queue), state(recovered))
+        self.assertEqual(queue.horizon(), recovered.horizon())
+
+    def test_detach(self):
+        journal = Journal.open(self.directory)
+        journal.queue.add_insert(1, 1)
+        journal.close()
+        journal.queue.add_insert(2, 2)
+        self.assertEqual([1], list(Journal.open(self.directory).queue))
+
+    def test_instrumented(self):
+        journal = Journal.open(self.directory)
+        queue = journal.queue
+        queue.add_insert(1, 5)
+        seen = []
+        with Instrumentation(queue, callback=seen.append):
+            queue.add_insert(2, 6)
+        # Disabling the instrumentation keeps the journal's wrappers
+        queue.add_insert(3, 7)
+        journal.close()
+        self.assertEqual(["add_insert"], [s.name for s in seen])
+        self.assertEqual(
+            [5, 6, 7], list(Journal.open(self.directory).queue)
+        )
+
+        # Closed in the other order, the closed journal's wrapper stays
+        # inside the instrumentation's and passes calls through
+        queue = RetroactivePriorityQueue()
+        instr = Instrumentation(queue, callback=seen.append)
+        instr.enable()
+        journal = Journal(queue, self.directory)
+        queue.add_insert(1, 1)
+        instr.disable()
+        queue.add_insert(2, 2)
+        journal.close()
+        queue.add_insert(3, 3)
+        self.assertEqual(2, len(seen))
+        self.assertEqual([1, 2], list(Journal.open(self.directory).queue))
+        self.assertNotIn("size_at", vars(queue))
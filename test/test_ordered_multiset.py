@@ -0,0 +1,61 @@
+import unittest
+import bisect
+import random
+
+from retropq.ordered_multiset import OrderedMultiset
+
+class OrderedMultisetTest(unittest.TestCase):
+    def check(self, multiset, expected):
+        self.assertEqual(expected, list(multiset))
+        self.assertEqual(expected, multiset.to_list())
+        self.assertEqual(len(expected), len(multiset))
+        self.assertEqual(expected[0] if expected else None, multiset.get_min())
+        self.assertEqual(
+            expected[-1] if expected else None, multiset.get_max()
+        )
+
+        for v in range(-1, 22):
+            self.assertEqual(v in expected, v in multiset)
+            self.assertEqual(bisect.bisect_left(expected, v), multiset.rank(v))
+            for hi in range(v - 1, v + 5):
+                self.assertEqual(
+                    [x for x in expected if v <= x <= hi],
+                    list(multiset.iter_between(v, hi)),
+                )
+                self.assertEqual(
+                    bisect.bisect_right(expected, hi)
+                    - bisect.bisect_left(expected, v) if v <= hi else 0,
+                    multiset.count_between(v, hi),
+                )
+        for k in range(-len(expected), len(expected)):
+            self.assertEqual(expected[k], multiset.kth(k))
+        self.assertRaises(IndexError, multiset.kth, len(expected))
+        self.assertRaises(IndexError, multiset.kth, -len(expected) - 1)
+        self.assertEqual(expected[:3], multiset.nsmallest(3))
+
+    def test_random(self):
+        rng = random.Random(5)
+        multiset = OrderedMultiset()
+        expected = []
+        for _ in range(300):
+            if expected and rng.random() < 0.45:
+                v = rng.choice(expected)
+                multiset.remove(v)
+                expected.remove(v)
+            else:
+                v = rng.randrange(20)
+                multiset.add(v)
+                bisect.insort(expected, v)
+            self.check(multiset, expected)
+
+    def test_load_sorted(self):
+        multiset = OrderedMultiset()
+        multiset.load_sorted([1, 1, 4, 7, 7, 7])
+        self.check(multiset, [1, 1, 4, 7, 7, 7])
+        multiset.remove(7)
+        multiset.remove(1)
+        multiset.remove(1)
+        self.check(multiset, [4, 7, 7])
+
+        multiset.load_sorted([])
+        self.check(multiset, [])
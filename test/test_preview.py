@@ -0,0 +1,94 @@
+import unittest
+import random
+from collections import Counter
+
+from retropq import (
+    Change, RetroactivePriorityQueue, FusedRetroactivePriorityQueue
+)
+from test.test_rpq_bulk import random_operations
+
+
+def effect(queue, name, *args):
+    # Performs an update on a fork and returns the values added to and
+    # removed from the queue, or the exception type it raised
+    fork = queue.fork()
+    try:
+        getattr(fork, name)(*args)
+    except (KeyError, ValueError) as e:
+        return type(e)
+    before, after = Counter(queue), Counter(fork)
+    return (
+        sorted((after - before).elements()),
+        sorted((before - after).elements()),
+    )
+
+def preview(queue, name, *args):
+    try:
+        change = getattr(queue, "preview_" + name)(*args)
+    except (KeyError, ValueError) as e:
+        return type(e)
+    return (
+        [change.added[1]] if change.added is not None else [],
+        [change.removed[1]] if change.removed is not None else [],
+    )
+
+
+class PreviewTest(unittest.TestCase):
+    queue_cls = RetroactivePriorityQueue
+
+    def check(self, seed, max_v):
+        rng = random.Random(seed)
+        operations = random_operations(200, seed, 0.55, max_v)
+        queue = self.queue_cls()
+        for op in operations:
+            getattr(queue, op[0])(*op[1:])
+        snapshot = list(queue)
+
+        for _ in range(200):
+            t = rng.randrange(-10, 2100) + rng.choice([0, 0.5])
+            v = rng.randrange(max_v)
+            for update in [
+                ("add_insert", t, v), ("add_delete_min", t), ("remove", t)
+            ]:
+                self.assertEqual(
+                    effect(queue, *update), preview(queue, *update), update
+                )
+        self.assertEqual(snapshot, list(queue))
+
+    def test_random(self):
+        self.check(1, 10 ** 9)
+
+    def test_duplicates(self):
+        self.check(2, 4)
+
+    def test_times(self):
+        queue = self.queue_cls()
+        self.assertEqual(
+            Change((5, "b"), None), queue.preview_add_insert(5, "b")
+        )
+        queue.add_insert(5, "b")
+        queue.add_insert(10, "a")
+        queue.add_delete_min(15)
+        self.assertEqual(
+            Change(None, (5, "b")), queue.preview_add_delete_min(12)
+        )
+        self.assertEqual(
+            Change((0, "c"), None), queue.preview_add_insert(0, "c")
+        )
+        self.assertEqual(
+            Change((10, "a"), None), queue.preview_add_insert(0, "0")
+        )
+        self.assertEqual(Change((10, "a"), None), queue.preview_remove(15))
+        self.assertEqual(Change(None, (5, "b")), queue.preview_remove(5))
+
+        queue.add_delete_min(20)
+        with self.assertRaises(ValueError):
+            queue.preview_remove(10)
+        with self.assertRaises(ValueError):
+            queue.preview_add_delete_min(25)
+        with self.assertRaises(KeyError):
+            queue.preview_add_insert(20, "d")
+
+
+class FusedPreviewTest(PreviewTest):
+    queue_cls = FusedRetroactivePriorityQueue
@@ -0,0 +1,144 @@
+import unittest
+import random
+
+from retropq import RetroactivePriorityQueue
+
+
+def random_operations(op_cnt, seed, insert_p=0.6, max_v=10 ** 9):
+    # Random valid timeline as a list of operations sorted by time
+    rng = random.Random(seed)
+    times = sorted(rng.sample(range(10 * op_cnt), op_cnt))
+    operations = []
+    size = 0
+    for t in times:
+        if size == 0 or rng.random() <= insert_p:
+            operations.append(("add_insert", t, rng.randrange(max_v)))
+            size += 1
+        else:
+            operations.append(("add_delete_min", t))
+            size -= 1
+    return operations
+
+def replay(operations):
+    queue = RetroactivePriorityQueue()
+    for op in operations:
+        getattr(queue, op[0])(*op[1:])
+    return queue
+
+def state(queue):
+    return (
+        list(queue),
+        list(queue._bridges),
+        list(queue._size_changes),
+        list(queue._inserts_in_q),
+        list(queue._deleted_inserts),
+    )
+
+
+class FromOperationsTest(unittest.TestCase):
+    def test_matches_incremental(self):
+        for seed, max_v in [(1, 10 ** 9), (2, 5)]:
+            operations = random_operations(500, seed, max_v=max_v)
+            queue = RetroactivePriorityQueue.from_operations(operations)
+            self.assertEqual(state(replay(operations)), state(queue))
+            self.assertEqual(len(replay(operations)), len(queue))
+
+    def test_updates_after_build(self):
+        operations = random_operations(300, 3)
+        queue = RetroactivePriorityQueue.from_operations(operations)
+        expected = replay(operations)
+        for t in [-5, 0.5, 1000.5, 2998.5, 5000]:
+            queue.add_insert(t, int(t) % 17)
+            expected.add_insert(t, int(t) % 17)
+            self.assertEqual(state(expected), state(queue))
+        for op in operations[::7]:
+            queue.remove(op[1])
+            expected.remove(op[1])
+            self.assertEqual(state(expected), state(queue))
+
+    def test_empty(self):
+        queue = RetroactivePriorityQueue.from_operations([])
+        self.assertEqual([], list(queue))
+        self.assertEqual(None, queue.get_min())
+
+    def test_errors(self):
+        from_operations = RetroactivePriorityQueue.from_operations
+        self.assertRaises(KeyError, from_operations, [
+            ("add_insert", 1, 5), ("add_insert", 1, 6),
+        ])
+        self.assertRaises(ValueError, from_operations, [
+            ("add_insert", 1, 5), ("add_delete_min", 2),
+            ("add_delete_min", 3),
+        ])
+        self.assertRaises(ValueError, from_operations, [
+            ("add_insert", 2, 5), ("add_insert", 1, 6),
+        ])
+        self.assertRaises(ValueError, from_operations, [("remove", 1)])
+
+
+class ApplyBatchTest(unittest.TestCase):
+    def random_batch(self, operations, batch_cnt, seed):
+        # Removes some random operations and adds new ones at unused times,
+        # returning the batch and the resulting timeline
+        rng = random.Random(seed)
+        removed = rng.sample(operations, batch_cnt // 2)
+        batch = [("remove", op[1]) for op in removed]
+        timeline = {op[1]: op for op in operations if op not in removed}
+        while len(batch) < batch_cnt:
+            t = rng.randrange(-100, 10 * len(operations)) + 0.5
+            if t in timeline:
+                continue
+            if rng.random() < 0.5:
+                timeline[t] = ("add_insert", t, rng.randrange(100))
+            else:
+                timeline[t] = ("add_delete_min", t)
+            batch.append(timeline[t])
+        rng.shuffle(batch)
+        return batch, [timeline[t] for t in sorted(timeline)]
+
+    def check_batches(self, rebuild_factor):
+        applied = 0
+        for seed in range(40):
+            operations = random_operations(200, seed, insert_p=0.7)
+            queue = RetroactivePriorityQueue.from_operations(operations)
+            queue._REBUILD_FACTOR = rebuild_factor
+            batch, timeline = self.random_batch(operations, 30, seed)
+
+            try:
+                expected = RetroactivePriorityQueue.from_operations(timeline)
+            except ValueError:
+                before = state(queue)
+                self.assertRaises(ValueError, queue.apply_batch, batch)
+                self.assertEqual(before, state(queue))
+            else:
+                queue.apply_batch(batch)
+                self.assertEqual(state(expected), state(queue))
+                applied += 1
+        self.assertGreater(applied, 0)
+
+    def test_incremental(self):
+        self.check_batches(rebuild_factor=float("inf"))
+
+    def test_rebuild(self):
+        self.check_batches(rebuild_factor=0)
+
+    def test_order_independent(self):
+        # Only valid as a whole: the delete-min is fine once the earlier
+        # insert from the same batch is applied
+        queue = RetroactivePriorityQueue()
+        queue.add_insert(10, 1)
+        queue.apply_batch([("add_delete_min", 5), ("add_insert", 1, 2)])
+        self.assertEqual([1], list(queue))
+
+    def test_key_errors(self):
+        operations = random_operations(50, 1)
+        queue = RetroactivePriorityQueue.from_operations(operations)
+        before = state(queue)
+        for batch in [
+            [("add_insert", 0.5, 1), ("add_delete_min", 0.5)],
+            [("add_insert", 0.5, 1), ("remove", 0.25)],
+            [("add_delete_min", 0.5), ("add_insert", operations[3][1], 1)],
+        ]:
+            self.assertRaises(KeyError, queue.apply_batch, batch)
+            self.assertEqual(before, state(queue))
+        self.assertRaises(ValueError, queue.apply_batch, [("insert", 1, 1)])
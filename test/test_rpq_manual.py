@@ -42,3 +42,23 @@ class PriorityQueueManualTest(unittest.TestCase):
 
         queue.remove(2)
         self.assertEqual(8, queue.get_min())
+
+    def test_order_statistics(self):
+        queue = RetroactivePriorityQueue()
+        for t, v in enumerate([5, 3, 8, 3, 1]):
+            queue.add_insert(t, v)
+        queue.add_delete_min(10)
+        self.assertEqual([3, 3, 5, 8], list(queue))
+
+        self.assertEqual(3, queue.get_min())
+        self.assertEqual(8, queue.get_max())
+        self.assertIn(5, queue)
+        self.assertNotIn(1, queue)
+        self.assertEqual(2, queue.rank(5))
+        self.assertEqual(5, queue.kth(2))
+        self.assertEqual(8, queue.kth(-1))
+        self.assertEqual([3, 3], queue.nsmallest(2))
+        self.assertEqual(3, queue.count_between(3, 5))
+
+        queue.remove(2)
+        self.assertEqual(5, queue.get_max())
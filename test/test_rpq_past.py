@@ -0,0 +1,84 @@
+import unittest
+import random
+import heapq
+
+from retropq import RetroactivePriorityQueue
+
+
+class PastQueriesTest(unittest.TestCase):
+    def expected_at(self, operations, t):
+        heap = []
+        for op in sorted(operations.values(), key=lambda op: op[1]):
+            if op[1] > t:
+                break
+            if op[0] == "add_insert":
+                heapq.heappush(heap, op[2])
+            else:
+                heapq.heappop(heap)
+        return sorted(heap)
+
+    def check(self, queue, operations, t):
+        expected = self.expected_at(operations, t)
+        self.assertEqual(len(expected), queue.size_at(t))
+        self.assertEqual(
+            expected[0] if expected else None, queue.get_min_at(t)
+        )
+        self.assertEqual(expected, list(queue.iter_at(t)))
+
+    def test_random(self):
+        rng = random.Random(7)
+        queue = RetroactivePriorityQueue()
+        # Small enough to create, reuse, invalidate and evict checkpoints
+        queue._checkpoints.interval = 5
+        queue._checkpoints.capacity = 4
+        operations = {}
+
+        for _ in range(400):
+            t = rng.randrange(1000)
+            r = rng.random()
+            try:
+                if r < 0.45:
+                    v = rng.randrange(50)
+                    queue.add_insert(t, v)
+                    operations[t] = ("add_insert", t, v)
+                elif r < 0.7:
+                    queue.add_delete_min(t)
+                    operations[t] = ("add_delete_min", t)
+                elif operations:
+                    t = rng.choice(list(operations))
+                    queue.remove(t)
+                    del operations[t]
+            except (KeyError, ValueError):
+                pass
+
+            for _ in range(2):
+                self.check(queue, operations, rng.randrange(-1, 1001))
+
+    def test_rejected_updates_keep_checkpoints(self):
+        queue = RetroactivePriorityQueue()
+        queue._checkpoints.interval = 5
+        for t in range(20):
+            queue.add_insert(t, t)
+        queue.get_min_at(15)
+        self.assertEqual([15], queue._checkpoints._times)
+
+        with self.assertRaises(KeyError):
+            queue.add_insert(3, 0)
+        with self.assertRaises(KeyError):
+            queue.add_delete_min(3)
+        with self.assertRaises(KeyError):
+            queue.remove(3.5)
+        self.assertEqual([15], queue._checkpoints._times)
+
+        queue.add_insert(3.5, 0)
+        self.assertEqual([], queue._checkpoints._times)
+
+    def test_empty(self):
+        queue = RetroactivePriorityQueue()
+        self.assertEqual(0, queue.size_at(5))
+        self.assertEqual(None, queue.get_min_at(5))
+        self.assertEqual([], list(queue.iter_at(5)))
+
+        queue.add_insert(3, 1)
+        self.assertEqual(None, queue.get_min_at(2))
+        self.assertEqual(1, queue.get_min_at(3))
@@ -1,8 +1,9 @@
 import unittest
 import random
-import heapq
+from bisect import bisect_left
 
 from retropq import RetroactivePriorityQueue
+from benchmarks.oracle import IncrementalOracle
 
 
 class RandomRPQTest(unittest.TestCase):
@@ -11,6 +12,7 @@ class RandomRPQTest(unittest.TestCase):
         self.rpq = RetroactivePriorityQueue()
         self.verbose = False
         self.test_error = True
+        self.oracle = None
 
     def log(self, s):
         if self.verbose:
@@ -25,28 +27,31 @@ class RandomRPQTest(unittest.TestCase):
             print("    DEL_INS  {}".format(list(self.rpq._deleted_inserts)))
             print("    INS_IN_Q {}".format(list(self.rpq._inserts_in_q)))
 
-    def verify_q_now(self):
+    def apply(self, *op):
+        # Subclasses replace self.rpq in setUp, so the oracle is created on
+        # first use
+        if self.oracle is None:
+            self.oracle = IncrementalOracle(self.rpq)
+        return self.oracle.apply(op)
+
+    def verify_q_now(self, full=False):
+        # Every update is checked by the oracle in O(log n); the contents
+        # are compared with a full replay only when asked to (and by the
+        # oracle after 2^k updates)
         self.dump_state()
-        heap = []
-        for t, delta, v in self.operations:
-            if delta == 1:
-                heapq.heappush(heap, v)
-            else:
-                heapq.heappop(heap)
-
-        expected_q_now = list(sorted(heap))
-        actual_q_now = list(self.rpq)
-        self.assertEqual(expected_q_now, actual_q_now)
-        self.assertEqual(len(expected_q_now), len(self.rpq))
+        if self.oracle is not None:
+            self.oracle.check()
+            if full:
+                self.oracle.verify()
 
     def add_insert(self, t, v):
         self.log("add_insert({}, {})".format(t, v))
         if self.t_exists(t):
             if self.test_error:
-                self.assertRaises(KeyError, self.rpq.add_insert, t, v)
+                self.assertRaises(KeyError, self.apply, "add_insert", t, v)
         else:
             self.operations.insert(self.find_index(t), (t, 1, v))
-            self.rpq.add_insert(t, v)
+            self.apply("add_insert", t, v)
 
         self.verify_q_now()
 
@@ -54,30 +59,30 @@ class RandomRPQTest(unittest.TestCase):
         self.log("delete_min({})".format(t))
         if self.t_exists(t):
             if self.test_error:
-                self.assertRaises(KeyError, self.rpq.add_delete_min, t)
+                self.assertRaises(KeyError, self.apply, "add_delete_min", t)
         elif self.is_empty_after(t):
             if self.test_error:
-                self.assertRaises(ValueError, self.rpq.add_delete_min, t)
+                self.assertRaises(ValueError, self.apply, "add_delete_min", t)
         else:
             self.operations.insert(self.find_index(t), (t, -1, None))
-            self.rpq.add_delete_min(t)
+            self.apply("add_delete_min", t)
 
         self.verify_q_now()
 
     def remove(self, t):
         self.log("remove({})".format(t))
         if not self.t_exists(t):
-            self.assertRaises(KeyError, self.rpq.remove, t)
+            self.assertRaises(KeyError, self.apply, "remove", t)
         else:
             i = self.find_index(t)
             op = self.operations[i]
 
             if op[1] > 0 and self.is_empty_after(op[0]):
                 if self.test_error:
-                    self.assertRaises(ValueError, self.rpq.remove, t)
+                    self.assertRaises(ValueError, self.apply, "remove", t)
             else:
                 del self.operations[i]
-                self.rpq.remove(t)
+                self.apply("remove", t)
         self.verify_q_now()
 
     def t_exists(self, t):
@@ -85,11 +90,7 @@ class RandomRPQTest(unittest.TestCase):
         return i < len(self.operations) and self.operations[i][0] == t
 
     def find_index(self, t):
-        for i, v in enumerate(self.operations):
-            if v[0] >= t:
-                return i
-
-        return len(self.operations)
+        return bisect_left(self.operations, (t,))
 
     def size_at(self, t):
         return sum(delta for op_t, delta, k in self.operations if op_t <= t)
@@ -110,6 +111,7 @@ class RandomRPQTest(unittest.TestCase):
         max_v = 10 ** 9,
         remove_p = 0.4,
         insert_p = 0.7,
+        append_p = 0,
         seed = 4
     ):
         rng = random.Random(seed)
@@ -121,11 +123,21 @@ class RandomRPQTest(unittest.TestCase):
                 self.remove(op[0])
             else:
                 t = rng.randrange(max_t)
+                # No extra draws unless asked for, so that the sequences of
+                # the other tests stay the same
+                if append_p and self.operations:
+                    if rng.random() < append_p:
+                        t = self.operations[-1][0] + rng.randrange(1, 3)
+                    elif rng.random() < append_p:
+                        # Retroactive operation close to the end of the
+                        # timeline
+                        t = self.operations[-1][0] - rng.randrange(100)
                 if rng.random() <= insert_p:
                     v = rng.randrange(max_v)
                     self.add_insert(t, v)
                 else:
                     self.add_delete_min(t)
+        self.verify_q_now(full=True)
 
     def test_no_remove(self):
         self.random_op_sequence(1000, remove_p = -1)
@@ -146,5 +158,8 @@ class RandomRPQTest(unittest.TestCase):
     def test_key_error(self):
         self.random_op_sequence(1000, max_t = 100)
 
+    def test_near_end(self):
+        self.random_op_sequence(1000, append_p = 0.8)
+
     def test_repeated_values(self):
         self.random_op_sequence(1000, max_v = 10)
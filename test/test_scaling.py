@@ -0,0 +1,28 @@
+import unittest
+
+from benchmarks import scaling
+
+
+class ScalingTest(unittest.TestCase):
+    def test_logarithmic(self):
+        results = [
+            scaling.measure(2 ** k, 300, check=True) for k in range(8, 13)
+        ]
+        self.assertEqual([], scaling.failures(results, 1.5))
+
+    def test_fused(self):
+        results = [
+            scaling.measure(2 ** k, 300, fused=True, check=True)
+            for k in (8, 12)
+        ]
+        self.assertEqual([], scaling.failures(results, 1.5))
+
+    def test_detects_linear_growth(self):
+        base = {
+            "n": 2 ** 10, "nodes_touched": 50, "depth": 20, "splits": 2,
+            "merges": 1, "queries": 5, "bridge_searches": 1,
+        }
+        linear = dict(base, n=2 ** 14, nodes_touched=50 * 16)
+        messages = scaling.failures([base, linear], 1.5)
+        self.assertEqual(1, len(messages))
+        self.assertIn("nodes_touched", messages[0])
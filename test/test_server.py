@@ -0,0 +1,131 @@
+import unittest
+import asyncio
+import json
+import random
+
+from retropq import Change, RetroactivePriorityQueue
+from retropq.server import QueueClient, QueueServer
+
+
+class ServerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = QueueServer(window=0.01, max_pending=16)
+        self.socket = await self.server.start(port=0)
+        port = self.socket.sockets[0].getsockname()[1]
+        self.client = await QueueClient.connect(port=port)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.close()
+        self.socket.close()
+        await self.socket.wait_closed()
+
+    async def test_manual(self):
+        self.assertEqual(
+            await self.client.add_insert(10, 3), Change((10, 3), None)
+        )
+        self.assertEqual(
+            await self.client.add_insert(0, 2), Change((0, 2), None)
+        )
+        self.assertEqual(
+            await self.client.add_delete_min(5), Change(None, (0, 2))
+        )
+        self.assertEqual(await self.client.get_min(), 3)
+        self.assertEqual(await self.client.len(), 1)
+        self.assertEqual(await self.client.get_min_at(7), None)
+        self.assertEqual(await self.client.size_at(10), 1)
+        with self.assertRaises(KeyError):
+            await self.client.remove(7)
+        with self.assertRaises(ValueError):
+            await self.client.add_delete_min(-1)
+        with self.assertRaises(RuntimeError):
+            await self.client._request("add_insert", 1)
+        self.assertEqual(await self.client.list(), [3])
+
+    async def test_coalesced(self):
+        # Every delete-min is valid in any order after these inserts
+        base = [("add_insert", t - 50, t) for t in range(50)]
+        for op in base:
+            await self.client.add_insert(*op[1:])
+        batches = self.server.batches
+        rng = random.Random(0)
+        ops = [("add_insert", t, rng.randrange(100)) for t in range(100)]
+        ops += [("add_delete_min", t + 0.5) for t in range(0, 100, 3)]
+        rng.shuffle(ops)
+        await asyncio.gather(*(
+            getattr(self.client, op[0])(*op[1:]) for op in ops
+        ))
+
+        expected = RetroactivePriorityQueue.from_operations(
+            sorted(base + ops, key=lambda op: op[1])
+        )
+        self.assertEqual(await self.client.list(), list(expected))
+        self.assertEqual(await self.client.get_min(), expected.get_min())
+        self.assertEqual(await self.client.len(), len(expected))
+        # Updates were coalesced, at most max_pending + 1 at a time
+        batches = self.server.batches - batches
+        self.assertLess(batches, len(ops))
+        self.assertGreaterEqual(batches, len(ops) // 17)
+
+    async def test_fallback(self):
+        results = await asyncio.gather(
+            self.client.add_insert(1, 5),
+            self.client.add_insert(1, 6),
+            self.client.add_delete_min(2),
+            self.client.add_delete_min(3),
+            return_exceptions=True,
+        )
+        self.assertEqual(results[0], Change((1, 5), None))
+        self.assertIsInstance(results[1], KeyError)
+        self.assertEqual(results[2], Change(None, (1, 5)))
+        self.assertIsInstance(results[3], ValueError)
+        self.assertEqual(self.server.fallbacks, 1)
+        self.assertEqual(await self.client.len(), 0)
+
+    async def test_rebuilt(self):
+        for t in range(4):
+            await self.client.add_insert(t, t)
+        # One batch large enough compared to the queue to be rebuilt
+        results = await asyncio.gather(*(
+            self.client.add_insert(t, t) for t in range(4, 14)
+        ))
+        self.assertEqual(results, [None] * 10)
+        self.assertEqual(await self.client.len(), 14)
+
+    async def test_unexpected_errors(self):
+        # Comparing "a" with 5 raises TypeError in the batch and again when
+        # the update is applied alone; the batcher keeps going
+        await self.client.add_insert(1, 5)
+        with self.assertRaises(RuntimeError):
+            await self.client.add_insert(0, "a")
+        with self.assertRaises(RuntimeError):
+            await self.client.add_insert("b", 3)
+        await self.client.add_insert(2, 4)
+        self.assertEqual(await self.client.get_min(), 4)
+
+    async def test_malformed(self):
+        port = self.socket.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for line in [b"not json", b"[1, 2]", b'{"op": "len"}',
+                     b'{"id": 7, "args": []}', b'{"id": 8, "op": "len"}',
+                     b'{"id": 9, "op": "remove", "args": 3}',
+                     b'{"id": 10, "op": ["len"]}']:
+            writer.write(line + b"\n")
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in range(7)]
+        writer.close()
+        await writer.wait_closed()
+        self.assertEqual(
+            [r["id"] for r in responses], [None, None, None, 7, 8, 9, 10]
+        )
+        self.assertEqual(responses[4], {"id": 8, "result": 0})
+        for r in responses[:4] + responses[5:]:
+            self.assertEqual(r["error"], "ValueError")
+        await self.client.add_insert(1, 5)
+        self.assertEqual(await self.client.len(), 1)
+
+    async def test_close(self):
+        await self.client.add_insert(1, 5)
+        await self.server.close()
+        self.assertIsNone(self.server._batcher)
+        await self.server.close()
@@ -0,0 +1,90 @@
+import unittest
+import os
+import struct
+import tempfile
+
+from retropq import RetroactivePriorityQueue
+from test.test_rpq_bulk import random_operations, state
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def roundtrip(self, operations):
+        queue = RetroactivePriorityQueue.from_operations(operations)
+        queue.dump(self.path)
+        loaded = RetroactivePriorityQueue.load(self.path)
+        self.assertEqual(state(queue), state(loaded))
+        self.assertEqual(len(queue), len(loaded))
+        return loaded
+
+    def test_int_columns(self):
+        loaded = self.roundtrip(random_operations(300, 1))
+        # The loaded queue is fully functional
+        loaded.add_insert(10 ** 9, -1)
+        self.assertEqual(-1, loaded.get_min())
+
+    def test_float_columns(self):
+        operations = [
+            op[:1] + tuple(x / 4 for x in op[1:])
+            for op in random_operations(300, 2)
+        ]
+        self.roundtrip(operations)
+
+    def test_pickled_columns(self):
+        operations = [
+            ("add_insert", (1, "a"), "x"),
+            ("add_insert", (1, "b"), "y"),
+            ("add_delete_min", (2, "a")),
+            ("add_insert", (3, ""), "w"),
+        ]
+        loaded = self.roundtrip(operations)
+        self.assertEqual(["w", "y"], list(loaded))
+
+    def test_large_ints(self):
+        self.roundtrip(
+            [("add_insert", 2 ** 70, 1), ("add_insert", 2 ** 71, 0)]
+        )
+
+    def test_empty(self):
+        self.roundtrip([])
+
+    def test_invalid_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a snapshot at all")
+        self.assertRaises(
+            ValueError, RetroactivePriorityQueue.load, self.path
+        )
+
+    def test_horizon(self):
+        queue = RetroactivePriorityQueue.from_operations([
+            ("add_insert", 1, 5), ("add_delete_min", 2), ("add_insert", 3, 7),
+        ])
+        queue.compact(2.5)
+        queue.dump(self.path)
+        loaded = RetroactivePriorityQueue.load(self.path)
+        self.assertEqual(2.5, loaded.horizon())
+        with self.assertRaises(ValueError):
+            loaded.add_insert(0, 1)
+        self.assertEqual([7], list(loaded))
+
+        self.roundtrip([("add_insert", 1, 5)])
+        self.assertIsNone(RetroactivePriorityQueue.load(self.path).horizon())
+
+    def test_version_1(self):
+        # Written by version 1, without the horizon section: the header and
+        # the time, kind and value sections of a single insert (1, 5)
+        with open(self.path, "wb") as f:
+            f.write(struct.pack("<4sHccQ", b"RPQS", 1, b"q", b"q", 1))
+            for data in [struct.pack("<q", 1), struct.pack("<b", 0),
+                         struct.pack("<q", 5)]:
+                f.write(struct.pack("<Q", len(data)))
+                f.write(data + bytes(-len(data) % 8))
+        loaded = RetroactivePriorityQueue.load(self.path)
+        self.assertEqual([5], list(loaded))
+        self.assertIsNone(loaded.horizon())
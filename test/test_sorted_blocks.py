@@ -0,0 +1,116 @@
+import unittest
+import random
+from operator import add
+
+from retropq import RetroactivePriorityQueue, SortedBlocks
+from retropq.treap import Treap
+from retropq.zero_prefix_bst import MinPrefixSumAggregator, fold_values
+from test import test_rpq_rand
+
+
+class SmallBlocks(SortedBlocks):
+    # Splits and merges blocks often
+    block_size = 4
+
+
+class SortedBlocksTest(unittest.TestCase):
+    def check(self, blocks, treap, keys):
+        self.assertEqual(list(treap), list(blocks))
+        self.assertEqual(len(treap), len(blocks))
+        self.assertEqual(treap.last_key(), blocks.last_key())
+        self.assertEqual(treap.agg(), blocks.agg())
+        for key in keys:
+            self.assertEqual(key in treap, key in blocks)
+            for include_eq in [False, True]:
+                self.assertEqual(
+                    treap.agg_before(key, include_eq),
+                    blocks.agg_before(key, include_eq),
+                )
+                self.assertEqual(
+                    treap.agg_after(key, include_eq),
+                    blocks.agg_after(key, include_eq),
+                )
+                self.assertEqual(
+                    list(treap.iter_from(key, include_eq)),
+                    list(blocks.iter_from(key, include_eq)),
+                )
+        if len(treap):
+            self.assertEqual(treap.first(), blocks.first())
+            self.assertEqual(treap.last(), blocks.last())
+            total = treap.agg()
+            for k in range(0, total, 7):
+                self.assertEqual(
+                    treap.find_prefix(lambda s: s > k),
+                    blocks.find_prefix(lambda s: s > k),
+                )
+
+    def test_random(self):
+        rng = random.Random(2)
+        treap = Treap(add)
+        blocks = SmallBlocks(add)
+        keys = list(range(-1, 120))
+        for i in range(600):
+            key = rng.randrange(120)
+            if key in treap and rng.random() < 0.5:
+                treap.remove(key)
+                blocks.remove(key)
+            else:
+                value = rng.randrange(1, 5)
+                treap[key] = value
+                blocks[key] = value
+                self.assertEqual(value, blocks[key])
+            if i % 50 == 0:
+                self.check(blocks, treap, keys)
+
+        with self.assertRaises(KeyError):
+            blocks.remove(1000)
+        with self.assertRaises(KeyError):
+            blocks[1000]
+
+        items = list(treap)
+        loaded = SmallBlocks(add)
+        loaded.load_sorted(items)
+        self.check(loaded, treap, keys)
+
+        for key, _ in items:
+            treap.remove(key)
+            blocks.remove(key)
+        self.check(blocks, treap, keys)
+
+    def test_fork(self):
+        blocks = SmallBlocks(add)
+        blocks.load_sorted((k, 1) for k in range(50))
+        fork = blocks.fork()
+        for k in range(0, 50, 3):
+            fork.remove(k)
+        blocks[10] = 5
+
+        self.assertEqual(54, blocks.agg())
+        self.assertEqual(
+            [(k, 5 if k == 10 else 1) for k in range(50)], list(blocks)
+        )
+        self.assertEqual(
+            [(k, 1) for k in range(50) if k % 3], list(fork)
+        )
+
+    def test_fold_values(self):
+        rng = random.Random(3)
+        for _ in range(100):
+            values = [
+                MinPrefixSumAggregator(k, rng.choice([-1, 0, 1]))
+                for k in range(rng.randrange(1, 10))
+            ]
+            folded = fold_values(values)
+            expected = values[0]
+            for v in values[1:]:
+                expected = expected + v
+            for field in MinPrefixSumAggregator.__slots__:
+                self.assertEqual(
+                    getattr(expected, field), getattr(folded, field)
+                )
+
+
+class SortedBlocksRandomRPQTest(test_rpq_rand.RandomRPQTest):
+    def setUp(self):
+        super().setUp()
+        self.rpq = RetroactivePriorityQueue(SmallBlocks)
@@ -0,0 +1,101 @@
+import unittest
+import random
+from retropq.treap import Node, Treap, merge, split
+
+class TreapTest(unittest.TestCase):
+    def test_agg_before_after(self):
+        # Concatenation is not commutative, so this also checks that partial
+        # aggregates are combined in key order
+        treap = Treap(lambda x, y: x + y)
+        keys = random.Random(1).sample(range(1000), 200)
+        for k in keys:
+            treap[k] = (k,)
+        keys.sort()
+
+        root = treap._root
+        for key in range(-1, 1001, 7):
+            before = tuple(k for k in keys if k < key)
+            before_eq = tuple(k for k in keys if k <= key)
+            after = tuple(k for k in keys if k > key)
+            after_eq = tuple(k for k in keys if k >= key)
+
+            self.assertEqual(before or None, treap.agg_before(key))
+            self.assertEqual(
+                before_eq or None, treap.agg_before(key, include_eq=True)
+            )
+            self.assertEqual(after or None, treap.agg_after(key))
+            self.assertEqual(
+                after_eq or None, treap.agg_after(key, include_eq=True)
+            )
+
+        # Queries must not restructure the tree
+        self.assertIs(root, treap._root)
+        self.assertEqual(keys, [k for k, _ in treap])
+
+    def test_deep_tree(self):
+        # Increasing priorities degenerate the treap into a path that is far
+        # deeper than the interpreter's recursion limit
+        n = 5000
+        treap = Treap(lambda x, y: x + y)
+        nodes = [Node(k, 1) for k in range(n)]
+        for k in reversed(range(n)):
+            nodes[k].p = k
+            if k + 1 < n:
+                nodes[k].right = nodes[k + 1]
+            nodes[k].update_aggregate(treap._agg_f)
+        treap._root = nodes[0]
+        treap._len = n
+        treap._last_key = n - 1
+
+        self.assertEqual(list(range(n)), [k for k, _ in treap])
+        self.assertEqual(1, treap[n - 1])
+        self.assertEqual(n // 2, treap.agg_before(n // 2))
+
+        left, right = split(treap._root, n // 2, treap._agg_f)
+        self.assertEqual(n // 2, left.agg)
+        self.assertEqual(n - n // 2, right.agg)
+        treap._root = merge(left, right, treap._agg_f)
+
+        treap.remove(n - 1)
+        treap.remove(0)
+        self.assertEqual(n - 2, treap.agg())
+        self.assertRaises(KeyError, treap.remove, n - 1)
+        self.assertNotIn(0, treap)
+
+    def test_overwrite_in_place(self):
+        treap = Treap(lambda x, y: x + y)
+        for k in range(100):
+            treap[k] = 1
+        self.assertEqual(100, len(treap))
+
+        nodes = {id(node) for node in _nodes(treap._root)}
+        for k in range(0, 100, 3):
+            treap[k] = 2
+        self.assertEqual(nodes, {id(node) for node in _nodes(treap._root)})
+        self.assertEqual(100, len(treap))
+        self.assertEqual(134, treap.agg())
+        self.assertEqual(2, treap[99])
+
+def _nodes(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is not None:
+            yield node
+            stack.extend((node.left, node.right))
+
+class TreapIterFromTest(unittest.TestCase):
+    def test(self):
+        treap = Treap(lambda x, y: None)
+        keys = sorted(random.Random(2).sample(range(300), 100))
+        for k in keys:
+            treap[k] = -k
+
+        for key in range(-1, 302):
+            self.assertEqual(
+                [(k, -k) for k in keys if k >= key], list(treap.iter_from(key))
+            )
+            self.assertEqual(
+                [k for k in keys if k > key],
+                [k for k, _ in treap.iter_from(key, include_eq=False)],
+            )
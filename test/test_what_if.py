@@ -0,0 +1,65 @@
+import unittest
+import random
+
+from retropq import RetroactivePriorityQueue
+from test.test_rpq_bulk import random_operations
+
+try:
+    import numpy
+    from retropq.what_if import WhatIf
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "requires numpy")
+class WhatIfTest(unittest.TestCase):
+    def queues(self):
+        for seed, insert_p, max_v in [
+            (1, 0.6, 10 ** 9), (2, 0.5, 5), (3, 0.8, 20), (4, 0.52, 3)
+        ]:
+            operations = random_operations(150, seed, insert_p, max_v)
+            yield RetroactivePriorityQueue.from_operations(operations)
+        yield RetroactivePriorityQueue()
+
+    def candidates(self, queue, rng):
+        end = 10 * (len(list(queue._bridges)) + 1)
+        return [rng.randrange(-2, end) + 0.5 for _ in range(100)]
+
+    def test_delete_min(self):
+        rng = random.Random(1)
+        for queue in self.queues():
+            times = self.candidates(queue, rng)
+            values, insert_times = WhatIf(queue).delete_min(
+                numpy.array(times)
+            )
+            for t, v, insert_t in zip(times, values, insert_times):
+                fork = queue.fork()
+                try:
+                    fork.add_delete_min(t)
+                except ValueError:
+                    self.assertTrue(numpy.isnan(v))
+                    self.assertTrue(numpy.isnan(insert_t))
+                    continue
+                self.assertIn(insert_t, queue._inserts_in_q)
+                self.assertIn(insert_t, fork._deleted_inserts)
+                self.assertEqual(queue._inserts_in_q[insert_t], v)
+
+    def test_insert_survives(self):
+        rng = random.Random(2)
+        for queue in self.queues():
+            times = self.candidates(queue, rng)
+            values = [rng.randrange(25) for _ in times]
+            survives = WhatIf(queue).insert_survives(times, values)
+            for t, v, s in zip(times, values, survives):
+                fork = queue.fork()
+                fork.add_insert(t, v)
+                self.assertEqual(t in fork._inserts_in_q, s)
+
+    def test_existing_time(self):
+        queue = RetroactivePriorityQueue.from_operations(
+            [("add_insert", 1, 5), ("add_delete_min", 2)]
+        )
+        with self.assertRaises(KeyError):
+            WhatIf(queue).delete_min([0, 2])
+        with self.assertRaises(KeyError):
+            WhatIf(queue).insert_survives([1], [3])